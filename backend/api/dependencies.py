@@ -0,0 +1,14 @@
+from fastapi import Request
+
+from backend.database.vector_store_service import VectorStoreService
+
+
+def get_vector_store(request: Request) -> VectorStoreService:
+    """
+    Dependency returning the vector store service opened by the application's lifespan
+    Args:
+        request: the data contained in the request that the server received
+    Returns:
+        VectorStoreService shared by every router
+    """
+    return request.app.state.vector_store
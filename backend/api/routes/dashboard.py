@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, File, UploadFile, Form, Request, HTTPException
+import asyncio
+import os
+from fastapi import APIRouter, BackgroundTasks, Depends, File, UploadFile, Form, Request, HTTPException
 from fastapi_msal.models import IDTokenClaims, TokenStatus
 from backend.api.routes.auth import get_context
 from backend.api.errors import HTTPError
@@ -8,22 +10,28 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from backend.api.routes.auth import ACCESS_REQUIRED, get_context, validate_user
 from backend.api.errors import HTTPError
+from backend.api.dependencies import get_vector_store
 from backend.database.database_class_sections import get_user_classes
 from backend.database.database_user_conversations import get_user_conversations, add_user_conversation
 from backend.database.text_processor import process_file, chunk_text
 from backend.database.chroma_database import (
-    initialize_chromadb,
-    get_or_create_collection,
-    add_documents
+    get_course_collection,
+    find_course_collection,
+    add_documents,
+    delete_file,
+    purge_collection,
+    update_file,
+    file_entry,
+    course_files,
+    record_file
 )
+from backend.database.background_jobs import get_background_jobs
+from backend.database.semantic_cache import answer_cache
+from backend.database.vector_store_service import VectorStoreService
 
 # Initialize templates directory
 templates = Jinja2Templates(directory="frontend/templates")
 
-# Initialize ChromaDB client and collection
-client = initialize_chromadb()
-collection = get_or_create_collection(client, 'file_collection')
-
 page_templates = Jinja2Templates(directory='frontend/templates')
 
 dashboard_router = APIRouter(prefix="/dashboard")
@@ -48,19 +56,17 @@ async def dashboard(request : Request, context: dict = Depends(get_context)):
     return page_templates.TemplateResponse('dashboard.html', {"request": request, "context": context})
 
 @dashboard_router.get("/class")
-async def teacher_class_view(request : Request, context: dict = Depends(get_context)):
-    # Retrieve all documents from the collection
-    documents = collection.get()
+async def teacher_class_view(request : Request, context: dict = Depends(get_context), course_id: str = None,
+                             store: VectorStoreService = Depends(get_vector_store)):
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
 
-    # Extract unique file names from metadatas
-    file_names = set()
-    for metadata in documents.get('metadatas', []):
-        file_names.add(metadata['file_name'])
+    # Read the course's file names from its manifest rather than its chunks
+    files = await asyncio.to_thread(course_files, store.client, course_id)
 
     # Pass list of file names into the template
-    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
-        raise HTTPError(status_code=401, detail="Unauthorized")
-    
+    file_names = [entry['file_name'] for entry in files]
+
     if context.get("id_token") is not None:
         claims: IDTokenClaims = IDTokenClaims.decode_id_token(context.get("id_token"))
         if claims is not None and claims.validate_token() == TokenStatus.VALID:
@@ -68,20 +74,24 @@ async def teacher_class_view(request : Request, context: dict = Depends(get_cont
             context.update({"class_list": get_user_classes(claims.user_id)})
             context.update({"conversation_list": get_user_conversations(claims.user_id)})
 
-    return templates.TemplateResponse("Teacher_ClassView.html", {"request": request, "context": context, "file_names": file_names}
+    return templates.TemplateResponse("Teacher_ClassView.html", {"request": request, "context": context, "file_names": file_names,
+                                                                 "course_id": course_id}
     )
 
 @dashboard_router.post("/upload")
-async def upload_file_api(request: Request, files: List[UploadFile] = File(...)):
+async def upload_file_api(request: Request, files: List[UploadFile] = File(...), course_id: str = None,
+                          store: VectorStoreService = Depends(get_vector_store)):
     """
     Accept multiple files at once, process them, 
-    and add them to the ChromaDB collection if they do not already exist.
+    and add them to the course's ChromaDB collection if they do not already exist.
     """
     results = []
 
     if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
         raise HTTPError(status_code=401, detail="Unauthorized")
 
+    collection = await asyncio.to_thread(get_course_collection, store.client, course_id)
+
     for file in files:
         
         try:
@@ -98,8 +108,7 @@ async def upload_file_api(request: Request, files: List[UploadFile] = File(...))
                     )
 
                 # Check if this file already exists
-                existing = collection.get(where={"file_name": file.filename})
-                if existing['ids']:
+                if await asyncio.to_thread(file_entry, collection, file.filename) is not None:
                     raise HTTPException(
                         status_code=400, 
                         detail=f"File already exists: {file.filename}"
@@ -113,12 +122,16 @@ async def upload_file_api(request: Request, files: List[UploadFile] = File(...))
                 ]
 
                 # Add chunks to the collection
-                add_documents(collection, chunks, chunk_ids, metadatas)
+                counts = await asyncio.to_thread(add_documents, collection, chunks, chunk_ids, metadatas)
+                await asyncio.to_thread(record_file, collection, file.filename, content, len(chunks))
+                answer_cache.invalidate(collection.name)
 
                 results.append({
                     "filename": file.filename, 
                     "content_type": file.content_type,
-                    "message": "File uploaded successfully."
+                    "message": "File uploaded successfully.",
+                    "reused_chunks": counts['reused'],
+                    "embedded_chunks": counts['embedded']
                 })
 
                 print(collection.query)
@@ -134,49 +147,86 @@ async def upload_file_api(request: Request, files: List[UploadFile] = File(...))
     return {"uploaded_files": results}
 
 @dashboard_router.delete("/delete/{file_name}")
-async def delete_file_api(file_name: str, request: Request):
-
-    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
-        raise HTTPError(status_code=401, detail="Unauthorized")
+async def delete_file_api(file_name: str, request: Request, background_tasks: BackgroundTasks, course_id: str = None,
+                          store: VectorStoreService = Depends(get_vector_store)):
     """
-    Deletes all chunks associated with the given file_name.
+    Deletes all chunks associated with the given file_name in the course. Files with more than
+    PURGE_BACKGROUND_CHUNKS chunks are deleted by a background job, whose ID is returned with
+    status 202 so its progress can be polled at /dashboard/jobs/{job_id}.
     """
-    results = collection.get(where={"file_name": file_name})
-    if results['ids']:
-        collection.delete(ids=results['ids'])
-        return {"message": "File deleted successfully.", "file_name": file_name}
-    else:
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
+
+    collection = await asyncio.to_thread(find_course_collection, store.client, course_id)
+    entry = await asyncio.to_thread(file_entry, collection, file_name) if collection is not None else None
+    if entry is None:
         raise HTTPException(status_code=404, detail="File not found.")
-    
+
+    if entry['chunk_count'] > int(os.getenv("PURGE_BACKGROUND_CHUNKS", 1000)):
+        jobs = get_background_jobs(store.client)
+        job = await asyncio.to_thread(jobs.create, 'delete_file', entry['chunk_count'], file_name=file_name, course_id=course_id)
+        background_tasks.add_task(delete_file_job, jobs, collection, file_name, job['id'])
+        return JSONResponse(
+            status_code=202,
+            content={"message": "File deletion started.", "file_name": file_name, "job_id": job['id']}
+        )
+
+    await asyncio.to_thread(delete_file, collection, file_name)
+    answer_cache.invalidate(collection.name)
+    return {"message": "File deleted successfully.", "file_name": file_name}
+
+def delete_file_job(jobs, collection, file_name: str, job_id: str):
+    """Background task deleting the chunks of a large file in batches, reporting progress to its job."""
+    jobs.run(job_id, lambda progress: delete_file(collection, file_name, progress=progress))
+    answer_cache.invalidate(collection.name)
+
 @dashboard_router.delete("/delete_all")
-async def delete_all_files_api():
-    # Get all documents in the collection
-    all_docs = collection.get()
-    all_ids = all_docs.get('ids', [])
+async def delete_all_files_api(request: Request, course_id: str = None, store: VectorStoreService = Depends(get_vector_store)):
+    """
+    Deletes every file of the course by dropping and recreating its collection.
+    """
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
 
-    if all_ids:
-        # Delete all documents
-        collection.delete(ids=all_ids)
+    collection = await asyncio.to_thread(find_course_collection, store.client, course_id)
+    if collection is not None:
+        await asyncio.to_thread(purge_collection, store.client, collection)
+        answer_cache.invalidate(collection.name)
 
     return {"message": "All files deleted successfully."}
 
+@dashboard_router.get("/jobs/{job_id}")
+async def background_job_api(job_id: str, request: Request, store: VectorStoreService = Depends(get_vector_store)):
+    """
+    Returns the status of a background job and the number of items it has processed out of its total.
+    """
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
+
+    job = await asyncio.to_thread(get_background_jobs(store.client).get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
 @dashboard_router.put("/update/{file_name}")
 async def update_file_api(
     file_name: str,
     request: Request,
     file: UploadFile = File(None),
-    content: str = Form(None)
+    content: str = Form(None),
+    course_id: str = None,
+    store: VectorStoreService = Depends(get_vector_store)
 ):
     """
-    Updates a file by replacing its existing chunks with new ones.
+    Updates a file by replacing the chunks that differ from its stored chunks.
     Can accept either a file or raw text content.
     """
     if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
         raise HTTPError(status_code=401, detail="Unauthorized")
 
-    # Check if the file exists in the database
-    existing = collection.get(where={"file_name": file_name})
-    if not existing['ids']:
+    # Check if the file exists in the course's collection
+    collection = await asyncio.to_thread(find_course_collection, store.client, course_id)
+    if collection is None or await asyncio.to_thread(file_entry, collection, file_name) is None:
         raise HTTPException(status_code=404, detail="File not found.")
 
     try:
@@ -190,28 +240,51 @@ async def update_file_api(
             if not new_chunks:
                 raise HTTPException(status_code=400, detail="Failed to extract text from file.")
         elif content:
+            new_content = content.encode('utf-8')
             new_chunks = chunk_text(content)
             if not new_chunks:
                 raise HTTPException(status_code=400, detail="No content provided for update.")
         else:
             raise HTTPException(status_code=400, detail="No content provided for update.")
 
-        # Generate new IDs/metadata
-        new_chunk_ids = [str(uuid.uuid4()) for _ in new_chunks]
-        new_metadatas = [
-            {"file_name": file_name, "chunk_index": idx} 
-            for idx, _ in enumerate(new_chunks)
-        ]
-
-        # Delete old entries
-        collection.delete(ids=existing['ids'])
-
-        # Add updated chunks
-        add_documents(collection, new_chunks, new_chunk_ids, new_metadatas)
+        # Write only the chunks that changed, keeping the file readable throughout
+        counts = await asyncio.to_thread(update_file, collection, file_name, new_chunks)
+        await asyncio.to_thread(record_file, collection, file_name, new_content, len(new_chunks))
+        if counts['written'] or counts['removed']:
+            answer_cache.invalidate(collection.name)
 
         return JSONResponse(
             status_code=200, 
-            content={"message": "File updated successfully.", "file_name": file_name}
+            content={
+                "message": "File updated successfully.",
+                "file_name": file_name,
+                "unchanged_chunks": counts['unchanged'],
+                "written_chunks": counts['written'],
+                "removed_chunks": counts['removed'],
+                "reused_chunks": counts['reused'],
+                "embedded_chunks": counts['embedded']
+            }
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred while updating the file: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred while updating the file: {str(e)}")
+
+@dashboard_router.get("/files")
+async def list_files_api(request: Request, course_id: str = None, store: VectorStoreService = Depends(get_vector_store)):
+    """
+    Returns the manifest of the course's files: the name, chunk count, byte size, content hash,
+    upload time and embedding model of each file.
+    """
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
+
+    return {"files": await asyncio.to_thread(course_files, store.client, course_id)}
+
+@dashboard_router.get("/cache")
+async def answer_cache_stats(request: Request):
+    """
+    Returns the hit and miss counters of the semantic answer cache for each course.
+    """
+    if (not await validate_user(request, ACCESS_REQUIRED.ADMIN)):
+        raise HTTPError(status_code=401, detail="Unauthorized")
+
+    return answer_cache.stats()
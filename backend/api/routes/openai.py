@@ -1,26 +1,36 @@
 """Contains OpenAI API calls"""
 
-import base64
+import asyncio
+import hashlib
+import logging
 import os
 import json
 
-from fastapi import APIRouter, HTTPException, Request, Response
-from fastapi.responses import JSONResponse
-from openai import OpenAI, _exceptions
+from cachetools import TTLCache
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI, _exceptions
+from openai.types.embedding import Embedding
 from pydantic import BaseModel
-from typing import List, Dict
-from datetime import date
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Tuple
 from backend.database.database_class_sections import get_user_classes
 from backend.models.converstation import Conversation, Model
 from backend.api.routes.auth import msal_auth
+from backend.api.dependencies import get_vector_store
 from backend.database.database_user_conversations import DEMO_LIST
 
-from backend.database.chroma_database import nearest_neighbor_search, get_or_create_collection,initialize_chromadb
+from backend.database.chroma_database import (generate_embedding_async, nearest_neighbor_search_async, course_collection_name,
+                                              collection_provider, find_course_collection, retrieval_max_distance)
+from backend.database.embedding_providers import default_embedding_provider
+from backend.database.passages import assemble_context
+from backend.database.completion_cache import completion_cache
+from backend.database.semantic_cache import answer_cache
+from backend.database.usage_quota import usage_quota
+from backend.database.vector_store_service import VectorStoreService
 
-client = OpenAI()
+client = AsyncOpenAI()
 openai_router = APIRouter()
-chroma_client = initialize_chromadb()
-collection = get_or_create_collection(chroma_client, 'file_collection')
 
 
 class ChatRequest(Request):
@@ -28,50 +38,189 @@ class ChatRequest(Request):
     openai_model: str
     context: str
     currentConversationId: str
+    stream: bool
 
 conversations: Dict[str,List[Conversation]] = {}
 
-@openai_router.post("/ask", tags=["Chatbot"])
-async def chat(request: ChatRequest, response: Response) -> str:
-    """OpenAI chat endpoint for communciating with the specified OpenAI model
+CHAT_TEMPERATURE = 0.7
+
+# Moderation verdicts keyed on a hash of the moderation model and the input
+moderation_verdicts: TTLCache = TTLCache(
+    maxsize=int(os.getenv("MODERATION_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("MODERATION_CACHE_TTL", 86400))
+)
+
+def format_sse(event: str, data) -> str:
+    """Formats a single Server-Sent Event frame
     Args:
-        ChatRequest: contains the user's question, the OpenAI model to use, and the user context.
+        event: the name of the event
+        data: a JSON serializable payload
 
     Returns:
-        str: conversation updated with the response from OpenAI as a JSON string
+        str: the encoded event frame
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wraps an event iterator in a Server-Sent Events response"""
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def stream_reply(conversation: Conversation, reply: str) -> AsyncIterator[str]:
+    """Streams a locally generated reply using the same events as stream_completion"""
+    conversation.discussion.append({'role': 'assistant', 'content': reply})
+    yield format_sse("delta", {"content": reply})
+    yield format_sse("done", conversation.getDiscussion())
+
+async def stream_completion(conversation: Conversation, messages: List[dict], user_id: str,
+                            on_reply: Callable[[str], Awaitable[None]] = None,
+                            on_usage: Callable[[int], None] = None) -> AsyncIterator[str]:
+    """Forwards the completion deltas from OpenAI as Server-Sent Events
+    Args:
+        conversation: the conversation to update with the reply once the stream ends
+        messages: the packed messages to send
+        user_id: the id of the user sending the request
+        on_reply: called with the full reply once the stream ends
+        on_usage: called with the prompt and completion tokens the request used
+
+    Returns:
+        AsyncIterator[str]: "delta" events for each piece of content, then a "done" event with the discussion
+    """
+    reply = ""
+    try:
+        completion = await client.chat.completions.create(
+            messages=messages,
+            model=str(conversation.model.value),
+            max_completion_tokens=int(os.getenv("OPENAI_MAX_COMPLETION_TOKENS")),
+            n=1,
+            stop=['\0'],
+            temperature=CHAT_TEMPERATURE,
+            store=True,
+            user=user_id,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in completion:
+            if chunk.usage is not None and on_usage is not None:
+                on_usage(chunk.usage.prompt_tokens + chunk.usage.completion_tokens)
+            if chunk.choices and chunk.choices[0].delta.content:
+                reply += chunk.choices[0].delta.content
+                yield format_sse("delta", {"content": chunk.choices[0].delta.content})
+    except _exceptions.APIError as e:
+        yield format_sse("error", {"detail": f"Chat completion error: {str(e)}"})
+        return
+
+    # Adds the ChatGPT response to the conversation
+    conversation.discussion.append({'role': 'assistant', 'content': reply.strip()})
+    if on_reply is not None:
+        await on_reply(reply.strip())
+    yield format_sse("done", conversation.getDiscussion())
+
+async def moderate(user_content: str) -> bool:
+    """Moderation stage of the chat pipeline
+    Args:
+        user_content: the user's question
+
+    Returns:
+        bool: True if the moderation model flagged the question
     """
+    # Repeated inputs, including flagged ones, reuse the cached verdict
+    key = hashlib.sha256(f"{os.getenv('OPENAI_MODERATIONS_MODEL')}\0{user_content}".encode('utf-8')).hexdigest()
+    if key in moderation_verdicts:
+        return moderation_verdicts[key]
 
-    # Retrieve the usage cookie
-    usage_cookie = request.cookies.get("chat_usage")
-
-    # Parse cookie or initialize new data
-    if usage_cookie:
-        usage_data = json.loads(base64.b64decode(usage_cookie[::-1][1:-2]).decode())
-    else:
-        usage_data = {"count": 0, "max": os.getenv("CHAT_LIMIT"), "last_reset_date": str(date.today())}
-
-    # Check if it's a new day and reset if needed
-    if usage_data["last_reset_date"] != str(date.today()):
-        usage_data["count"] = 0  # Reset chat count
-        usage_data["last_reset_date"] = str(date.today())
-
-    # Check if the user has reached the daily limit
-    if usage_data["count"] >= int(os.getenv("CHAT_LIMIT")):
-        raise HTTPException(
-            status_code=429,
-            detail="You have reached your daily chat limit. Please try again tomorrow.",
+    try:
+        moderation_response = await client.moderations.create(
+            model=os.getenv("OPENAI_MODERATIONS_MODEL"),
+            input=user_content
         )
+        flagged = bool(moderation_response.results and moderation_response.results[0].flagged)
+        moderation_verdicts[key] = flagged
+        return flagged
 
-    # Increment the chat count
-    usage_data["count"] += 1
+    except (KeyError, IndexError, AttributeError) as e:
+        raise HTTPException(status_code=500, detail=f"Moderation API returned an unexpected response: {str(e)}")
 
-    # Update the cookie in the response
-    response.set_cookie(
-        key="chat_usage",
-        value=base64.b64encode(bytes(json.dumps(usage_data).encode('utf-8')))[::-1],
-        samesite="Lax",  # Restrict cross-origin access
-        max_age=86400,  # Cookie expires in 1 day
-    )
+    except _exceptions.APIError as e:
+        raise HTTPException(status_code=502, detail=f"Moderation API error: {str(e)}")
+
+async def retrieve_context(vector_store: VectorStoreService, user_content: str, course_id: str | None,
+                           budget: int) -> Tuple[Embedding | None, str | None]:
+    """Retrieval stage of the chat pipeline
+    Args:
+        vector_store: the vector store service holding the course documents
+        user_content: the user's question
+        course_id: the course of the conversation, whose documents are searched
+        budget: the number of tokens the developer message may use
+
+    Returns:
+        Embedding: the embedding of the question, or None if it could not be generated
+        str: a developer message with the relevant course documents, or None if nothing was found
+    """
+    # The question is embedded by the provider that embedded the course's documents
+    collection = await asyncio.to_thread(find_course_collection, vector_store.client, course_id)
+    provider = collection_provider(collection) if collection is not None else default_embedding_provider()
+    try:
+        embedding = await generate_embedding_async(user_content, provider)
+    except Exception as e:
+        logging.error(f"Error generating the query embedding: {e}")
+        return None, None
+
+    if budget <= 0:
+        return embedding, None
+
+    relevant_docs = await nearest_neighbor_search_async(vector_store.client, course_id, input_text=user_content,
+                                                        n_results=int(os.getenv("RETRIEVAL_MAX_PASSAGES", 6)),
+                                                        input_embedding=embedding)
+    return embedding, assemble_context(relevant_docs, budget, max_distance=retrieval_max_distance(provider))
+
+async def summarize_conversation(conversation: Conversation):
+    """Background task that folds the oldest turns of a long conversation into its summary
+    Args:
+        conversation: the conversation to compact once it passes OPENAI_SUMMARY_TOKEN_THRESHOLD
+    """
+    if not conversation.needs_summary():
+        return
+
+    conversation.summarizing = True
+    try:
+        messages, summarized = conversation.summary_candidates()
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if conversation.summary is not None:
+            transcript = f"Summary so far:\n{conversation.summary}\n\nNew turns:\n{transcript}"
+
+        completion = await client.chat.completions.create(
+            messages=[
+                {'role': 'developer', 'content': (
+                    "Summarize this tutoring conversation between a student and a teaching assistant. "
+                    "Keep the topics covered, the student's misunderstandings and any open questions. "
+                    "Be concise and write in the third person."
+                )},
+                {'role': 'user', 'content': transcript}
+            ],
+            model=str(conversation.model.value),
+            max_completion_tokens=int(os.getenv("OPENAI_SUMMARY_MAX_TOKENS", 400)),
+            n=1,
+            temperature=0.2
+        )
+        conversation.apply_summary(completion.choices[0].message.content.strip(), summarized)
+        usage_quota.charge(conversation.user_id, str(conversation.classID),
+                           completion.usage.prompt_tokens + completion.usage.completion_tokens)
+    except _exceptions.APIError as e:
+        logging.error(f"Error summarizing conversation {conversation.id}: {e}")
+    finally:
+        conversation.summarizing = False
+
+@openai_router.post("/ask", tags=["Chatbot"])
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks,
+               vector_store: VectorStoreService = Depends(get_vector_store)) -> str:
+    """OpenAI chat endpoint for communciating with the specified OpenAI model
+    Args:
+        ChatRequest: contains the user's question, the OpenAI model to use, and the user context.
+            When stream is true the reply is sent as Server-Sent Events instead.
+
+    Returns:
+        str: conversation updated with the response from OpenAI as a JSON string
+    """
 
     try:
         reqBody = await request.json()
@@ -87,53 +236,98 @@ async def chat(request: ChatRequest, response: Response) -> str:
         currentConversation: Conversation = next((convo for convo in userConversation if str(convo.id) == reqBody['currentConversationId']), 
                                                  Conversation(user_id, assistant=Model(os.getenv("OPENAI_MODEL")), class_prompt=get_user_classes(user_id)[0].prompt))
         
+        # Rejects the request before any OpenAI call once the user's tokens are spent
+        course = str(currentConversation.classID)
+        # Answers are cached per course collection, which the dashboard invalidates when its documents change
+        answer_partition = course_collection_name(currentConversation.classID)
+        if not usage_quota.allows(user_id, course):
+            raise HTTPException(
+                status_code=429,
+                detail="You have reached your daily chat limit. Please try again tomorrow.",
+            )
+
         if not reqBody['user_content'].strip():
                 raise HTTPException(status_code=400, detail="The input content cannot be empty.")
 
-        # Moderation API Call
+        stream = bool(reqBody.get('stream', False))
+
+        # Moderation and retrieval do not depend on each other, so retrieval starts
+        # right away and is cancelled if the moderation stage flags the input
+        retrieval = asyncio.create_task(retrieve_context(vector_store, reqBody['user_content'], currentConversation.classID,
+                                                         currentConversation.context_budget(reqBody['user_content'])))
         try:
-            moderation_response = client.moderations.create(
-                model=os.getenv("OPENAI_MODERATIONS_MODEL"),
-                input=reqBody['user_content']
-            )
+            flagged = await moderate(reqBody['user_content'])
+        except BaseException:
+            retrieval.cancel()
+            raise
 
-            if moderation_response.results and moderation_response.results[0].flagged:
-                 # Adds the ChatGPT response to the conversation
-                currentConversation.discussion.append({'role': 'assistant', 'content': "I can't answer that"})
+        if flagged:
+            retrieval.cancel()
+            if stream:
+                return event_stream(stream_reply(currentConversation, "I can't answer that"))
 
-                # Returns the conversation to the frontend to display
-                return json.dumps(currentConversation.discussion)
+            # Adds the ChatGPT response to the conversation
+            currentConversation.discussion.append({'role': 'assistant', 'content': "I can't answer that"})
 
-        except (KeyError, IndexError, AttributeError) as e:
-            raise HTTPException(status_code=500, detail=f"Moderation API returned an unexpected response: {str(e)}")
+            # Returns the conversation to the frontend to display
+            return json.dumps(currentConversation.discussion)
 
-        except _exceptions.APIError as e:
-            raise HTTPException(status_code=502, detail=f"Moderation API error: {str(e)}")
-                
+        # Only standalone questions are answered from the semantic cache, since
+        # later answers depend on the rest of the conversation
+        standalone = not any(message['role'] == 'user' for message in currentConversation.discussion)
         currentConversation.discussion.append({'role': 'user', 'content': reqBody['user_content']})
 
-        relevant_docs = nearest_neighbor_search(collection=collection,input_text=reqBody['user_content'], n_results=3)
+        model = str(currentConversation.model.value)
+        query_embedding, relevant_context = await retrieval
+        semantic_cacheable = standalone and query_embedding is not None
+        if semantic_cacheable:
+            cached_answer = answer_cache.lookup(answer_partition, model, query_embedding)
+            if cached_answer is not None:
+                if stream:
+                    return event_stream(stream_reply(currentConversation, cached_answer))
+                currentConversation.discussion.append({'role': 'assistant', 'content': cached_answer})
+                return json.dumps(currentConversation.getDiscussion())
+
+        # Compacts long conversations once the response has been sent
+        background_tasks.add_task(summarize_conversation, currentConversation)
+
+        # Identical requests to the same model are answered from the completion cache. The
+        # retrieved context is only sent with this turn, after the history
+        messages = currentConversation.pack(context=relevant_context)
+        max_completion_tokens = int(os.getenv("OPENAI_MAX_COMPLETION_TOKENS"))
+        completion_key = completion_cache.key(model, messages, max_completion_tokens, CHAT_TEMPERATURE)
+        cached_answer = await asyncio.to_thread(completion_cache.get, completion_key)
+        if cached_answer is not None:
+            if stream:
+                return event_stream(stream_reply(currentConversation, cached_answer))
+            currentConversation.discussion.append({'role': 'assistant', 'content': cached_answer})
+            return json.dumps(currentConversation.getDiscussion())
+
+        async def remember_answer(answer: str):
+            await asyncio.to_thread(completion_cache.put, completion_key, answer)
+            if semantic_cacheable:
+                answer_cache.store(answer_partition, model, query_embedding, answer)
 
-        if relevant_docs:
-            system_message = "Relevant information:\n"
-            for idx, doc in enumerate(relevant_docs, 1):
-                system_message += f"{idx}. {doc['content']}\n"
-            currentConversation.discussion.append({'role': 'developer', 'content': system_message})
+        if stream:
+            return event_stream(stream_completion(currentConversation, messages, user_id, on_reply=remember_answer,
+                                                  on_usage=partial(usage_quota.charge, user_id, course)))
 
         # Sends the entire conversation to ChatGPT
-        response = client.chat.completions.create(
-            messages=currentConversation.discussion,
-            model=str(currentConversation.model.value),
-            max_completion_tokens=int(os.getenv("OPENAI_MAX_COMPLETION_TOKENS")),
+        response = await client.chat.completions.create(
+            messages=messages,
+            model=model,
+            max_completion_tokens=max_completion_tokens,
             n=1,
             stop=['\0'],
-            temperature=0.7,
+            temperature=CHAT_TEMPERATURE,
             store=True,
             user=user_id
         )
 
         # Adds the ChatGPT response to the conversation
         currentConversation.discussion.append({'role': 'assistant', 'content': response.choices[0].message.content.strip()})
+        await remember_answer(response.choices[0].message.content.strip())
+        usage_quota.charge(user_id, course, response.usage.prompt_tokens + response.usage.completion_tokens)
 
  # Returns the conversation to the frontend to display
         return json.dumps(currentConversation.getDiscussion())
@@ -148,5 +342,30 @@ async def chat(request: ChatRequest, response: Response) -> str:
         print(e.status_code)
         print(e.response)
         print(e.message)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) from e
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+@openai_router.get("/quota", tags=["Chatbot"])
+async def remaining_quota(request: Request, chatID: str) -> JSONResponse:
+    """Returns how many tokens the user has left today in the course of a conversation
+    Args:
+        chatID: the id of the conversation
+
+    Returns:
+        JSONResponse: the remaining tokens and the daily limit
+    """
+    user_session = await msal_auth.handler.get_token_from_session(request)
+    if user_session is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    user_id = user_session.id_token_claims.user_id
+
+    conversation = next((convo for convo in conversations.get(user_id, DEMO_LIST) if str(convo.id) == chatID), None)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    return JSONResponse({
+        "remaining": usage_quota.remaining(user_id, str(conversation.classID)),
+        "limit": usage_quota.limit
+    })
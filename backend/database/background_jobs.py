@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import uuid
+from typing import Callable
+
+from cachetools import TTLCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+
+class BackgroundJobs:
+    """
+    Tracks dashboard operations that continue after their request has returned,
+    such as deleting the chunks of a very large file, so the page can poll their
+    progress. A job records how many of its items are done out of its total, and
+    is forgotten a while after it starts. Jobs are kept in this process, which
+    only serves stores on local disk; the Postgres store keeps them in its
+    database so a poll reaching another instance finds them.
+
+    Args:
+        ttl (float): The number of seconds a job is kept.
+        maxsize (int): The number of jobs kept.
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = 1024):
+        self.jobs: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl if ttl is not None else float(os.getenv("BACKGROUND_JOB_TTL", 3600)))
+        self.lock = threading.Lock()
+
+    def create(self, kind: str, total: int, **details) -> dict:
+        """
+        Registers a job before it is started.
+
+        Args:
+            kind (str): What the job does, e.g. 'delete_file'.
+            total (int): The number of items the job will process.
+            details: Anything else the page shows about the job, such as the file name.
+
+        Returns:
+            dict: The job, with its 'id'.
+        """
+        job = {'id': uuid.uuid4().hex, 'kind': kind, 'status': 'queued', 'done': 0, 'total': total, 'error': None, **details}
+        with self.lock:
+            self.jobs[job['id']] = job
+        return dict(job)
+
+    def get(self, job_id: str) -> dict | None:
+        """Returns a copy of a job, or None when it is unknown or expired."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update(self, job_id: str, **changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(changes)
+
+    def run(self, job_id: str, operation: Callable[[Callable[[int], None]], object]):
+        """
+        Runs a job's operation, passing it a callback that reports the number of items done.
+        The job ends 'done', or 'failed' with the error that stopped it.
+
+        Args:
+            job_id (str): The job's ID.
+            operation (Callable): The work, called with the progress callback.
+        """
+        self._update(job_id, status='running')
+        try:
+            operation(lambda done: self._update(job_id, done=done))
+        except Exception as e:
+            logging.error(f"Background job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+        else:
+            self._update(job_id, status='done')
+
+
+background_jobs = BackgroundJobs()
+
+def get_background_jobs(client) -> BackgroundJobs:
+    """Returns the jobs of a vector store client, its own when it shares them between instances."""
+    return getattr(client, 'jobs', None) or background_jobs
@@ -1,7 +1,14 @@
+import asyncio
+import hashlib
 import logging
 import os
+import re
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import Callable
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from openai.types.create_embedding_response import CreateEmbeddingResponse
 from openai.types.embedding import Embedding
 
@@ -9,18 +16,101 @@ import chromadb
 from chromadb.api import ClientAPI
 from chromadb.api.models.Collection import Collection
 from chromadb.api.types import Document, Documents, ID, IDs, Metadata, Metadatas, GetResult
+from chromadb.errors import InvalidCollectionException
+
+from backend.database.document_manifest import get_document_manifest
+from backend.database.embedding_cache import embedding_cache
+from backend.database.embedding_providers import OPENAI_PROVIDER, default_embedding_provider, get_embedding_provider
+from backend.database.embeddings_generator import count_tokens, get_embeddings, EMBEDDING_MAX_INPUTS, EMBEDDING_MAX_BATCH_TOKENS
+from backend.database.keyword_index import get_keyword_index
+from backend.database.memmap_store import MemmapVectorStore
+from backend.database.pgvector_store import PgVectorStore
+from backend.database.passages import select_passages
 
 openai = OpenAI()
+async_openai = AsyncOpenAI()
 
-# Function to generate embeddings using OpenAI's API
-def generate_embedding(text: str) -> Embedding:
-    response:CreateEmbeddingResponse = openai.embeddings.create(
-        input=text,
-        model=os.getenv("OPENAI_EMBEDDING_MODEL")
-    )
-    embedding: Embedding = response.data[0].embedding
+# The collection every document was stored in before retrieval was partitioned by course
+DEFAULT_COLLECTION = 'file_collection'
+
+# Reciprocal rank fusion constant and the number of candidates each ranking contributes per result
+RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 4
+
+# Number of candidates fetched per passage before neighbors are merged and duplicates dropped
+MMR_CANDIDATE_FACTOR = 3
+
+# Function to generate embeddings using OpenAI's API or a local provider, reusing cached embeddings of the same text
+def generate_embedding(text: str, provider: str = OPENAI_PROVIDER) -> Embedding:
+    model = embedding_model(provider)
+    embedding = embedding_cache.get(model, text)
+    if embedding is not None:
+        return embedding
+    if provider != OPENAI_PROVIDER:
+        embedding = get_embedding_provider(provider).embed([text])[0]
+    else:
+        response:CreateEmbeddingResponse = openai.embeddings.create(
+            input=text,
+            model=model
+        )
+        embedding: Embedding = response.data[0].embedding
+    embedding_cache.put(model, text, embedding)
     return embedding
 
+# Function to generate embeddings without blocking the event loop
+async def generate_embedding_async(text: str, provider: str = OPENAI_PROVIDER) -> Embedding:
+    model = embedding_model(provider)
+    embedding = await asyncio.to_thread(embedding_cache.get, model, text)
+    if embedding is not None:
+        return embedding
+    if provider != OPENAI_PROVIDER:
+        embedding = (await get_embedding_provider(provider).embed_async([text]))[0]
+    else:
+        response: CreateEmbeddingResponse = await async_openai.embeddings.create(
+            input=text,
+            model=model
+        )
+        embedding: Embedding = response.data[0].embedding
+    await asyncio.to_thread(embedding_cache.put, model, text, embedding)
+    return embedding
+
+# Function to generate the embeddings of many documents in as few requests as possible
+def generate_embeddings(texts: Documents, provider: str = OPENAI_PROVIDER) -> list[Embedding]:
+    model = embedding_model(provider)
+    embeddings = [embedding_cache.get(model, text) for text in texts]
+    missing = [idx for idx, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        if provider != OPENAI_PROVIDER:
+            vectors = get_embedding_provider(provider).embed([texts[idx] for idx in missing])
+            results = [{'embedding': vector} for vector in vectors]
+        else:
+            results = get_embeddings([texts[idx] for idx in missing], model=model,
+                                     batch_size=EMBEDDING_MAX_INPUTS, max_tokens=EMBEDDING_MAX_BATCH_TOKENS)
+        for idx, result in zip(missing, results):
+            if result['embedding'] is None:
+                raise ValueError(f"Failed to generate the embedding of document {idx}: {result.get('error')}")
+            embedding_cache.put(model, texts[idx], result['embedding'])
+            embeddings[idx] = result['embedding']
+    return embeddings
+
+# Function to name the model behind a provider, used to key cached embeddings and content hashes
+def embedding_model(provider: str = OPENAI_PROVIDER) -> str:
+    if provider != OPENAI_PROVIDER:
+        return get_embedding_provider(provider).model
+    return os.getenv("OPENAI_EMBEDDING_MODEL")
+
+# Function to read the distance past which a passage embedded by a provider is not relevant,
+# from RETRIEVAL_MAX_DISTANCE for OpenAI and RETRIEVAL_MAX_DISTANCE_<PROVIDER> otherwise
+def retrieval_max_distance(provider: str = OPENAI_PROVIDER) -> float:
+    if provider == OPENAI_PROVIDER:
+        return float(os.getenv("RETRIEVAL_MAX_DISTANCE", 0.5))
+    return float(os.getenv(f"RETRIEVAL_MAX_DISTANCE_{provider.upper()}", get_embedding_provider(provider).max_distance))
+
+# Function to read the provider that embedded a collection's chunks. Collections created
+# before providers were recorded were embedded by OpenAI
+def collection_provider(collection: Collection) -> str:
+    return (collection.metadata or {}).get('embedding_provider', OPENAI_PROVIDER)
+
 # Function to initialize ChromaDB client with optional persistent storage
 def initialize_chromadb(use_persistence=True) -> ClientAPI:
     if use_persistence == True:
@@ -32,20 +122,178 @@ def initialize_chromadb(use_persistence=True) -> ClientAPI:
         logging.info("ChromaDB initialized without persistent storage.")
     return client
 
+# Function to initialize the vector store selected by VECTOR_STORE: Chroma, the memory-mapped
+# NumPy store for small course corpora, kept in a 'memmap' directory next to Chroma's files, or
+# the document_chunks table in the Postgres database named by the DB_* settings
+def initialize_vector_store(use_persistence=True) -> ClientAPI | MemmapVectorStore | PgVectorStore:
+    store = os.getenv("VECTOR_STORE", "chroma")
+    if store == "pgvector":
+        client = PgVectorStore()
+        logging.info("pgvector store initialized.")
+        return client
+    if store != "memmap":
+        return initialize_chromadb(use_persistence)
+    directory = os.getenv("CHROMA_PERSISTENT_DIRECTORY") if use_persistence else None
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="memmap_store_")
+    client = MemmapVectorStore(os.path.join(directory, "memmap"))
+    logging.info(f"Memory-mapped vector store initialized at '{client.directory}'.")
+    return client
+
 # Function to get or create a collection
 def get_or_create_collection(client: ClientAPI, collection_name: str) -> Collection:
     collection = client.get_or_create_collection(name=collection_name)
     return collection
 
-# Function to add documents to the collection
-def add_documents(collection: Collection, documents: Documents, ids: IDs, metadatas: Metadatas):
-    embeddings = [generate_embedding(doc) for doc in documents]
+# Function to name the collection holding a course's documents. Documents uploaded without a
+# course stay in the original shared collection
+def course_collection_name(course_id: str = None) -> str:
+    if course_id is None:
+        return DEFAULT_COLLECTION
+    course_id = str(course_id)
+    if re.fullmatch(r'[A-Za-z0-9_-]{0,55}[A-Za-z0-9]', course_id):
+        return f"course_{course_id}"
+    return f"course_{hashlib.sha256(course_id.encode('utf-8')).hexdigest()[:32]}"
+
+# Function to get or create the collection of a course, used when documents are written. New
+# collections record the provider in EMBEDDING_PROVIDER, and keep it when the setting changes
+def get_course_collection(client: ClientAPI, course_id: str = None) -> Collection:
+    collection = find_course_collection(client, course_id)
+    if collection is None:
+        collection = client.get_or_create_collection(name=course_collection_name(course_id),
+                                                     metadata={'embedding_provider': default_embedding_provider()})
+    return collection
+
+# Function to find the collection of a course without creating it, used when searching
+def find_course_collection(client: ClientAPI, course_id: str = None) -> Collection | None:
+    try:
+        return client.get_collection(course_collection_name(course_id))
+    except (InvalidCollectionException, ValueError):
+        return None
+
+# Function to identify a chunk by its text and the embedding model, stored in its metadata
+def content_hash(text: str, provider: str = OPENAI_PROVIDER) -> str:
+    return embedding_cache.key(embedding_model(provider), text).hex()
+
+# Function to look up the vectors of chunks already stored in the collection by content hash
+def stored_embeddings(collection: Collection, hashes: list[str]) -> dict[str, Embedding]:
+    unique_hashes = list(dict.fromkeys(hashes))
+    if not unique_hashes:
+        return {}
+    where = {'content_hash': unique_hashes[0]} if len(unique_hashes) == 1 else {'content_hash': {'$in': unique_hashes}}
+    results = collection.get(where=where, include=['embeddings', 'metadatas'])
+    return {
+        meta['content_hash']: [float(value) for value in embedding]
+        for embedding, meta in zip(results['embeddings'], results['metadatas'])
+    }
+
+def embed_documents(collection: Collection, documents: Documents) -> tuple[list[Embedding], list[str], dict]:
+    """
+    Returns the embeddings of documents, reusing the vectors of identical chunks
+    already stored in the collection or cached, so only new text is embedded by the
+    collection's provider.
+
+    Args:
+        collection (Collection): The collection the documents will be stored in.
+        documents (Documents): The chunk texts.
+
+    Returns:
+        tuple: The embeddings, the content hash of each chunk, and the number of
+        'reused' and newly 'embedded' chunks.
+    """
+    provider = collection_provider(collection)
+    hashes = [content_hash(document, provider) for document in documents]
+    stored = stored_embeddings(collection, hashes)
+    embeddings = [stored.get(chunk_hash) for chunk_hash in hashes]
+
+    model = embedding_model(provider)
+    for idx, document in enumerate(documents):
+        if embeddings[idx] is None:
+            embeddings[idx] = embedding_cache.get(model, document)
+
+    # Identical chunks within the upload are only embedded once
+    new_texts = list(dict.fromkeys(document for document, embedding in zip(documents, embeddings) if embedding is None))
+    new_embeddings = dict(zip(new_texts, generate_embeddings(new_texts, provider))) if new_texts else {}
+    embeddings = [embedding if embedding is not None else new_embeddings[document]
+                  for document, embedding in zip(documents, embeddings)]
+
+    counts = {'reused': len(documents) - len(new_texts), 'embedded': len(new_texts)}
+    return embeddings, hashes, counts
+
+# Function to add documents to the collection, returning the number of reused and newly embedded chunks
+def add_documents(collection: Collection, documents: Documents, ids: IDs, metadatas: Metadatas) -> dict:
+    ensure_keyword_index(collection)
+    embeddings, hashes, counts = embed_documents(collection, documents)
     collection.add(
         documents=documents,
         embeddings=embeddings,
         ids=ids,
-        metadatas=metadatas
+        metadatas=[{**metadata, 'content_hash': chunk_hash, 'token_count': count_tokens(document)}
+                   for metadata, chunk_hash, document in zip(metadatas, hashes, documents)]
     )
+    keyword_index(collection).add(collection.name, ids, documents)
+    logging.info(f"Added {len(documents)} chunks: {counts['reused']} reused, {counts['embedded']} newly embedded.")
+    return counts
+
+def update_file(collection: Collection, file_name: str, chunks: Documents) -> dict:
+    """
+    Replaces the chunks of a file by diffing them against the stored chunks by
+    chunk_index and text. Unchanged chunks are kept, changed and added
+    chunks are written in place with a single upsert that reuses stored vectors,
+    and chunks past the end of the new file are deleted afterwards, so readers
+    never see the file without chunks.
+
+    Args:
+        collection (Collection): The collection the file is stored in.
+        file_name (str): The name of the file.
+        chunks (Documents): The chunk texts of the new version of the file.
+
+    Returns:
+        dict: The number of 'unchanged', 'written' and 'removed' chunks, and of
+        'reused' and newly 'embedded' vectors among the written chunks.
+    """
+    ensure_keyword_index(collection)
+    existing = collection.get(where={'file_name': file_name}, include=['metadatas', 'documents'])
+    stored = {}
+    duplicates = []
+    for id, meta, document in zip(existing['ids'], existing['metadatas'], existing['documents']):
+        if meta.get('chunk_index') in stored:
+            duplicates.append(id)
+        else:
+            stored[meta.get('chunk_index')] = (id, meta.get('content_hash'), document)
+
+    # The content hash ignores whitespace so vectors can be reused, so chunks are compared by
+    # their text, and a chunk is also rewritten when its hash predates the current model
+    provider = collection_provider(collection)
+    hashes = [content_hash(chunk, provider) for chunk in chunks]
+    changed = [idx for idx, (chunk, chunk_hash) in enumerate(zip(chunks, hashes))
+               if stored.get(idx, (None, None, None))[1:] != (chunk_hash, chunk)]
+    removed = [id for chunk_index, (id, _, _) in stored.items() if not isinstance(chunk_index, int) or not 0 <= chunk_index < len(chunks)]
+
+    counts = {'reused': 0, 'embedded': 0}
+    if changed:
+        documents = [chunks[idx] for idx in changed]
+        embeddings, _, counts = embed_documents(collection, documents)
+        ids = [stored[idx][0] if idx in stored else str(uuid.uuid4()) for idx in changed]
+        collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=[{'file_name': file_name, 'chunk_index': idx, 'content_hash': hashes[idx],
+                        'token_count': count_tokens(chunks[idx])} for idx in changed]
+        )
+        keyword_index(collection).add(collection.name, ids, documents)
+    if removed or duplicates:
+        delete_documents(collection, removed + duplicates)
+
+    counts = {
+        'unchanged': len(chunks) - len(changed),
+        'written': len(changed),
+        'removed': len(removed) + len(duplicates),
+        **counts
+    }
+    logging.info(f"Updated '{file_name}': {counts}.")
+    return counts
 
 # Function to retrieve entries based on file name
 def retrieve_by_file_name(collection: Collection, file_name: str) -> GetResult:
@@ -58,21 +306,238 @@ def retrieve_by_file_name(collection: Collection, file_name: str) -> GetResult:
 def update_entry(collection: Collection, id: ID, updated_document: Document=None, updated_metadata: Metadata=None):
     update_params = {'ids': [id]}
     if updated_document:
+        embeddings, hashes, _ = embed_documents(collection, [updated_document])
         update_params['documents'] = [updated_document]
-        update_params['embeddings'] = [generate_embedding(updated_document)]
+        update_params['embeddings'] = embeddings
+        updated_metadata = {**(updated_metadata or {}), 'content_hash': hashes[0], 'token_count': count_tokens(updated_document)}
     if updated_metadata:
         update_params['metadatas'] = [updated_metadata]
     collection.update(**update_params)
+    if updated_document:
+        ensure_keyword_index(collection)
+        keyword_index(collection).add(collection.name, [id], [updated_document])
 
 # Function to delete an entry
 def delete_entry(collection: Collection, id: ID):
-    collection.delete(ids=[id])
+    delete_documents(collection, [id])
+
+# Function to delete entries from the collection and the keyword index
+def delete_documents(collection: Collection, ids: IDs):
+    collection.delete(ids=ids)
+    keyword_index(collection).delete(collection.name, ids)
+
+# Function to delete every chunk of a file by its metadata, fetching only their IDs a batch of
+# PURGE_BATCH_SIZE at a time, then its manifest entry. Calls progress with the number of chunks
+# deleted so far after each batch
+def delete_file(collection: Collection, file_name: str, batch_size: int = None,
+                progress: Callable[[int], None] = None) -> int:
+    batch_size = batch_size or int(os.getenv("PURGE_BATCH_SIZE", 1000))
+    deleted = 0
+    while True:
+        batch = collection.get(where={'file_name': file_name}, limit=batch_size, include=[])
+        if not batch['ids']:
+            break
+        delete_documents(collection, batch['ids'])
+        deleted += len(batch['ids'])
+        if progress:
+            progress(deleted)
+    document_manifest(collection).remove(collection.name, file_name)
+    logging.info(f"Deleted {deleted} chunks of '{file_name}' from '{collection.name}'.")
+    return deleted
+
+# Function to delete every chunk of a collection by dropping it and recreating it empty with the
+# same metadata, so the cost does not grow with the number of chunks. Returns the new collection
+def purge_collection(client: ClientAPI, collection: Collection) -> Collection:
+    client.delete_collection(collection.name)
+    keyword_index(collection).clear(collection.name)
+    document_manifest(collection).clear(collection.name)
+    logging.info(f"Purged collection '{collection.name}'.")
+    return client.get_or_create_collection(name=collection.name, metadata=collection.metadata)
+
+# Function to get the keyword index of a collection: the local SQLite index, unless the store
+# searches its own chunks for keywords
+def keyword_index(collection: Collection):
+    return getattr(collection, 'keyword_index', None) or get_keyword_index()
+
+# Function to index the chunks a collection held before the keyword index existed
+def ensure_keyword_index(collection: Collection):
+    index = keyword_index(collection)
+    if index.is_indexed(collection.name):
+        return
+    existing = collection.get(include=['documents'])
+    index.add(collection.name, existing['ids'], existing['documents'])
+    logging.info(f"Indexed {len(existing['ids'])} existing chunks of '{collection.name}' for keyword search.")
+
+# Function to get the manifest of a collection's files: the local SQLite manifest, unless the
+# store keeps its own
+def document_manifest(collection: Collection):
+    return getattr(collection, 'manifest', None) or get_document_manifest()
+
+# Function to build the manifest entries of the files whose chunks are given. Their size and hash
+# are computed from their chunks in order, and their upload time is unknown
+def manifest_entries(collection: Collection, documents: Documents, metadatas: Metadatas) -> list[dict]:
+    files: dict[str, list] = {}
+    for document, meta in zip(documents, metadatas):
+        if meta and meta.get('file_name') is not None:
+            chunk_index = meta.get('chunk_index')
+            files.setdefault(meta['file_name'], []).append((chunk_index if isinstance(chunk_index, int) else -1, document))
+    model = embedding_model(collection_provider(collection))
+    entries = []
+    for file_name, chunks in files.items():
+        content = ''.join(document for _, document in sorted(chunks, key=lambda chunk: chunk[0])).encode('utf-8')
+        entries.append({'file_name': file_name, 'chunk_count': len(chunks), 'byte_size': len(content),
+                        'content_hash': hashlib.sha256(content).hexdigest(), 'uploaded_at': None, 'embedding_model': model})
+    return entries
+
+# Function to record the files a collection held before the manifest existed
+def ensure_document_manifest(collection: Collection):
+    manifest = document_manifest(collection)
+    if manifest.is_recorded(collection.name):
+        return
+    existing = collection.get(include=['documents', 'metadatas'])
+    entries = manifest_entries(collection, existing['documents'], existing['metadatas'])
+    manifest.record(collection.name, entries)
+    logging.info(f"Recorded {len(entries)} existing files of '{collection.name}' in the document manifest.")
 
-def nearest_neighbor_search(collection: Collection, input_text: str, n_results: int = 5) -> list[dict]:
+# Function to record a file after its chunks were written, replacing its previous entry
+def record_file(collection: Collection, file_name: str, content: bytes, chunk_count: int) -> dict:
+    ensure_document_manifest(collection)
+    entry = {
+        'file_name': file_name,
+        'chunk_count': chunk_count,
+        'byte_size': len(content),
+        'content_hash': hashlib.sha256(content).hexdigest(),
+        'uploaded_at': datetime.now(timezone.utc).isoformat(),
+        'embedding_model': embedding_model(collection_provider(collection))
+    }
+    document_manifest(collection).put(collection.name, entry)
+    return entry
+
+# Function to find the manifest entry of a file, or None when the collection has no such file
+def file_entry(collection: Collection, file_name: str) -> dict | None:
+    ensure_document_manifest(collection)
+    return document_manifest(collection).get(collection.name, file_name)
+
+# Function to list the manifest entries of every file in a collection, ordered by file name
+def list_files(collection: Collection) -> list[dict]:
+    ensure_document_manifest(collection)
+    return document_manifest(collection).list(collection.name)
+
+# Function to list the files of a course without creating its collection, empty when it has none
+def course_files(client: ClientAPI, course_id: str = None) -> list[dict]:
+    collection = find_course_collection(client, course_id)
+    return list_files(collection) if collection is not None else []
+
+def query_collection(collection: Collection, input_embedding: Embedding, n_results: int = 5,
+                     include_embeddings: bool = False) -> list[dict]:
+    """
+    Queries the collection with an embedding that has already been generated.
+
+    Args:
+        input_embedding (Embedding): The embedding of the query text.
+        n_results (int): Number of top results to return.
+        include_embeddings (bool): Whether to return the 'embedding' of each result.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing 'id', 'content', 'metadata', and 'distance'.
+    """
+    results = collection.query(
+        query_embeddings=[input_embedding],
+        n_results=n_results,
+        include=['documents', 'metadatas', 'distances'] + (['embeddings'] if include_embeddings else [])
+    )
+
+    relevant_documents = []
+    for idx, (id, doc, meta, distance) in enumerate(zip(results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0])):
+        relevant_documents.append({
+            'id': id,
+            'content': doc,
+            'metadata': meta,
+            'distance': distance
+        })
+        if include_embeddings:
+            relevant_documents[-1]['embedding'] = results['embeddings'][0][idx]
+
+    logging.info(f"Retrieved {len(relevant_documents)} relevant documents for the query.")
+
+    return relevant_documents
+
+def fuse_rankings(rankings: list[list[str]], k: int = RRF_K) -> dict[str, float]:
+    """
+    Merges rankings with reciprocal rank fusion: each ID scores 1 / (k + rank) in every
+    ranking it appears in, so IDs ranked well by several rankings come first.
+
+    Args:
+        rankings (list[list[str]]): Lists of IDs, best first.
+        k (int): Dampens the weight of the top ranks.
+
+    Returns:
+        dict[str, float]: Every ID and its fused score, ordered best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, 1):
+            scores[id] = scores.get(id, 0.0) + 1 / (k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+def hybrid_search(collection: Collection, input_text: str, input_embedding: Embedding, n_results: int = 5,
+                  include_embeddings: bool = False) -> list[dict]:
+    """
+    Searches a collection by embedding and by BM25 keyword match, merging both rankings
+    with reciprocal rank fusion so exact terms such as error messages and function names
+    are found even when their embeddings are not close.
+
+    Args:
+        input_text (str): The query text.
+        input_embedding (Embedding): The embedding of the query text.
+        n_results (int): Number of top results to return.
+        include_embeddings (bool): Whether to return the 'embedding' of each result.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing 'id', 'content', 'metadata', 'distance'
+        and the fused 'score'. Chunks found only by keyword have a distance of None.
+    """
+    candidates = n_results * HYBRID_CANDIDATE_FACTOR
+    vector_results = query_collection(collection, input_embedding, candidates, include_embeddings)
+    ensure_keyword_index(collection)
+    keyword_ids = [id for id, _ in keyword_index(collection).search(collection.name, input_text, candidates)]
+
+    fused = dict(list(fuse_rankings([[doc['id'] for doc in vector_results], keyword_ids]).items())[:n_results])
+    documents = {doc['id']: doc for doc in vector_results}
+    missing = [id for id in fused if id not in documents]
+    if missing:
+        include = ['documents', 'metadatas'] + (['embeddings'] if include_embeddings else [])
+        results = collection.get(ids=missing, include=include)
+        for idx, (id, doc, meta) in enumerate(zip(results['ids'], results['documents'], results['metadatas'])):
+            documents[id] = {'id': id, 'content': doc, 'metadata': meta, 'distance': None}
+            if include_embeddings:
+                documents[id]['embedding'] = results['embeddings'][idx]
+    return [{**documents[id], 'score': score} for id, score in fused.items() if id in documents]
+
+def retrieve_passages(collection: Collection, input_text: str, input_embedding: Embedding, n_results: int = 5) -> list[dict]:
+    """
+    Over-fetches hybrid search results and reduces them to diverse, de-overlapped passages:
+    neighboring chunks of a file are merged and maximal marginal relevance drops near-duplicates.
+
+    Args:
+        input_text (str): The query text.
+        input_embedding (Embedding): The embedding of the query text.
+        n_results (int): Number of passages to return.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing 'content', 'metadata', and 'distance'.
     """
-    Performs a nearest neighbor search on the collection based on the input_text.
+    candidates = hybrid_search(collection, input_text, input_embedding, n_results * MMR_CANDIDATE_FACTOR,
+                               include_embeddings=True)
+    return select_passages(candidates, n_results)
+
+def nearest_neighbor_search(client: ClientAPI, course_id: str, input_text: str, n_results: int = 5) -> list[dict]:
+    """
+    Performs a hybrid vector and keyword search on the documents of a course based on the input_text.
     
     Args:
+        client (ClientAPI): The ChromaDB client holding the course collections.
+        course_id (str): The course whose documents are searched.
         input_text (str): The query text to search against the collection.
         n_results (int): Number of top results to return.
     
@@ -80,24 +545,39 @@ def nearest_neighbor_search(collection: Collection, input_text: str, n_results:
         List[Dict]: A list of dictionaries containing 'content', 'metadata', and 'distance'.
     """
     try:
-        input_embedding = generate_embedding(input_text)
-        results = collection.query(
-            query_embeddings=[input_embedding],
-            n_results=n_results,
-            include=['documents', 'metadatas', 'distances']
-        )
-        
-        relevant_documents = []
-        for doc, meta, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
-            relevant_documents.append({
-                'content': doc,
-                'metadata': meta,
-                'distance': distance
-            })
-        
-        logging.info(f"Retrieved {len(relevant_documents)} relevant documents for the query.")
-
-        return relevant_documents
+        collection = find_course_collection(client, course_id)
+        if collection is None:
+            return []
+        input_embedding = generate_embedding(input_text, collection_provider(collection))
+        return retrieve_passages(collection, input_text, input_embedding, n_results)
+    except Exception as e:
+        logging.error(f"Error during nearest neighbor search: {e}")
+        return []
+
+async def nearest_neighbor_search_async(client: ClientAPI, course_id: str, input_text: str, n_results: int = 5,
+                                        input_embedding: Embedding = None) -> list[dict]:
+    """
+    Non-blocking version of nearest_neighbor_search for the async request handlers. The
+    embedding is generated with the async OpenAI client and the local Chroma query runs in
+    a worker thread.
+
+    Args:
+        client (ClientAPI): The ChromaDB client holding the course collections.
+        course_id (str): The course whose documents are searched.
+        input_text (str): The query text to search against the collection.
+        n_results (int): Number of top results to return.
+        input_embedding (Embedding): The embedding of input_text, if it has already been generated.
+
+    Returns:
+        List[Dict]: A list of dictionaries containing 'content', 'metadata', and 'distance'.
+    """
+    try:
+        collection = await asyncio.to_thread(find_course_collection, client, course_id)
+        if collection is None:
+            return []
+        if input_embedding is None:
+            input_embedding = await generate_embedding_async(input_text, collection_provider(collection))
+        return await asyncio.to_thread(retrieve_passages, collection, input_text, input_embedding, n_results)
     except Exception as e:
         logging.error(f"Error during nearest neighbor search: {e}")
-        return []
\ No newline at end of file
+        return []
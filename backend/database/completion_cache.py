@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+
+class CompletionCache:
+    """
+    Caches completions keyed on a stable hash of the request, so identical
+    requests to the same model are only sent to OpenAI once. Answers are kept
+    in a memory tier bounded by their size in bytes, and optionally in an
+    SQLite file on disk so they survive a restart.
+
+    Args:
+        max_bytes (int): The maximum size of the answers kept in memory.
+        directory (str): The directory of the on-disk tier, or None to keep answers in memory only.
+        max_disk_bytes (int): The maximum size of the answers kept on disk.
+    """
+
+    def __init__(self, max_bytes: int = None, directory: str = None, max_disk_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("COMPLETION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else int(os.getenv("COMPLETION_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.db = None
+        self.disk_size = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(os.path.join(directory, "completions.sqlite3"), check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self.db.commit()
+            # The size of the on-disk tier is summed once here and kept current by put
+            self.disk_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            logging.info(f"Completion cache persisted at '{directory}'.")
+
+    @staticmethod
+    def key(model: str, messages: list[dict], max_completion_tokens: int, temperature: float) -> str:
+        """
+        Returns a stable hash of a completion request.
+
+        Args:
+            model (str): The OpenAI model.
+            messages (list[dict]): The messages sent to the model.
+            max_completion_tokens (int): The completion token limit.
+            temperature (float): The sampling temperature.
+
+        Returns:
+            str: The hex digest identifying the request.
+        """
+        payload = json.dumps([model, messages, max_completion_tokens, temperature], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Returns the cached answer for a request key, checking memory then disk.
+
+        Args:
+            key (str): The key returned by CompletionCache.key.
+
+        Returns:
+            str or None: The cached answer, or None on a miss.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+            if self.db is None:
+                return None
+            row = self.db.execute("SELECT answer FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE completions SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, answer: str):
+        """
+        Caches the answer for a request key in memory and on disk. Writes to disk,
+        so async callers run it in a worker thread.
+
+        Args:
+            key (str): The key returned by CompletionCache.key.
+            answer (str): The completion to cache.
+        """
+        with self.lock:
+            self._remember(key, answer)
+            if self.db is None:
+                return
+            size = entry_size(key, answer)
+            replaced = self.db.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions (key, answer, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, answer, size, time.time())
+            )
+            self.disk_size += size - (replaced[0] if replaced else 0)
+            while self.disk_size > self.max_disk_bytes:
+                oldest = self.db.execute("SELECT key, size FROM completions ORDER BY accessed LIMIT 1").fetchone()
+                self.db.execute("DELETE FROM completions WHERE key = ?", (oldest[0],))
+                self.disk_size -= oldest[1]
+            self.db.commit()
+
+    def _remember(self, key: str, answer: str):
+        """Adds an answer to the memory tier, evicting the least recently used answers."""
+        if key in self.entries:
+            self.size -= entry_size(key, self.entries.pop(key))
+        size = entry_size(key, answer)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = answer
+        self.size += size
+        while self.size > self.max_bytes:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= entry_size(evicted_key, evicted)
+
+    def close(self):
+        """Closes the on-disk tier."""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def entry_size(key: str, answer: str) -> int:
+    """Returns the number of bytes an entry accounts for."""
+    return len(key) + len(answer.encode('utf-8'))
+
+
+# Shared by every chat request
+completion_cache = CompletionCache(directory=os.getenv("COMPLETION_CACHE_DIRECTORY"))
@@ -24,9 +24,10 @@ def get_user_conversations(UserID : str) -> list[Conversation]:
 
 #TODO need to reevaluate this method and the use of the get_user_classes method
 def add_user_conversation(UserID : str, model: Model):
-    tmpConvo = Conversation(UserID, assistant=model,class_prompt=get_user_classes(UserID)[0].prompt)
+    userClass = get_user_classes(UserID)[0]
+    tmpConvo = Conversation(UserID, assistant=model,class_prompt=userClass.prompt)
     tmpConvo.id = uuid.uuid4()
     tmpConvo.name = f"New chat with {model.name.title()}"                      # Replace with Name of conversation
-    tmpConvo.classID = uuid.uuid4()                 # Replace with UUID of conversation
+    tmpConvo.classID = userClass.id                 # Replace with UUID of conversation
     DEMO_LIST.append(tmpConvo)                      # Replace with DATABASE CALLS
     return tmpConvo
\ No newline at end of file
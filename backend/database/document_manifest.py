@@ -0,0 +1,122 @@
+import logging
+import os
+import sqlite3
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+MANIFEST_FILE = "document_manifest.sqlite3"
+
+# Columns of a manifest entry, in table order
+MANIFEST_COLUMNS = ('file_name', 'chunk_count', 'byte_size', 'content_hash', 'uploaded_at', 'embedding_model')
+
+
+class DocumentManifest:
+    """
+    The files ingested into each collection, kept in SQLite next to the vector
+    store so listing a course's files reads one row per file instead of every
+    chunk. Each entry records the file name, its number of chunks, the size and
+    SHA-256 hash of its content, when it was uploaded and the embedding model
+    its chunks were embedded with.
+
+    Args:
+        path (str): The SQLite file of the manifest, or None to keep it in memory.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS manifest_collections (name TEXT PRIMARY KEY)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS document_files (collection TEXT NOT NULL, file_name TEXT NOT NULL, "
+            "chunk_count INTEGER NOT NULL, byte_size INTEGER NOT NULL, content_hash TEXT NOT NULL, uploaded_at TEXT, "
+            "embedding_model TEXT, PRIMARY KEY (collection, file_name))"
+        )
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def is_recorded(self, collection: str) -> bool:
+        """Returns whether the files of a collection have been recorded."""
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM manifest_collections WHERE name = ?", (collection,)).fetchone() is not None
+
+    def record(self, collection: str, entries: list[dict]):
+        """
+        Records the files a collection already holds and marks it as kept in sync.
+
+        Args:
+            collection (str): The name of the collection.
+            entries (list[dict]): The manifest entry of each file.
+        """
+        with self.lock:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO document_files (collection, {', '.join(MANIFEST_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(collection, *(entry[column] for column in MANIFEST_COLUMNS)) for entry in entries]
+            )
+            self.db.execute("INSERT OR IGNORE INTO manifest_collections (name) VALUES (?)", (collection,))
+            self.db.commit()
+
+    def put(self, collection: str, entry: dict):
+        """Adds or replaces the entry of one file."""
+        self.record(collection, [entry])
+
+    def get(self, collection: str, file_name: str) -> dict | None:
+        """Returns the entry of a file, or None when the collection has no such file."""
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM document_files WHERE collection = ? AND file_name = ?",
+                                  (collection, file_name)).fetchone()
+        return dict(zip(MANIFEST_COLUMNS, row)) if row else None
+
+    def list(self, collection: str) -> list[dict]:
+        """Returns the entries of every file in a collection, ordered by file name."""
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM document_files WHERE collection = ? ORDER BY file_name",
+                                   (collection,)).fetchall()
+        return [dict(zip(MANIFEST_COLUMNS, row)) for row in rows]
+
+    def remove(self, collection: str, file_name: str):
+        """Removes the entry of a file."""
+        with self.lock:
+            self.db.execute("DELETE FROM document_files WHERE collection = ? AND file_name = ?", (collection, file_name))
+            self.db.commit()
+
+    def clear(self, collection: str):
+        """Removes every entry of a collection, which stays recorded as holding no files."""
+        with self.lock:
+            self.db.execute("DELETE FROM document_files WHERE collection = ?", (collection,))
+            self.db.commit()
+
+    def close(self):
+        """Closes the manifest."""
+        self.db.close()
+
+
+# One manifest per Chroma directory, stored alongside Chroma's own files
+manifests: dict[str, DocumentManifest] = {}
+manifests_lock = threading.Lock()
+
+def get_document_manifest() -> DocumentManifest:
+    """
+    Returns the document manifest of the Chroma directory in CHROMA_PERSISTENT_DIRECTORY,
+    or an in-memory manifest when Chroma is not persisted.
+    """
+    directory = os.getenv("CHROMA_PERSISTENT_DIRECTORY")
+    path = os.path.join(directory, MANIFEST_FILE) if directory else None
+    with manifests_lock:
+        if path not in manifests:
+            manifests[path] = DocumentManifest(path)
+            logging.info(f"Document manifest opened at '{path or ':memory:'}'.")
+        return manifests[path]
+
+def close_document_manifests():
+    """
+    Closes every open document manifest, used when the server shuts down. A
+    manifest requested afterwards is opened again.
+    """
+    with manifests_lock:
+        for manifest in manifests.values():
+            manifest.close()
+        manifests.clear()
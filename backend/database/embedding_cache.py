@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+class EmbeddingCache:
+    """
+    Caches embeddings keyed on the embedding model and a hash of the normalized
+    text. Recently used vectors are kept in an LRU memory tier. When a directory
+    is given, every vector is also appended to an on-disk tier per model: a
+    memory-mapped float32 matrix (vectors.f32) and the matching text hashes
+    (keys.bin), so the cache survives a restart without loading every vector.
+
+    Args:
+        directory (str): The directory of the on-disk tier, or None to keep vectors in memory only.
+        max_entries (int): The maximum number of vectors kept in the memory tier.
+    """
+
+    def __init__(self, directory: str = None, max_entries: int = None):
+        self.directory = directory
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+        self.entries: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self.stores: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, text: str) -> bytes:
+        """
+        Returns the cache key of a text, ignoring differences in whitespace.
+
+        Args:
+            model (str): The embedding model.
+            text (str): The embedded text.
+
+        Returns:
+            bytes: The SHA-256 digest of the model and normalized text.
+        """
+        normalized = ' '.join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode('utf-8')).digest()
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        """
+        Returns the cached embedding of a text, checking memory then disk.
+
+        Args:
+            model (str): The embedding model.
+            text (str): The embedded text.
+
+        Returns:
+            list[float] or None: The embedding, or None on a miss.
+        """
+        key = self.key(model, text)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key].tolist()
+
+            store = self.open_store(model)
+            if store is None or key not in store['rows']:
+                return None
+            vector = np.array(self.vectors(store)[store['rows'][key]])
+            self.remember(key, vector)
+            return vector.tolist()
+
+    def put(self, model: str, text: str, embedding: list[float]):
+        """
+        Caches the embedding of a text in memory and on disk.
+
+        Args:
+            model (str): The embedding model.
+            text (str): The embedded text.
+            embedding (list[float]): The embedding of the text.
+        """
+        key = self.key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self.lock:
+            self.remember(key, vector)
+
+            store = self.open_store(model, dimensions=len(vector))
+            if store is None or key in store['rows'] or len(vector) != store['dimensions']:
+                return
+            # Vectors are written before their keys, so a key never points past the end of the matrix
+            with open(os.path.join(store['path'], 'vectors.f32'), 'ab') as vectors_file:
+                vectors_file.write(vector.tobytes())
+            with open(os.path.join(store['path'], 'keys.bin'), 'ab') as keys_file:
+                keys_file.write(key)
+            store['rows'][key] = len(store['rows'])
+
+    def remember(self, key: bytes, vector: np.ndarray):
+        """Adds a vector to the memory tier, evicting the least recently used vectors."""
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def open_store(self, model: str, dimensions: int = None) -> dict | None:
+        """
+        Loads the on-disk tier of a model, creating it when dimensions is given.
+
+        Args:
+            model (str): The embedding model.
+            dimensions (int): The size of the model's vectors.
+
+        Returns:
+            dict or None: The store of the model, or None when there is no on-disk tier.
+        """
+        if self.directory is None:
+            return None
+        if model in self.stores:
+            return self.stores[model]
+
+        path = os.path.join(self.directory, hashlib.sha256(model.encode('utf-8')).hexdigest()[:16])
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                dimensions = json.load(meta_file)['dimensions']
+        elif dimensions is None:
+            return None
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path, 'w') as meta_file:
+                json.dump({'model': model, 'dimensions': dimensions}, meta_file)
+
+        keys = b''
+        if os.path.exists(os.path.join(path, 'keys.bin')):
+            with open(os.path.join(path, 'keys.bin'), 'rb') as keys_file:
+                keys = keys_file.read()
+        vectors_path = os.path.join(path, 'vectors.f32')
+        stored_vectors = os.path.getsize(vectors_path) // (4 * dimensions) if os.path.exists(vectors_path) else 0
+        row_count = min(len(keys) // DIGEST_SIZE, stored_vectors)
+        # Drops a partially written row left behind by an interrupted append
+        if os.path.exists(vectors_path):
+            os.truncate(vectors_path, row_count * 4 * dimensions)
+        if len(keys) != row_count * DIGEST_SIZE:
+            os.truncate(os.path.join(path, 'keys.bin'), row_count * DIGEST_SIZE)
+        rows = {keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]: row for row in range(row_count)}
+
+        self.stores[model] = {'path': path, 'dimensions': dimensions, 'rows': rows, 'matrix': None}
+        logging.info(f"Loaded {row_count} cached embeddings for '{model}'.")
+        return self.stores[model]
+
+    def vectors(self, store: dict) -> np.memmap:
+        """Returns the memory-mapped matrix of a store, remapping it after appends."""
+        if store['matrix'] is None or len(store['matrix']) < len(store['rows']):
+            store['matrix'] = np.memmap(os.path.join(store['path'], 'vectors.f32'), dtype=np.float32, mode='r',
+                                        shape=(len(store['rows']), store['dimensions']))
+        return store['matrix']
+
+    def clear(self):
+        """Empties the memory tier and forgets the loaded on-disk tiers."""
+        with self.lock:
+            self.entries.clear()
+            self.stores.clear()
+
+
+# Shared by the query path and document ingestion
+embedding_cache = EmbeddingCache(directory=os.getenv("EMBEDDING_CACHE_DIRECTORY"))
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Embeddings requested from the OpenAI embeddings endpoint, handled by chroma_database
+OPENAI_PROVIDER = 'openai'
+
+
+class EmbeddingProvider(ABC):
+    """
+    A source of embeddings other than the OpenAI API. A collection records the
+    name of the provider that embedded its chunks, so queries against it are
+    embedded by the same model and vectors from different models never mix.
+    Subclasses implement embed.
+    """
+
+    # The name stored in a collection's metadata
+    name: str
+    # The model identifier used to key cached embeddings
+    model: str
+    # The squared L2 distance past which a passage is not relevant, overridden by
+    # RETRIEVAL_MAX_DISTANCE_<NAME>; each model spreads its distances differently
+    max_distance: float
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds a list of texts.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: The embedding of each text, in input order.
+        """
+
+    async def embed_async(self, texts: list[str]) -> list[list[float]]:
+        """Embeds a list of texts without blocking the event loop."""
+        return await asyncio.to_thread(self.embed, texts)
+
+
+class ONNXEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeds texts on the CPU with the all-MiniLM-L6-v2 sentence embedding model,
+    run by onnxruntime in batches of 32. The model is downloaded by ChromaDB into
+    ~/.cache/chroma/onnx_models the first time it is used.
+    """
+
+    name = 'onnx'
+    model = 'onnx/all-MiniLM-L6-v2'
+    # Texts passed to the model at a time
+    batch_size = 32
+    # Relevant question and passage pairs score a cosine similarity of 0.5 to 0.7
+    max_distance = 1.0
+
+    def __init__(self):
+        self.function = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Loads the model on first use, so importing this module stays cheap."""
+        with self.lock:
+            if self.function is None:
+                from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+                self.function = ONNXMiniLM_L6_V2(preferred_providers=['CPUExecutionProvider'])
+                logging.info(f"Loaded the local embedding model '{self.model}'.")
+        return self.function
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        function = self.load()
+        texts = list(texts)
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors = function(texts[start:start + self.batch_size])
+            embeddings.extend([float(value) for value in vector] for vector in vectors)
+        return embeddings
+
+
+# Providers by the name stored in collection metadata
+PROVIDERS: dict[str, type[EmbeddingProvider]] = {ONNXEmbeddingProvider.name: ONNXEmbeddingProvider}
+instances: dict[str, EmbeddingProvider] = {}
+
+def get_embedding_provider(name: str) -> EmbeddingProvider:
+    """
+    Returns the shared instance of a provider.
+
+    Args:
+        name (str): The name of a registered provider.
+
+    Returns:
+        EmbeddingProvider: The provider.
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    if name not in instances:
+        instances[name] = PROVIDERS[name]()
+    return instances[name]
+
+def default_embedding_provider() -> str:
+    """Returns the provider new collections are created with, from EMBEDDING_PROVIDER."""
+    return os.getenv("EMBEDDING_PROVIDER", OPENAI_PROVIDER)
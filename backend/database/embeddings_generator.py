@@ -1,49 +1,232 @@
 #ChatGPT was used to help write this code
+import asyncio
 import logging
-import openai
-from openai import OpenAI
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+import tiktoken
+from openai import APIConnectionError, AsyncOpenAI, BadRequestError, InternalServerError, RateLimitError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Set OpenAI API key
-openai = OpenAI()
+# Limits of the embeddings endpoint for a single request
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300000
 
-def get_embeddings(text_chunks, model='text-embedding-ada-002', batch_size=16):
+@lru_cache(maxsize=None)
+def get_encoding():
     """
-    Converts a list of text chunks into embeddings using OpenAI's API.
+    Returns the tokenizer used by the OpenAI embedding models.
+    """
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text):
+    """
+    Returns the number of tokens the embeddings endpoint counts for a text.
+    """
+    return len(get_encoding().encode(text))
+
+def batch_text_chunks(text_chunks, batch_size, max_tokens=None):
+    """
+    Groups text chunks into batches of at most batch_size chunks and, when
+    max_tokens is given, at most max_tokens tokens.
 
     Args:
         text_chunks (list): A list of text strings.
+        batch_size (int): The maximum number of chunks per batch.
+        max_tokens (int): The maximum number of tokens per batch.
+
+    Returns:
+        batches (list): A list of lists of text chunks, in input order.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for text in text_chunks:
+        tokens = count_tokens(text) if max_tokens else 0
+        if batch and (len(batch) >= batch_size or (max_tokens and batch_tokens + tokens > max_tokens)):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+class RateLimiter:
+    """
+    Shares the rate limit state reported by the embeddings endpoint between
+    concurrent requests. When the x-ratelimit-* headers report that the
+    requests or tokens of the current window are spent, or a 429 asks to retry
+    later, every request waits until the window resets.
+    """
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    async def wait(self):
+        """Sleeps until requests may be sent again."""
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Holds every request back for the given number of seconds."""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def update(self, headers):
+        """Pauses until the window resets when the response headers report no requests or tokens left."""
+        for remaining, reset in (('x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests'),
+                                 ('x-ratelimit-remaining-tokens', 'x-ratelimit-reset-tokens')):
+            if headers.get(remaining) is not None and int(headers[remaining]) <= 0:
+                self.pause(parse_duration(headers.get(reset, '1s')))
+
+def parse_duration(value):
+    """
+    Converts a rate limit reset duration such as '20ms', '1s' or '6m0s' to seconds.
+    """
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value))
+
+def parse_retry_after(value):
+    """
+    Converts a Retry-After header, given in seconds or as an HTTP date, to seconds.
+    Returns None when the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """
+    Returns an exponential backoff delay with full jitter for a retry attempt.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def embed_batch(client, batch, model, semaphore, limiter, max_retries):
+    """
+    Embeds one batch, retrying rate limited and server errors with backoff.
+    A batch the endpoint rejects is bisected until the inputs that cause the
+    rejection are isolated, so the rest of the batch is still embedded.
+
+    Args:
+        client (AsyncOpenAI): The client to send requests with.
+        batch (list): A list of text strings.
         model (str): The embedding model to use.
-        batch_size (int): Number of text chunks to send per API request.
+        semaphore (asyncio.Semaphore): Bounds the number of requests in flight.
+        limiter (RateLimiter): The rate limit state shared by every request.
+        max_retries (int): The number of retries before the batch is reported as failed.
 
     Returns:
-        embeddings (list): A list of embeddings.
+        embeddings (list): A list of embeddings with a per-item status, in input order.
     """
-    embeddings = []
-    total_batches = (len(text_chunks) - 1) // batch_size + 1
-    for i in range(0, len(text_chunks), batch_size):
-        batch = text_chunks[i:i + batch_size]
+    error = None
+    for attempt in range(max_retries + 1):
+        await limiter.wait()
         try:
-            response = openai.embeddings.create(
-                input=batch,
-                model=model
+            async with semaphore:
+                raw_response = await client.embeddings.with_raw_response.create(
+                    input=batch,
+                    model=model
+                )
+            limiter.update(raw_response.headers)
+            response = raw_response.parse()
+            return [{'embedding': data.embedding, 'text': batch[idx], 'status': 'ok'}
+                    for idx, data in enumerate(response.data)]
+        except BadRequestError as e:
+            if len(batch) == 1:
+                error = e
+                break
+            middle = len(batch) // 2
+            logging.info(f"Bisecting a rejected batch of {len(batch)} chunks.")
+            halves = await asyncio.gather(
+                embed_batch(client, batch[:middle], model, semaphore, limiter, max_retries),
+                embed_batch(client, batch[middle:], model, semaphore, limiter, max_retries)
             )
-            for idx, data in enumerate(response.data):
-                embedding = data.embedding
-                embeddings.append({
-                    'embedding': embedding,
-                    'text': batch[idx]
-                })
-            logging.info(f"Processed batch {i // batch_size + 1} containing {len(batch)} chunks.")
+            return halves[0] + halves[1]
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            error = e
+            retry_after = None
+            if isinstance(e, RateLimitError) and getattr(e, 'response', None) is not None:
+                limiter.update(e.response.headers)
+                retry_after = parse_retry_after(e.response.headers.get('retry-after'))
+            if retry_after is not None:
+                limiter.pause(retry_after)
+            else:
+                await asyncio.sleep(backoff_delay(attempt))
+            logging.info(f"Retrying a batch of {len(batch)} chunks after: {e}")
         except Exception as e:
-            logging.error(f"Error processing batch {i // batch_size + 1}: {e}")
-            # Handle retries or log the failed batch
-            for text in batch:
-                embeddings.append({
-                    'embedding': None,
-                    'text': text,
-                    'error': str(e)
-                })
-    return embeddings
\ No newline at end of file
+            error = e
+            break
+
+    logging.error(f"Error processing a batch of {len(batch)} chunks: {error}")
+    return [{'embedding': None, 'text': text, 'status': 'failed', 'error': str(error)} for text in batch]
+
+async def get_embeddings_async(text_chunks, model='text-embedding-ada-002', batch_size=16, max_tokens=None,
+                               concurrency=4, max_retries=5):
+    """
+    Converts a list of text chunks into embeddings using OpenAI's API,
+    sending up to concurrency batches at once.
+
+    Args:
+        text_chunks (list): A list of text strings.
+        model (str): The embedding model to use.
+        batch_size (int): Number of text chunks to send per API request.
+        max_tokens (int): Number of tokens to send per API request, or None to batch by count only.
+        concurrency (int): Number of API requests in flight at once.
+        max_retries (int): Number of retries for a rate limited or failed request.
+
+    Returns:
+        embeddings (list): A list of embeddings in input order, each with a 'status' of 'ok' or 'failed'.
+    """
+    if not text_chunks:
+        return []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter()
+    async with AsyncOpenAI(max_retries=0) as client:
+        results = await asyncio.gather(*(
+            embed_batch(client, batch, model, semaphore, limiter, max_retries)
+            for batch in batch_text_chunks(text_chunks, batch_size, max_tokens)
+        ))
+    embeddings = [embedding for batch in results for embedding in batch]
+    logging.info(f"Processed {len(results)} batches containing {len(embeddings)} chunks.")
+    return embeddings
+
+def get_embeddings(text_chunks, model='text-embedding-ada-002', batch_size=16, max_tokens=None, concurrency=4):
+    """
+    Converts a list of text chunks into embeddings using OpenAI's API.
+    Blocking wrapper around get_embeddings_async.
+
+    Args:
+        text_chunks (list): A list of text strings.
+        model (str): The embedding model to use.
+        batch_size (int): Number of text chunks to send per API request.
+        max_tokens (int): Number of tokens to send per API request, or None to batch by count only.
+        concurrency (int): Number of API requests in flight at once.
+
+    Returns:
+        embeddings (list): A list of embeddings in input order, each with a 'status' of 'ok' or 'failed'.
+    """
+    coroutine = get_embeddings_async(text_chunks, model, batch_size, max_tokens, concurrency)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from an event loop, so the embedder gets its own loop on a worker thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
@@ -0,0 +1,151 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+INDEX_FILE = "keyword_index.sqlite3"
+
+
+class KeywordIndex:
+    """
+    A BM25 inverted index over the chunks of every collection, kept in SQLite
+    FTS5 tables so it is updated in place and needs no loading at startup. Each
+    collection has its own table, so term statistics are computed per course.
+    Words are stemmed, and underscores are kept inside tokens so identifiers
+    such as malloc_size match as a whole.
+
+    Args:
+        path (str): The SQLite file of the index, or None to keep it in memory.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS indexed_collections (name TEXT PRIMARY KEY)")
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def table(collection: str) -> str:
+        """Returns the quoted name of a collection's FTS5 table."""
+        return '"fts_' + collection.replace('"', '""') + '"'
+
+    def _create(self, collection: str):
+        """Creates the table of a collection and records that it is kept in sync."""
+        self.db.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table(collection)} USING fts5("
+            "id UNINDEXED, content, tokenize = \"porter unicode61 tokenchars '_'\")"
+        )
+        self.db.execute("INSERT OR IGNORE INTO indexed_collections (name) VALUES (?)", (collection,))
+
+    def is_indexed(self, collection: str) -> bool:
+        """Returns whether a collection's chunks have been indexed."""
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM indexed_collections WHERE name = ?", (collection,)).fetchone() is not None
+
+    def add(self, collection: str, ids: list[str], documents: list[str]):
+        """
+        Indexes chunks, replacing the chunks that are already indexed under the same IDs.
+
+        Args:
+            collection (str): The name of the collection the chunks belong to.
+            ids (list[str]): The chunk IDs.
+            documents (list[str]): The chunk texts.
+        """
+        with self.lock:
+            self._create(collection)
+            self._delete(collection, ids)
+            self.db.executemany(f"INSERT INTO {self.table(collection)} (id, content) VALUES (?, ?)", zip(ids, documents))
+            self.db.commit()
+
+    def delete(self, collection: str, ids: list[str]):
+        """
+        Removes chunks from the index.
+
+        Args:
+            collection (str): The name of the collection the chunks belong to.
+            ids (list[str]): The chunk IDs.
+        """
+        with self.lock:
+            if self.db.execute("SELECT 1 FROM indexed_collections WHERE name = ?", (collection,)).fetchone() is None:
+                return
+            self._delete(collection, ids)
+            self.db.commit()
+
+    def _delete(self, collection: str, ids: list[str]):
+        """Deletes chunks by ID in batches below SQLite's parameter limit."""
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            self.db.execute(f"DELETE FROM {self.table(collection)} WHERE id IN ({', '.join('?' * len(batch))})", batch)
+
+    def clear(self, collection: str):
+        """Drops every chunk of a collection from the index."""
+        with self.lock:
+            self.db.execute(f"DROP TABLE IF EXISTS {self.table(collection)}")
+            self.db.execute("DELETE FROM indexed_collections WHERE name = ?", (collection,))
+            self.db.commit()
+
+    def search(self, collection: str, text: str, n_results: int = 5) -> list[tuple[str, float]]:
+        """
+        Ranks the chunks of a collection against the words of a query with BM25.
+
+        Args:
+            collection (str): The name of the collection to search.
+            text (str): The query text.
+            n_results (int): Number of top results to return.
+
+        Returns:
+            list[tuple[str, float]]: The IDs and BM25 scores of the best matching chunks, best first.
+        """
+        terms = list(dict.fromkeys(re.findall(r'\w+', text.lower())))
+        if not terms:
+            return []
+        query = ' OR '.join(f'"{term}"' for term in terms)
+        with self.lock:
+            if self.db.execute("SELECT 1 FROM indexed_collections WHERE name = ?", (collection,)).fetchone() is None:
+                return []
+            table = self.table(collection)
+            rows = self.db.execute(
+                f"SELECT id, bm25({table}) FROM {table} WHERE {table} MATCH ? ORDER BY bm25({table}) LIMIT ?",
+                (query, n_results)
+            ).fetchall()
+        # SQLite reports BM25 as a negative number where lower is better
+        return [(id, -score) for id, score in rows]
+
+    def close(self):
+        """Closes the index."""
+        self.db.close()
+
+
+# One index per Chroma directory, stored alongside Chroma's own files
+indexes: dict[str, KeywordIndex] = {}
+indexes_lock = threading.Lock()
+
+def get_keyword_index() -> KeywordIndex:
+    """
+    Returns the keyword index of the Chroma directory in CHROMA_PERSISTENT_DIRECTORY,
+    or an in-memory index when Chroma is not persisted.
+    """
+    directory = os.getenv("CHROMA_PERSISTENT_DIRECTORY")
+    path = os.path.join(directory, INDEX_FILE) if directory else None
+    with indexes_lock:
+        if path not in indexes:
+            indexes[path] = KeywordIndex(path)
+            logging.info(f"Keyword index opened at '{path or ':memory:'}'.")
+        return indexes[path]
+
+def close_keyword_indexes():
+    """
+    Closes every open keyword index, used when the server shuts down. An index
+    requested afterwards is opened again.
+    """
+    with indexes_lock:
+        for index in indexes.values():
+            index.close()
+        indexes.clear()
@@ -0,0 +1,384 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Rows scored per block in a search, bounding the size of the temporary distance matrix
+SEARCH_BLOCK_ROWS = 65536
+
+
+class MemmapCollection:
+    """
+    A collection stored as an append-only, memory-mapped float16 matrix of vectors
+    with the ids, documents and metadata of each row in an append-only JSON log.
+    Writes append rows and mark the rows they replace in a tombstone bitmap, and
+    the files are compacted once enough rows are dead. Searches are brute-force
+    matrix products, which beat an ANN index for collections of a few thousand
+    chunks. Implements the subset of Chroma's Collection interface used by
+    chroma_database, with the same squared L2 distances and metadata merging.
+
+    Args:
+        path (str): The directory of the collection.
+        name (str): The name of the collection.
+        metadata (dict): The metadata of the collection, stored when it is created.
+        compaction_ratio (float): The fraction of dead rows that triggers a compaction.
+    """
+
+    def __init__(self, path: str, name: str, metadata: dict = None, compaction_ratio: float = None):
+        self.path = path
+        self.name = name
+        self.compaction_ratio = compaction_ratio if compaction_ratio is not None else float(os.getenv("MEMMAP_COMPACTION_RATIO", 0.3))
+        self.lock = threading.RLock()
+
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {'name': name, 'metadata': metadata, 'dimensions': None}
+            self._write_meta(meta)
+        self.metadata = meta['metadata']
+        self.dimensions = meta['dimensions']
+        self._load()
+
+    def _write_meta(self, meta: dict):
+        """Atomically replaces meta.json."""
+        with open(os.path.join(self.path, 'meta.json.tmp'), 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(os.path.join(self.path, 'meta.json.tmp'), os.path.join(self.path, 'meta.json'))
+
+    def _load(self):
+        """Reads the record log and tombstones, dropping a row left half written by an interrupted append."""
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        records_path = os.path.join(self.path, 'records.jsonl')
+        torn = False
+        if os.path.exists(records_path):
+            with open(records_path, encoding='utf-8') as records_file:
+                for line in records_file:
+                    if not line.endswith('\n'):
+                        torn = True
+                        break
+                    record = json.loads(line)
+                    self.ids.append(record['id'])
+                    self.documents.append(record['document'])
+                    self.metadatas.append(record['metadata'])
+
+        vectors_path = os.path.join(self.path, 'vectors.f16')
+        stored_vectors = os.path.getsize(vectors_path) // (2 * self.dimensions) if self.dimensions and os.path.exists(vectors_path) else 0
+        rows = min(len(self.ids), stored_vectors)
+        if rows < len(self.ids) or torn:
+            del self.ids[rows:], self.documents[rows:], self.metadatas[rows:]
+            self._rewrite_records()
+        if os.path.exists(vectors_path):
+            os.truncate(vectors_path, rows * 2 * (self.dimensions or 0))
+
+        self.dead = np.zeros(rows, dtype=bool)
+        tombstones_path = os.path.join(self.path, 'tombstones.bin')
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, 'rb') as tombstones_file:
+                bits = np.unpackbits(np.frombuffer(tombstones_file.read(), dtype=np.uint8))[:rows]
+            self.dead[:len(bits)] = bits.astype(bool)
+        self.rows = {id: row for row, id in enumerate(self.ids) if not self.dead[row]}
+        self.matrix = None
+        self.norms = None
+        self.decoded = None
+
+    def _rewrite_records(self):
+        """Rewrites the record log from memory, used when it has to shrink."""
+        with open(os.path.join(self.path, 'records.jsonl.tmp'), 'w', encoding='utf-8') as records_file:
+            for id, document, metadata in zip(self.ids, self.documents, self.metadatas):
+                records_file.write(json.dumps({'id': id, 'document': document, 'metadata': metadata}) + '\n')
+        os.replace(os.path.join(self.path, 'records.jsonl.tmp'), os.path.join(self.path, 'records.jsonl'))
+
+    def _vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the memory-mapped matrix and the squared norm of every row, remapping after
+        appends. Rows are also kept decoded to float32 while they fit in MEMMAP_CACHE_BYTES,
+        since converting float16 costs more than the search itself.
+        """
+        if not self.ids:
+            return np.zeros((0, self.dimensions or 0), dtype=np.float16), np.zeros(0, dtype=np.float32)
+        if self.matrix is None or len(self.matrix) < len(self.ids):
+            start = 0 if self.matrix is None else len(self.matrix)
+            self.matrix = np.memmap(os.path.join(self.path, 'vectors.f16'), dtype=np.float16, mode='r',
+                                    shape=(len(self.ids), self.dimensions))
+            cache = len(self.ids) * self.dimensions * 4 <= int(os.getenv("MEMMAP_CACHE_BYTES", 256 * 1024 * 1024))
+            norms = [] if start == 0 else [self.norms]
+            decoded = [] if start == 0 or self.decoded is None else [self.decoded]
+            for block_start in range(start, len(self.ids), SEARCH_BLOCK_ROWS):
+                block = np.asarray(self.matrix[block_start:block_start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                norms.append(np.einsum('ij,ij->i', block, block))
+                if cache:
+                    decoded.append(block)
+            self.norms = np.concatenate(norms)
+            self.decoded = np.concatenate(decoded) if cache and sum(map(len, decoded)) == len(self.ids) else None
+        return self.matrix, self.norms
+
+    def _append(self, ids: list[str], embeddings, documents: list[str], metadatas: list[dict]):
+        """Appends rows, tombstoning the rows they replace."""
+        vectors = np.asarray(embeddings, dtype=np.float16).reshape(len(ids), -1)
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+            self._write_meta({'name': self.name, 'metadata': self.metadata, 'dimensions': self.dimensions})
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {self.dimensions}")
+
+        self._bury([self.rows[id] for id in ids if id in self.rows])
+        # Vectors are written before their records, so a record never points past the end of the matrix
+        with open(os.path.join(self.path, 'vectors.f16'), 'ab') as vectors_file:
+            vectors_file.write(vectors.tobytes())
+        with open(os.path.join(self.path, 'records.jsonl'), 'a', encoding='utf-8') as records_file:
+            for id, document, metadata in zip(ids, documents, metadatas):
+                records_file.write(json.dumps({'id': id, 'document': document, 'metadata': metadata}) + '\n')
+        for id, document, metadata in zip(ids, documents, metadatas):
+            self.rows[id] = len(self.ids)
+            self.ids.append(id)
+            self.documents.append(document)
+            self.metadatas.append(metadata)
+        self.dead = np.concatenate([self.dead, np.zeros(len(ids), dtype=bool)])
+        self._save_tombstones()
+
+    def _bury(self, rows: list[int]):
+        """Marks rows as deleted."""
+        for row in rows:
+            self.dead[row] = True
+            self.rows.pop(self.ids[row], None)
+
+    def _save_tombstones(self):
+        """Writes the tombstone bitmap, one bit per row."""
+        with open(os.path.join(self.path, 'tombstones.bin.tmp'), 'wb') as tombstones_file:
+            tombstones_file.write(np.packbits(self.dead).tobytes())
+        os.replace(os.path.join(self.path, 'tombstones.bin.tmp'), os.path.join(self.path, 'tombstones.bin'))
+
+    def _maybe_compact(self):
+        """Compacts the files once the fraction of dead rows passes the compaction ratio."""
+        dead = int(self.dead.sum())
+        if dead and dead >= self.compaction_ratio * len(self.ids):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the collection with only its live rows."""
+        with self.lock:
+            live = np.flatnonzero(~self.dead)
+            matrix, _ = self._vectors()
+            with open(os.path.join(self.path, 'vectors.f16.tmp'), 'wb') as vectors_file:
+                vectors_file.write(np.ascontiguousarray(matrix[live]).tobytes())
+            self.matrix = self.norms = self.decoded = None
+            self.ids = [self.ids[row] for row in live]
+            self.documents = [self.documents[row] for row in live]
+            self.metadatas = [self.metadatas[row] for row in live]
+            self._rewrite_records()
+            os.replace(os.path.join(self.path, 'vectors.f16.tmp'), os.path.join(self.path, 'vectors.f16'))
+            self.dead = np.zeros(len(self.ids), dtype=bool)
+            self._save_tombstones()
+            self.rows = {id: row for row, id in enumerate(self.ids)}
+            logging.info(f"Compacted '{self.name}' to {len(self.ids)} rows.")
+
+    def count(self) -> int:
+        """Returns the number of live rows."""
+        return len(self.rows)
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        """Adds rows, ignoring IDs that already exist as Chroma does."""
+        with self.lock:
+            metadatas = metadatas or [{} for _ in ids]
+            new = [idx for idx, id in enumerate(ids) if id not in self.rows]
+            if len(new) < len(ids):
+                logging.warning(f"Add of existing IDs ignored in '{self.name}'.")
+            if new:
+                self._append([ids[idx] for idx in new], [embeddings[idx] for idx in new],
+                             [documents[idx] for idx in new], [dict(metadatas[idx]) for idx in new])
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        """Adds rows or replaces existing ones, merging their metadata."""
+        with self.lock:
+            metadatas = metadatas or [{} for _ in ids]
+            merged = [{**(self.metadatas[self.rows[id]] if id in self.rows else {}), **metadata}
+                      for id, metadata in zip(ids, metadatas)]
+            self._append(list(ids), embeddings, list(documents), merged)
+            self._maybe_compact()
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        """Replaces the vectors or documents of existing rows and merges their metadata."""
+        with self.lock:
+            existing = [id for id in ids if id in self.rows]
+            if not existing:
+                return
+            positions = [ids.index(id) for id in existing]
+            rows = [self.rows[id] for id in existing]
+            matrix, _ = self._vectors()
+            new_embeddings = [embeddings[pos] for pos in positions] if embeddings is not None else [np.asarray(matrix[row], dtype=np.float32) for row in rows]
+            new_documents = [documents[pos] for pos in positions] if documents is not None else [self.documents[row] for row in rows]
+            new_metadatas = [{**self.metadatas[row], **(metadatas[pos] if metadatas is not None else {})} for row, pos in zip(rows, positions)]
+            self._append(existing, new_embeddings, new_documents, new_metadatas)
+            self._maybe_compact()
+
+    def delete(self, ids=None, where=None):
+        """Deletes rows by ID or metadata filter."""
+        with self.lock:
+            rows = self._select(ids, where)
+            if not rows:
+                return
+            self._bury(rows)
+            self._save_tombstones()
+            self._maybe_compact()
+
+    def _select(self, ids=None, where=None) -> list[int]:
+        """Returns the live rows matching the IDs and metadata filter, in insertion order."""
+        if ids is not None:
+            rows = [self.rows[id] for id in ids if id in self.rows]
+        else:
+            rows = sorted(self.rows.values())
+        if where:
+            rows = [row for row in rows if matches(self.metadatas[row], where)]
+        return rows
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=('metadatas', 'documents')) -> dict:
+        """Returns live rows by ID or metadata filter, in the shape of a Chroma GetResult."""
+        with self.lock:
+            offset = offset or 0
+            rows = self._select(ids, where)[offset:offset + limit if limit is not None else None]
+            return self._result(rows, include)
+
+    def _result(self, rows: list[int], include) -> dict:
+        """Builds the result columns of a list of rows."""
+        result = {'ids': [self.ids[row] for row in rows], 'embeddings': None, 'documents': None, 'metadatas': None}
+        if 'documents' in include:
+            result['documents'] = [self.documents[row] for row in rows]
+        if 'metadatas' in include:
+            result['metadatas'] = [dict(self.metadatas[row]) for row in rows]
+        if 'embeddings' in include:
+            matrix, _ = self._vectors()
+            result['embeddings'] = [np.array(matrix[row], dtype=np.float32) for row in rows]
+        return result
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=('metadatas', 'documents', 'distances')) -> dict:
+        """
+        Finds the nearest live rows to each query embedding by squared L2 distance.
+        Every query is scored in one matrix product per block of rows.
+
+        Args:
+            query_embeddings: The query vectors.
+            n_results (int): The number of results per query.
+            where (dict): An optional metadata filter.
+            include: The columns to return.
+
+        Returns:
+            dict: The ids, documents, metadatas, distances and embeddings of each query's results.
+        """
+        with self.lock:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            matrix, norms = self._vectors()
+            allowed = ~self.dead
+            if where:
+                allowed = allowed.copy()
+                allowed[[row for row in np.flatnonzero(allowed) if not matches(self.metadatas[row], where)]] = False
+            k = min(n_results, int(allowed.sum()))
+
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            best_distances = np.zeros((len(queries), 0), dtype=np.float32)
+            if k:
+                query_norms = np.einsum('ij,ij->i', queries, queries)
+                for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+                    if self.decoded is not None:
+                        block = self.decoded[start:start + SEARCH_BLOCK_ROWS]
+                    else:
+                        block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                    distances = query_norms[:, None] + norms[None, start:start + len(block)] - 2 * (queries @ block.T)
+                    distances[:, ~allowed[start:start + len(block)]] = np.inf
+                    rows = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+                    distances = np.concatenate([best_distances, distances], axis=1)
+                    rows = np.concatenate([best_rows, rows], axis=1)
+                    top = np.argpartition(distances, k - 1, axis=1)[:, :k] if distances.shape[1] > k else np.argsort(distances, axis=1)
+                    best_distances = np.take_along_axis(distances, top, axis=1)
+                    best_rows = np.take_along_axis(rows, top, axis=1)
+                order = np.argsort(best_distances, axis=1)
+                best_distances = np.maximum(np.take_along_axis(best_distances, order, axis=1), 0)
+                best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+            results = [self._result(list(rows), include) for rows in best_rows]
+            return {
+                'ids': [result['ids'] for result in results],
+                'documents': [result['documents'] for result in results] if 'documents' in include else None,
+                'metadatas': [result['metadatas'] for result in results] if 'metadatas' in include else None,
+                'embeddings': [result['embeddings'] for result in results] if 'embeddings' in include else None,
+                'distances': [list(map(float, distances)) for distances in best_distances] if 'distances' in include else None
+            }
+
+
+def matches(metadata: dict, where: dict) -> bool:
+    """Evaluates the equality, $in and $and filters chroma_database uses against a row's metadata."""
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            if '$in' in condition and metadata.get(key) not in condition['$in']:
+                return False
+            if '$eq' in condition and metadata.get(key) != condition['$eq']:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class MemmapVectorStore:
+    """
+    A directory of MemmapCollections, standing in for a Chroma client.
+
+    Args:
+        directory (str): The directory holding one subdirectory per collection.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.collections: dict[str, MemmapCollection] = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_collection(self, name: str) -> MemmapCollection:
+        """Opens a collection, raising ValueError when it does not exist."""
+        with self.lock:
+            if name not in self.collections:
+                path = os.path.join(self.directory, name)
+                if not os.path.exists(os.path.join(path, 'meta.json')):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self.collections[name] = MemmapCollection(path, name)
+            return self.collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: dict = None) -> MemmapCollection:
+        """Opens a collection, creating it with the given metadata when it does not exist."""
+        try:
+            return self.get_collection(name)
+        except ValueError:
+            with self.lock:
+                if name not in self.collections:
+                    self.collections[name] = MemmapCollection(os.path.join(self.directory, name), name, metadata)
+                return self.collections[name]
+
+    def list_collections(self) -> list[MemmapCollection]:
+        """Returns every collection in the directory."""
+        names = sorted(entry for entry in os.listdir(self.directory)
+                       if os.path.exists(os.path.join(self.directory, entry, 'meta.json')))
+        return [self.get_collection(name) for name in names]
+
+    def delete_collection(self, name: str):
+        """Deletes a collection and its files."""
+        with self.lock:
+            self.collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def close(self):
+        """Releases the memory maps and cached vectors of every open collection."""
+        with self.lock:
+            self.collections.clear()
@@ -0,0 +1,212 @@
+import os
+
+import numpy as np
+
+from backend.database.embeddings_generator import count_tokens
+
+# Chunks overlap by up to chunk_text's chunk_overlap, searched within this many characters
+MAX_OVERLAP = 1000
+
+# Heading of the developer message that carries retrieved passages
+CONTEXT_HEADER = "Relevant information:\n"
+# Tokens of the heading, and of the number and line break around each passage
+CONTEXT_HEADER_TOKENS = 3
+PASSAGE_TOKEN_OVERHEAD = 3
+
+
+def select_passages(candidates: list[dict], n_results: int = 3, relevance: float = None,
+                    max_chunks: int = None) -> list[dict]:
+    """
+    Turns over-fetched search results into a small set of diverse passages. Neighboring
+    chunks of the same file are first merged into one passage without their overlapping
+    text, then passages are picked with maximal marginal relevance so near-duplicates
+    do not crowd out other material.
+
+    Args:
+        candidates (list[dict]): Search results, best first, with 'content', 'metadata',
+            'distance', the fused relevance 'score' and 'embedding'.
+        n_results (int): The number of passages to return.
+        relevance (float): The weight of relevance against diversity, between 0 and 1.
+        max_chunks (int): The maximum number of chunks merged into one passage.
+
+    Returns:
+        list[dict]: Passages with 'content', 'metadata' (including the merged 'chunk_indices')
+        and 'distance', ordered by selection.
+    """
+    relevance = relevance if relevance is not None else float(os.getenv("MMR_RELEVANCE", 0.7))
+    max_chunks = max_chunks if max_chunks is not None else int(os.getenv("PASSAGE_MAX_CHUNKS", 3))
+    passages = merge_adjacent(candidates, max_chunks)
+    if not passages:
+        return []
+
+    embeddings = normalize_rows(np.stack([passage.pop('embedding') for passage in passages]))
+    scores = np.array([passage.pop('score') for passage in passages], dtype=np.float32)
+    selected = mmr(embeddings, scores / scores.max(), min(n_results, len(passages)), relevance)
+    return [passages[idx] for idx in selected]
+
+
+def mmr(embeddings: np.ndarray, relevance_scores: np.ndarray, n_results: int, relevance: float) -> list[int]:
+    """
+    Picks rows by maximal marginal relevance: each step takes the row with the best
+    relevance * score - (1 - relevance) * max similarity to the rows already taken.
+
+    Args:
+        embeddings (np.ndarray): Unit length row vectors.
+        relevance_scores (np.ndarray): The relevance of each row to the query.
+        n_results (int): The number of rows to pick.
+        relevance (float): The weight of relevance against diversity.
+
+    Returns:
+        list[int]: The picked row indices, in the order they were picked.
+    """
+    similarities = embeddings @ embeddings.T
+    selected = [int(np.argmax(relevance_scores))]
+    # Highest similarity of every row to any selected row, updated as rows are picked
+    redundancy = similarities[selected[0]].copy()
+    while len(selected) < n_results:
+        marginal = relevance * relevance_scores - (1 - relevance) * redundancy
+        marginal[selected] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        np.maximum(redundancy, similarities[best], out=redundancy)
+    return selected
+
+
+def merge_adjacent(candidates: list[dict], max_chunks: int) -> list[dict]:
+    """
+    Merges candidates that are consecutive chunks of the same file into single passages,
+    keeping the best score and distance and the mean embedding of the merged chunks.
+
+    Args:
+        candidates (list[dict]): Search results, best first.
+        max_chunks (int): The maximum number of chunks merged into one passage.
+
+    Returns:
+        list[dict]: The passages, ordered by their best chunk.
+    """
+    by_chunk = {}
+    for rank, candidate in enumerate(candidates):
+        meta = candidate.get('metadata') or {}
+        if isinstance(meta.get('chunk_index'), int):
+            by_chunk.setdefault((meta.get('file_name'), meta['chunk_index']), rank)
+
+    passages = []
+    merged = set()
+    for rank, candidate in enumerate(candidates):
+        if rank in merged:
+            continue
+        meta = candidate.get('metadata') or {}
+        run = [rank]
+        if isinstance(meta.get('chunk_index'), int):
+            file_name = meta.get('file_name')
+            low = high = meta['chunk_index']
+            # Grows the run one neighbor at a time, taking the better ranked neighbor first
+            while len(run) < max_chunks:
+                before = by_chunk.get((file_name, low - 1))
+                after = by_chunk.get((file_name, high + 1))
+                neighbors = [neighbor for neighbor in (before, after) if neighbor is not None and neighbor not in merged]
+                if not neighbors:
+                    break
+                neighbor = min(neighbors)
+                if neighbor == before:
+                    low -= 1
+                else:
+                    high += 1
+                run.append(neighbor)
+                merged.add(neighbor)
+            run.sort(key=lambda r: candidates[r]['metadata']['chunk_index'])
+        merged.update(run)
+        passages.append(merge_run([candidates[r] for r in run], candidate))
+    return passages
+
+
+def merge_run(chunks: list[dict], best: dict) -> dict:
+    """Combines consecutive chunks, in file order, into one passage."""
+    content = chunks[0]['content']
+    for chunk in chunks[1:]:
+        content = join_overlapping(content, chunk['content'])
+    distances = [chunk['distance'] for chunk in chunks if chunk.get('distance') is not None]
+    metadata = dict(best.get('metadata') or {})
+    if len(chunks) > 1:
+        metadata['chunk_indices'] = [chunk['metadata']['chunk_index'] for chunk in chunks]
+        # The sum counts the overlapping text twice, so it never underestimates the passage
+        token_counts = [(chunk.get('metadata') or {}).get('token_count') for chunk in chunks]
+        metadata.pop('token_count', None)
+        if None not in token_counts:
+            metadata['token_count'] = sum(token_counts)
+    return {
+        'content': content,
+        'metadata': metadata,
+        'distance': min(distances) if distances else None,
+        'score': max(chunk['score'] for chunk in chunks),
+        'embedding': np.mean([np.asarray(chunk['embedding'], dtype=np.float32) for chunk in chunks], axis=0)
+    }
+
+
+def assemble_context(passages: list[dict], budget: int, max_distance: float = None,
+                     distance_margin: float = None, max_keyword_passages: int = None) -> str | None:
+    """
+    Builds the developer message of retrieved passages within a token budget. Passages
+    further than distance_margin from the best match, or than max_distance, are dropped,
+    so a question nothing in the course answers adds no context. The rest are added
+    closest first, skipping any that no longer fit. Passages found only by keyword have
+    no distance to compare, and are exactly the matches on identifiers and error codes
+    that embed poorly, so the first max_keyword_passages of them in rank order are added
+    after the others whether or not any passage passed the cutoff.
+
+    Args:
+        passages (list[dict]): Passages with 'content', 'metadata' and 'distance', which
+            is None for passages found only by keyword, in rank order.
+        budget (int): The maximum number of tokens of the message.
+        max_distance (float): The distance past which no passage is relevant.
+        distance_margin (float): How much further than the best match a passage may be.
+        max_keyword_passages (int): The number of passages found only by keyword to add.
+
+    Returns:
+        str | None: The message, or None when no passage is relevant or fits.
+    """
+    max_distance = max_distance if max_distance is not None else float(os.getenv("RETRIEVAL_MAX_DISTANCE", 0.5))
+    distance_margin = distance_margin if distance_margin is not None else float(os.getenv("RETRIEVAL_DISTANCE_MARGIN", 0.15))
+    if max_keyword_passages is None:
+        max_keyword_passages = int(os.getenv("RETRIEVAL_MAX_KEYWORD_PASSAGES", 2))
+    ranked = sorted((passage for passage in passages if passage.get('distance') is not None), key=lambda passage: passage['distance'])
+    relevant = []
+    if ranked and ranked[0]['distance'] <= max_distance:
+        cutoff = min(ranked[0]['distance'] + distance_margin, max_distance)
+        relevant = [passage for passage in ranked if passage['distance'] <= cutoff]
+    relevant += [passage for passage in passages if passage.get('distance') is None][:max_keyword_passages]
+
+    remaining = budget - CONTEXT_HEADER_TOKENS
+    selected = []
+    for passage in relevant:
+        tokens = (passage.get('metadata') or {}).get('token_count')
+        if tokens is None:
+            tokens = count_tokens(passage['content'])
+        tokens += PASSAGE_TOKEN_OVERHEAD
+        if tokens <= remaining:
+            selected.append(passage)
+            remaining -= tokens
+
+    if not selected:
+        return None
+    return CONTEXT_HEADER + ''.join(f"{idx}. {passage['content']}\n" for idx, passage in enumerate(selected, 1))
+
+
+def join_overlapping(first: str, second: str, probe: int = 20) -> str:
+    """
+    Appends second to first without the text they share, where the end of first
+    repeats the start of second.
+    """
+    head = second[:probe]
+    position = first.find(head, max(len(first) - MAX_OVERLAP, 0))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first + second[len(first) - position:]
+        position = first.find(head, position + 1)
+    return first + ' ' + second
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns the rows of a matrix scaled to unit length."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
@@ -0,0 +1,472 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from psycopg2 import sql
+from psycopg2.extras import execute_batch, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from backend.database.background_jobs import BackgroundJobs
+from backend.database.document_manifest import MANIFEST_COLUMNS
+from backend.database.postgres import get_db_config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Rows sent per INSERT statement
+WRITE_BATCH_ROWS = 500
+
+
+def vector_literal(embedding) -> str:
+    """Formats an embedding as a pgvector text literal."""
+    return '[' + ','.join(map(str, np.asarray(embedding, dtype=np.float32).tolist())) + ']'
+
+
+def parse_vector(text: str) -> list[float]:
+    """Parses a pgvector text literal."""
+    return json.loads(text)
+
+
+def where_clause(where: dict) -> tuple[sql.Composable, list]:
+    """
+    Translates the equality, $in and $and filters chroma_database uses into a condition on
+    the jsonb metadata column. Equality uses containment so it can be served by the GIN index.
+
+    Args:
+        where (dict): A Chroma style metadata filter.
+
+    Returns:
+        tuple[sql.Composable, list]: The condition and its parameters.
+    """
+    conditions = []
+    params = []
+    for key, condition in where.items():
+        if key == '$and':
+            for clause in condition:
+                clause_sql, clause_params = where_clause(clause)
+                conditions.append(clause_sql)
+                params.extend(clause_params)
+        elif isinstance(condition, dict) and '$in' in condition:
+            conditions.append(sql.SQL("(metadata -> %s) = ANY(%s::jsonb[])"))
+            params.extend([key, [json.dumps(value) for value in condition['$in']]])
+        else:
+            value = condition['$eq'] if isinstance(condition, dict) else condition
+            conditions.append(sql.SQL("metadata @> %s::jsonb"))
+            params.append(json.dumps({key: value}))
+    return sql.SQL(' AND ').join(conditions) if conditions else sql.SQL("TRUE"), params
+
+
+class PgKeywordIndex:
+    """
+    Keyword search over the document_chunks table with Postgres full-text search, in place of
+    the local SQLite index, which would go stale when several instances write to the same store.
+    Has the interface of KeywordIndex; writes are no-ops since the table keeps each chunk's
+    words in its generated content_tsv column.
+    """
+
+    def __init__(self, store: 'PgVectorStore'):
+        self.store = store
+
+    def is_indexed(self, collection: str) -> bool:
+        return True
+
+    def add(self, collection: str, ids: list[str], documents: list[str]):
+        pass
+
+    def delete(self, collection: str, ids: list[str]):
+        pass
+
+    def clear(self, collection: str):
+        pass
+
+    def search(self, collection: str, text: str, n_results: int = 5) -> list[tuple[str, float]]:
+        """Ranks the chunks of a collection containing any word of a query by cover density."""
+        terms = list(dict.fromkeys(re.findall(r'\w+', text.lower())))
+        if not terms:
+            return []
+        with self.store.cursor() as cur:
+            cur.execute("SELECT id, ts_rank_cd(content_tsv, query) FROM document_chunks, to_tsquery('english', %s) query "
+                        "WHERE collection = %s AND content_tsv @@ query ORDER BY 2 DESC LIMIT %s",
+                        (' | '.join(terms), collection, n_results))
+            return [(id, float(score)) for id, score in cur.fetchall()]
+
+
+class PgDocumentManifest:
+    """
+    The files of each collection kept in the document_files table, in place of the local
+    SQLite manifest so every instance lists the same files. Has the interface of
+    DocumentManifest, and entries are deleted with their collection.
+    """
+
+    def __init__(self, store: 'PgVectorStore'):
+        self.store = store
+
+    @staticmethod
+    def _entry(row) -> dict:
+        entry = dict(zip(MANIFEST_COLUMNS, row))
+        if entry['uploaded_at'] is not None:
+            entry['uploaded_at'] = entry['uploaded_at'].isoformat()
+        return entry
+
+    def is_recorded(self, collection: str) -> bool:
+        with self.store.cursor() as cur:
+            cur.execute("SELECT 1 FROM manifest_collections WHERE name = %s", (collection,))
+            return cur.fetchone() is not None
+
+    def record(self, collection: str, entries: list[dict]):
+        with self.store.cursor() as cur:
+            if entries:
+                execute_values(
+                    cur,
+                    f"INSERT INTO document_files (collection, {', '.join(MANIFEST_COLUMNS)}) VALUES %s "
+                    "ON CONFLICT (collection, file_name) DO UPDATE SET chunk_count = EXCLUDED.chunk_count, "
+                    "byte_size = EXCLUDED.byte_size, content_hash = EXCLUDED.content_hash, "
+                    "uploaded_at = EXCLUDED.uploaded_at, embedding_model = EXCLUDED.embedding_model",
+                    [(collection, *(entry[column] for column in MANIFEST_COLUMNS)) for entry in entries]
+                )
+            cur.execute("INSERT INTO manifest_collections (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (collection,))
+
+    def put(self, collection: str, entry: dict):
+        self.record(collection, [entry])
+
+    def get(self, collection: str, file_name: str) -> dict | None:
+        with self.store.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM document_files WHERE collection = %s AND file_name = %s",
+                        (collection, file_name))
+            row = cur.fetchone()
+        return self._entry(row) if row else None
+
+    def list(self, collection: str) -> list[dict]:
+        with self.store.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM document_files WHERE collection = %s ORDER BY file_name",
+                        (collection,))
+            return [self._entry(row) for row in cur.fetchall()]
+
+    def remove(self, collection: str, file_name: str):
+        with self.store.cursor() as cur:
+            cur.execute("DELETE FROM document_files WHERE collection = %s AND file_name = %s", (collection, file_name))
+
+    def clear(self, collection: str):
+        with self.store.cursor() as cur:
+            cur.execute("DELETE FROM document_files WHERE collection = %s", (collection,))
+
+
+class PgBackgroundJobs(BackgroundJobs):
+    """
+    Background jobs kept in the background_jobs table, in place of the per process cache, so
+    a poll reaching any instance sees the progress of a job running on another. Jobs older
+    than BACKGROUND_JOB_TTL are ignored and deleted when the next job is created.
+    """
+
+    COLUMNS = ('id', 'kind', 'status', 'done', 'total', 'error')
+
+    def __init__(self, store: 'PgVectorStore', ttl: float = None):
+        self.store = store
+        self.ttl = ttl if ttl is not None else float(os.getenv("BACKGROUND_JOB_TTL", 3600))
+
+    def create(self, kind: str, total: int, **details) -> dict:
+        job = {'id': uuid.uuid4().hex, 'kind': kind, 'status': 'queued', 'done': 0, 'total': total, 'error': None, **details}
+        with self.store.cursor() as cur:
+            cur.execute("DELETE FROM background_jobs WHERE created_at < now() - make_interval(secs => %s)", (self.ttl,))
+            cur.execute("INSERT INTO background_jobs (id, kind, status, done, total, details) VALUES (%s, %s, %s, %s, %s, %s::jsonb)",
+                        (job['id'], kind, job['status'], 0, total, json.dumps(details)))
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        with self.store.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(self.COLUMNS)}, details FROM background_jobs "
+                        "WHERE id = %s AND created_at >= now() - make_interval(secs => %s)", (job_id, self.ttl))
+            row = cur.fetchone()
+        return {**dict(zip(self.COLUMNS, row[:-1])), **row[-1]} if row else None
+
+    def _update(self, job_id: str, **changes):
+        with self.store.cursor() as cur:
+            cur.execute(sql.SQL("UPDATE background_jobs SET {changes} WHERE id = %s").format(
+                changes=sql.SQL(', ').join(sql.SQL("{} = %s").format(sql.Identifier(column)) for column in changes)
+            ), [*changes.values(), job_id])
+
+
+class PgVectorCollection:
+    """
+    A collection stored as rows of the document_chunks table. Each collection has its own
+    partial HNSW index over its rows, built concurrently once the first chunk has set its
+    dimensions, so a course's search never walks the graph of another course. Implements the subset of Chroma's
+    Collection interface used by chroma_database, with the same squared L2 distances and
+    metadata merging.
+
+    Args:
+        store (PgVectorStore): The store holding the connection pool.
+        name (str): The name of the collection.
+        metadata (dict): The metadata of the collection.
+        dimensions (int): The length of the collection's embeddings, or None before the first write.
+    """
+
+    def __init__(self, store: 'PgVectorStore', name: str, metadata: dict = None, dimensions: int = None):
+        self.store = store
+        self.name = name
+        self.metadata = metadata or None
+        self.dimensions = dimensions
+        self.keyword_index = store.keyword_index
+        self.manifest = store.manifest
+        self.ef_search = int(os.getenv("PGVECTOR_EF_SEARCH", 40))
+
+    @property
+    def index_name(self) -> sql.Identifier:
+        """Returns the name of the collection's HNSW index."""
+        return sql.Identifier(f"document_chunks_hnsw_{hashlib.md5(self.name.encode('utf-8')).hexdigest()[:16]}")
+
+    def _ensure_dimensions(self, cur, embeddings: list) -> bool:
+        """
+        Records the dimensions of a collection on its first write.
+
+        Returns:
+            bool: Whether this write set the dimensions, after which the index is built.
+        """
+        dimensions = len(embeddings[0])
+        recorded = False
+        if self.dimensions is None:
+            cur.execute("UPDATE vector_collections SET dimensions = %s WHERE name = %s AND dimensions IS NULL",
+                        (dimensions, self.name))
+            recorded = cur.rowcount == 1
+            cur.execute("SELECT dimensions FROM vector_collections WHERE name = %s", (self.name,))
+            self.dimensions = cur.fetchone()[0]
+        if dimensions != self.dimensions:
+            raise ValueError(f"Embedding dimension {dimensions} does not match collection dimensionality {self.dimensions}")
+        return recorded
+
+    def _create_index(self):
+        """
+        Builds the collection's HNSW index once its first write has committed. The build runs
+        CONCURRENTLY outside any transaction, since a plain CREATE INDEX would lock every
+        course's writes to the shared table while it scans it. A failed build is logged and
+        searches scan the course's rows until the index exists.
+        """
+        try:
+            with self.store.autocommit_cursor() as cur:
+                cur.execute(sql.SQL(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON document_chunks USING hnsw "
+                    "((embedding::vector({dimensions})) vector_l2_ops) WITH (m = 16, ef_construction = 64) "
+                    "WHERE collection = {name}"
+                ).format(index=self.index_name, dimensions=sql.Literal(self.dimensions), name=sql.Literal(self.name)))
+        except Exception as e:
+            logging.error(f"Error building the index of collection '{self.name}': {e}")
+
+    def _rows(self, ids, embeddings, documents, metadatas) -> list[tuple]:
+        """Builds the rows of an insert."""
+        metadatas = metadatas or [{} for _ in ids]
+        return [(self.name, id, document, json.dumps(metadata or {}), vector_literal(embedding))
+                for id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas)]
+
+    def count(self) -> int:
+        """Returns the number of chunks in the collection."""
+        with self.store.cursor() as cur:
+            cur.execute("SELECT count(*) FROM document_chunks WHERE collection = %s", (self.name,))
+            return cur.fetchone()[0]
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        """Adds chunks, ignoring IDs that already exist as Chroma does."""
+        if not ids:
+            return
+        with self.store.cursor() as cur:
+            recorded = self._ensure_dimensions(cur, embeddings)
+            execute_values(cur, "INSERT INTO document_chunks (collection, id, document, metadata, embedding) VALUES %s "
+                           "ON CONFLICT (collection, id) DO NOTHING",
+                           self._rows(ids, embeddings, documents, metadatas), page_size=WRITE_BATCH_ROWS)
+        if recorded:
+            self._create_index()
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        """Adds chunks or replaces existing ones, merging their metadata."""
+        if not ids:
+            return
+        with self.store.cursor() as cur:
+            recorded = self._ensure_dimensions(cur, embeddings)
+            execute_values(cur, "INSERT INTO document_chunks (collection, id, document, metadata, embedding) VALUES %s "
+                           "ON CONFLICT (collection, id) DO UPDATE SET document = EXCLUDED.document, "
+                           "embedding = EXCLUDED.embedding, metadata = document_chunks.metadata || EXCLUDED.metadata",
+                           self._rows(ids, embeddings, documents, metadatas), page_size=WRITE_BATCH_ROWS)
+        if recorded:
+            self._create_index()
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        """Replaces the vectors or documents of existing chunks and merges their metadata."""
+        recorded = False
+        with self.store.cursor() as cur:
+            if embeddings is not None:
+                recorded = self._ensure_dimensions(cur, embeddings)
+            execute_batch(cur, "UPDATE document_chunks SET document = COALESCE(%s, document), "
+                          "embedding = COALESCE(%s::vector, embedding), metadata = metadata || %s::jsonb "
+                          "WHERE collection = %s AND id = %s", [
+                              (documents[idx] if documents is not None else None,
+                               vector_literal(embeddings[idx]) if embeddings is not None else None,
+                               json.dumps(metadatas[idx] if metadatas is not None else {}), self.name, id)
+                              for idx, id in enumerate(ids)
+                          ], page_size=WRITE_BATCH_ROWS)
+        if recorded:
+            self._create_index()
+
+    def delete(self, ids=None, where=None):
+        """Deletes chunks by ID or metadata filter."""
+        if ids is None and not where:
+            return
+        condition, params = self._filter(ids, where)
+        with self.store.cursor() as cur:
+            cur.execute(sql.SQL("DELETE FROM document_chunks WHERE {condition}").format(condition=condition), params)
+
+    def _filter(self, ids=None, where=None) -> tuple[sql.Composable, list]:
+        """Builds the condition selecting chunks of this collection by ID and metadata filter."""
+        conditions = [sql.SQL("collection = %s")]
+        params = [self.name]
+        if ids is not None:
+            conditions.append(sql.SQL("id = ANY(%s)"))
+            params.append(list(ids))
+        if where:
+            where_sql, where_params = where_clause(where)
+            conditions.append(where_sql)
+            params.extend(where_params)
+        return sql.SQL(' AND ').join(conditions), params
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=('metadatas', 'documents')) -> dict:
+        """Returns chunks by ID or metadata filter in insertion order, in the shape of a Chroma GetResult."""
+        condition, params = self._filter(ids, where)
+        query = sql.SQL("SELECT id, document, metadata, {embedding} FROM document_chunks WHERE {condition} "
+                        "ORDER BY seq LIMIT %s OFFSET %s").format(
+            embedding=sql.SQL("embedding::text" if 'embeddings' in include else "NULL"), condition=condition)
+        with self.store.cursor() as cur:
+            cur.execute(query, params + [limit, offset or 0])
+            rows = cur.fetchall()
+        return {
+            'ids': [row[0] for row in rows],
+            'documents': [row[1] for row in rows] if 'documents' in include else None,
+            'metadatas': [row[2] for row in rows] if 'metadatas' in include else None,
+            'embeddings': [parse_vector(row[3]) for row in rows] if 'embeddings' in include else None
+        }
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=('metadatas', 'documents', 'distances')) -> dict:
+        """
+        Finds the nearest chunks to each query embedding through the collection's HNSW index.
+        The index expression is repeated in the ORDER BY so the planner uses it, and ef_search
+        is raised to n_results when more results are requested than it would return.
+
+        Args:
+            query_embeddings: The query vectors.
+            n_results (int): The number of results per query.
+            where (dict): An optional metadata filter.
+            include: The columns to return.
+
+        Returns:
+            dict: The ids, documents, metadatas, distances and embeddings of each query's results.
+        """
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': []}
+        if self.dimensions is None:
+            for _ in query_embeddings:
+                for column in results.values():
+                    column.append([])
+        else:
+            condition, params = self._filter(where=where)
+            vector = sql.SQL("embedding::vector({dimensions})").format(dimensions=sql.Literal(self.dimensions))
+            query = sql.SQL(
+                "SELECT id, document, metadata, ({vector} <-> %s::vector({dimensions})) ^ 2, {embedding} FROM document_chunks "
+                "WHERE {condition} ORDER BY {vector} <-> %s::vector({dimensions}) LIMIT %s"
+            ).format(vector=vector, dimensions=sql.Literal(self.dimensions), condition=condition,
+                     embedding=sql.SQL("embedding::text" if 'embeddings' in include else "NULL"))
+            with self.store.cursor() as cur:
+                cur.execute("SET LOCAL hnsw.ef_search = %s", (max(self.ef_search, n_results),))
+                for embedding in query_embeddings:
+                    literal = vector_literal(embedding)
+                    cur.execute(query, [literal] + params + [literal, n_results])
+                    rows = cur.fetchall()
+                    results['ids'].append([row[0] for row in rows])
+                    results['documents'].append([row[1] for row in rows])
+                    results['metadatas'].append([row[2] for row in rows])
+                    results['distances'].append([float(row[3]) for row in rows])
+                    results['embeddings'].append([parse_vector(row[4]) for row in rows] if 'embeddings' in include else None)
+        for column in ('documents', 'metadatas', 'distances', 'embeddings'):
+            if column not in include:
+                results[column] = None
+        return results
+
+
+class PgVectorStore:
+    """
+    Course collections kept in Postgres with pgvector, standing in for a Chroma client so every
+    server instance shares the same documents. Connections come from a pool sized by
+    PGVECTOR_POOL_SIZE, and callers wait for a free connection rather than failing.
+    """
+
+    def __init__(self, pool_size: int = None):
+        pool_size = pool_size or int(os.getenv("PGVECTOR_POOL_SIZE", 8))
+        self.pool = ThreadedConnectionPool(1, pool_size, **get_db_config())
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.keyword_index = PgKeywordIndex(self)
+        self.manifest = PgDocumentManifest(self)
+        self.jobs = PgBackgroundJobs(self)
+
+    @contextmanager
+    def cursor(self):
+        """Yields a cursor in a transaction that commits when the block exits cleanly."""
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.pool.putconn(conn)
+
+    @contextmanager
+    def autocommit_cursor(self):
+        """Yields a cursor outside any transaction, for statements such as CREATE INDEX CONCURRENTLY."""
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    yield cur
+            finally:
+                conn.autocommit = False
+                self.pool.putconn(conn)
+
+    def get_collection(self, name: str) -> PgVectorCollection:
+        """Opens a collection, raising ValueError when it does not exist."""
+        with self.cursor() as cur:
+            cur.execute("SELECT metadata, dimensions FROM vector_collections WHERE name = %s", (name,))
+            row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Collection {name} does not exist.")
+        return PgVectorCollection(self, name, row[0], row[1])
+
+    def get_or_create_collection(self, name: str, metadata: dict = None) -> PgVectorCollection:
+        """Opens a collection, creating it with the given metadata when it does not exist."""
+        with self.cursor() as cur:
+            cur.execute("INSERT INTO vector_collections (name, metadata) VALUES (%s, %s::jsonb) ON CONFLICT (name) DO NOTHING",
+                        (name, json.dumps(metadata or {})))
+        return self.get_collection(name)
+
+    def list_collections(self) -> list[PgVectorCollection]:
+        """Returns every collection."""
+        with self.cursor() as cur:
+            cur.execute("SELECT name, metadata, dimensions FROM vector_collections ORDER BY name")
+            return [PgVectorCollection(self, *row) for row in cur.fetchall()]
+
+    def delete_collection(self, name: str):
+        """Deletes a collection, its chunks and its index, dropped concurrently so other courses keep writing."""
+        collection = PgVectorCollection(self, name)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM vector_collections WHERE name = %s", (name,))
+        with self.autocommit_cursor() as cur:
+            cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index}").format(index=collection.index_name))
+
+    def close(self):
+        """Closes every pooled connection."""
+        self.pool.closeall()
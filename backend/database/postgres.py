@@ -9,7 +9,7 @@ from psycopg2.extras import RealDictCursor, RealDictRow
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-def get_db_connection():
+def get_db_config() -> dict:
     # Retrieve required environment variables
     dbname = os.environ['DB_NAME']
     user = os.environ['DB_USER']
@@ -18,7 +18,7 @@ def get_db_connection():
     port = int(os.getenv('DB_PORT', 5432))    # Default to 5432 if not set
 
     # Database connection configuration
-    db_config = {
+    return {
         "dbname": dbname,
         "user": user,
         "password": password,
@@ -26,8 +26,9 @@ def get_db_connection():
         "port": port
     }
 
+def get_db_connection():
     # Connect to PostgreSQL using psycopg2
-    conn = psycopg2.connect(**db_config)
+    conn = psycopg2.connect(**get_db_config())
     return conn
 
 def create_user(display_name, email, role='student'):
@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+
+class SemanticCache:
+    """
+    Caches answers per course keyed on the embedding of the question. A lookup
+    returns the answer of the most similar cached question when the cosine
+    similarity is above the threshold. Entries expire after a TTL and the least
+    recently used entry of a course is evicted once the course is full.
+
+    Args:
+        threshold (float): The minimum cosine similarity for a hit.
+        ttl (float): The number of seconds an answer stays valid.
+        max_entries (int): The maximum number of answers cached per course.
+    """
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SEMANTIC_CACHE_TTL", 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("SEMANTIC_CACHE_SIZE", 256))
+        self.courses: dict[str, OrderedDict] = {}
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+        self.next_key = 0
+
+    def lookup(self, course: str, model: str, embedding) -> str | None:
+        """
+        Returns the cached answer for the most similar question asked in the course.
+
+        Args:
+            course (str): The course the question was asked in.
+            model (str): The model that must have produced the answer.
+            embedding: The embedding of the question.
+
+        Returns:
+            str or None: The cached answer, or None on a miss.
+        """
+        entries = self.courses.get(course)
+        answer = None
+        if entries:
+            self.expire(course)
+            candidates = [(key, entry) for key, entry in entries.items() if entry['model'] == model]
+            if candidates:
+                matrix = np.stack([entry['embedding'] for _, entry in candidates])
+                similarities = matrix @ normalize(embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    entries.move_to_end(key)
+                    answer = entry['answer']
+
+        if answer is None:
+            self.misses[course] = self.misses.get(course, 0) + 1
+        else:
+            self.hits[course] = self.hits.get(course, 0) + 1
+        return answer
+
+    def store(self, course: str, model: str, embedding, answer: str):
+        """
+        Caches an answer for a question asked in the course.
+
+        Args:
+            course (str): The course the question was asked in.
+            model (str): The model that produced the answer.
+            embedding: The embedding of the question.
+            answer (str): The answer to cache.
+        """
+        entries = self.courses.setdefault(course, OrderedDict())
+        entries[self.next_key] = {
+            'embedding': normalize(embedding),
+            'model': model,
+            'answer': answer,
+            'expires': time.monotonic() + self.ttl
+        }
+        self.next_key += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def expire(self, course: str):
+        """Removes the expired answers of a course."""
+        now = time.monotonic()
+        entries = self.courses.get(course, {})
+        for key in [key for key, entry in entries.items() if entry['expires'] <= now]:
+            del entries[key]
+
+    def invalidate(self, course: str):
+        """Drops every cached answer of a course, called when its documents change."""
+        if self.courses.pop(course, None):
+            logging.info(f"Invalidated the semantic cache for '{course}'.")
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of every course.
+
+        Returns:
+            dict: The entries, hits, misses and hit rate per course.
+        """
+        stats = {}
+        for course in set(self.courses) | set(self.hits) | set(self.misses):
+            hits, misses = self.hits.get(course, 0), self.misses.get(course, 0)
+            stats[course] = {
+                'entries': len(self.courses.get(course, {})),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0
+            }
+        return stats
+
+
+def normalize(embedding) -> np.ndarray:
+    """Returns the embedding as a unit length float32 vector."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Shared by the chat and dashboard routers
+answer_cache = SemanticCache()
@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+
+
+class QuotaEngine:
+    """
+    Tracks the OpenAI tokens each user spends per course with token buckets.
+    A bucket holds up to the daily limit and refills continuously at the
+    limit per day, so every check and charge is O(1) and needs no daily reset.
+    Charges may take a bucket below zero, which blocks the user until the
+    bucket refills past zero again.
+
+    Args:
+        limit (int): The number of tokens a user may spend per course per day.
+        period (float): The number of seconds it takes an empty bucket to refill.
+    """
+
+    def __init__(self, limit: int = None, period: float = 86400):
+        self.limit = limit if limit is not None else int(os.getenv("CHAT_TOKEN_LIMIT", 20000))
+        self.refill_rate = self.limit / period
+        self.buckets: dict[tuple[str, str], list[float]] = {}
+        self.lock = threading.Lock()
+
+    def _refill(self, user_id: str, course: str) -> list[float]:
+        """Returns the bucket of a user and course, topped up for the time since it was last used."""
+        now = time.monotonic()
+        bucket = self.buckets.get((user_id, course))
+        if bucket is None:
+            bucket = self.buckets[(user_id, course)] = [float(self.limit), now]
+        else:
+            bucket[0] = min(float(self.limit), bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+        return bucket
+
+    def remaining(self, user_id: str, course: str) -> int:
+        """
+        Returns the number of tokens a user has left in a course.
+
+        Args:
+            user_id (str): The user's unique ID.
+            course (str): The course's unique ID.
+
+        Returns:
+            int: The remaining tokens, never below zero.
+        """
+        with self.lock:
+            return max(int(self._refill(user_id, course)[0]), 0)
+
+    def allows(self, user_id: str, course: str) -> bool:
+        """
+        Checks whether a user may send another request in a course.
+
+        Args:
+            user_id (str): The user's unique ID.
+            course (str): The course's unique ID.
+
+        Returns:
+            bool: True if the user has tokens left.
+        """
+        return self.remaining(user_id, course) > 0
+
+    def charge(self, user_id: str, course: str, tokens: int):
+        """
+        Deducts the prompt and completion tokens of a request from a user's bucket.
+
+        Args:
+            user_id (str): The user's unique ID.
+            course (str): The course's unique ID.
+            tokens (int): The number of tokens the request used.
+        """
+        with self.lock:
+            self._refill(user_id, course)[0] -= tokens
+
+
+# Shared by every chat request
+usage_quota = QuotaEngine()
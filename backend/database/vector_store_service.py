@@ -0,0 +1,63 @@
+import logging
+import threading
+
+from chromadb.api.client import SharedSystemClient
+
+from backend.database.chroma_database import ensure_document_manifest, ensure_keyword_index, initialize_vector_store
+from backend.database.document_manifest import close_document_manifests
+from backend.database.keyword_index import close_keyword_indexes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+
+class VectorStoreService:
+    """
+    The one vector store client of the server, opened when the application starts and shared
+    by every router. Warming runs a search against every collection so the vector index and
+    the keyword index are loaded before the first question rather than during it, records the
+    files of collections missing from the document manifest, and the service reports ready
+    once that is done.
+
+    Args:
+        client: The vector store client, or None to open the one selected by VECTOR_STORE.
+    """
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else initialize_vector_store()
+        self.ready = threading.Event()
+        self.warmed_collections = 0
+
+    def warm(self):
+        """Loads the indexes of every collection, then marks the service ready."""
+        for collection in self.client.list_collections():
+            try:
+                ensure_keyword_index(collection)
+                ensure_document_manifest(collection)
+                sample = collection.get(limit=1, include=['embeddings'])
+                if sample['ids']:
+                    collection.query(query_embeddings=[list(sample['embeddings'][0])], n_results=1, include=[])
+                self.warmed_collections += 1
+            except Exception as e:
+                # A collection that fails to load is searched cold rather than keeping the server unready
+                logging.error(f"Error warming collection '{collection.name}': {e}")
+        logging.info(f"Vector store warmed {self.warmed_collections} collections.")
+        self.ready.set()
+
+    def is_ready(self) -> bool:
+        return self.ready.is_set()
+
+    def close(self):
+        """Releases the vector store, the keyword indexes and the document manifests."""
+        self.ready.clear()
+        if hasattr(self.client, 'close'):
+            self.client.close()
+        else:
+            # Chroma keeps a shared system per directory, stopped here so its files are flushed
+            system = getattr(self.client, '_system', None)
+            if system is not None:
+                system.stop()
+            SharedSystemClient.clear_system_cache()
+        close_keyword_indexes()
+        close_document_manifests()
+        logging.info("Vector store closed.")
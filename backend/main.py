@@ -1,6 +1,8 @@
 """Initializing the FastAPI application"""
 
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
 from fastapi.exceptions import RequestValidationError
 from fastapi.templating import Jinja2Templates
@@ -10,14 +12,32 @@ from backend.api.routes.web import web_router
 from backend.api.routes.openai import openai_router
 from backend.api.routes.auth import msal_auth
 from backend.api.routes.dashboard import dashboard_router
+from backend.database.vector_store_service import VectorStoreService
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the vector store shared by the routers and warms its indexes in the background,
+    so the server accepts connections while /ready reports when searches are fast.
+    The store is closed on shutdown, once any warming still running has finished.
+    """
+    vector_store = await asyncio.to_thread(VectorStoreService)
+    app.state.vector_store = vector_store
+    warming = asyncio.create_task(asyncio.to_thread(vector_store.warm))
+    try:
+        yield
+    finally:
+        await asyncio.gather(warming, return_exceptions=True)
+        await asyncio.to_thread(vector_store.close)
+
 # Set up FastAPI settings
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add Routes
 app.include_router(web_router)
@@ -51,6 +71,19 @@ if os.getenv("environment") == "production":
     app.add_middleware(HTTPSRedirectMiddleware)
 
 
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """
+    Readiness probe, failing until the vector store has been warmed
+    Returns:
+        JSONResponse with status 200 once ready, 503 before
+    """
+    vector_store: VectorStoreService = getattr(app.state, 'vector_store', None)
+    if vector_store is None or not vector_store.is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming"})
+    return JSONResponse(status_code=200, content={"status": "ready", "collections": vector_store.warmed_collections})
+
+
 @app.exception_handler(HTTPError)
 @app.exception_handler(404)
 @app.exception_handler(RequestValidationError)
@@ -7,10 +7,10 @@ def CreateSampleClassSections(num = 1):
     tmpList = []
     for i in range(0, num):
         tmpClass = ClassSection()
-        tmpClass.id = uuid.uuid4()                          # Replace with UUID of Class
         tmpClass.name = "Intro to C and Unix"                     # Replace with Name of Class
         tmpClass.professor_id = "Zesheng Chen"        # Replace with Professor of Class
         tmpClass.section = "CS 232-01"                                # Replace with Section of Class
+        tmpClass.id = uuid.uuid5(uuid.NAMESPACE_URL, tmpClass.section)  # Replace with UUID of Class, stable so uploads and chats share a course
         tmpClass.teaching_assistant_id = "Example Student " + str(i)  # Replace with TA
         tmpClass.splash = "/static/assets/20230504-Crecent-Bridge-Drone-TE-001.jpg"
         tmpClass.prompt = (
@@ -31,6 +31,6 @@ def CreateSampleConversation(UserID : str):
     
     EXAMPLE_CONVERSATION = Conversation(UserID, Model.JOHN)
     EXAMPLE_CONVERSATION.name = "CS 232 Help"                      # Replace with Name of conversation
-    EXAMPLE_CONVERSATION.classID = uuid.uuid4()                     # Replace with UUID of conversation
+    EXAMPLE_CONVERSATION.classID = CreateSampleClassSections()[0].id  # Replace with UUID of conversation
     tmpList.append(EXAMPLE_CONVERSATION)
     return tmpList
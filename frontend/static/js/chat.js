@@ -1,4 +1,5 @@
 window.addEventListener("load", () => {
+    UpdateChatNum();
     let preloads = document.querySelectorAll('article');
     for (let i = 0; i < preloads.length; i++) {
         preloads[i].innerHTML = RenderMarkdown(preloads[i].innerHTML.trim());
@@ -34,44 +35,30 @@ function addChat() {
 }
 
 function AskQuestion() {
-    $.ajax({
-        type: "POST",
-        url: "/ask",
-        data: JSON.stringify({
+    fetch("/ask", {
+        method: "POST",
+        body: JSON.stringify({
             user_content: document.getElementById("question").value,
             currentConversationId: new URLSearchParams(window.location.search).get('chatID').toString(),
-        }),        
+            stream: true,
+        }),
         headers: {
             "X-Content-Type-Options": "nosniff",
             "Content-Security-Policy": "frame-ancestors 'none'",
             "X-Frame-Options": "DENY",
             "Content-Type": "application/json"
         },
-        success: function(data) {
-            conversation = JSON.parse(data);
-            document.getElementById("LOADING").classList.add("hidden");
-            createChatBubble(conversation.at(-1)["content"], ["btm-left", "teaching_assistant"]);
-            document.getElementById("question").value = "";
-            document.getElementById("question").disabled = false;
-        },
-        statusCode:  {
-            405: (value) => {
-                alert("Error: " + JSON.parse(value.responseText).detail);
-            },
-            401: (value) => {
-                alert("Error 401: Unauthorised");
-            },
-            429: (value) => {
-                document.getElementById("LOADING").classList.add("hidden");
-                createChatBubble("I'm really glad you reached out to discuss this, but unfortunately, I have to wrap up now. If you'd like to continue, you can reach out to the professor or the other TA.", ["btm-left", "teaching_assistant"]);
-                document.getElementById("question").value = "";
-            },
-            500: (value) => {
-                document.getElementById("LOADING").classList.add("hidden");
-                createChatBubble("Unfortunately, I can't answer that question right now. Please try again later.", ["btm-left", "teaching_assistant"]);
-                document.getElementById("question").value = "";
-            }
+    }).then(async (response) => {
+        if (!response.ok) {
+            AskQuestionError(response);
+            return;
         }
+        await ReadAnswerStream(response);
+        document.getElementById("question").value = "";
+        document.getElementById("question").disabled = false;
+        UpdateChatNum();
+    }).catch(() => {
+        AskQuestionError({status: 500});
     });
     createChatBubble(document.getElementById("question").value.replace(/&/g,'&amp;').replace(/</g,'&lt;').replace(/>/g,'&gt;'), ["btm-right", "student"]);
     document.getElementById("question").disabled = true;
@@ -81,6 +68,62 @@ function AskQuestion() {
     } catch {}
 }
 
+async function ReadAnswerStream(response) {
+    // Renders the Server-Sent Events from /ask as the tokens arrive
+    let reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    let answer = "";
+    let bubble = null;
+    while (true) {
+        let { value, done } = await reader.read();
+        if (done)
+            break;
+        buffer += value;
+        let frames = buffer.split("\n\n");
+        buffer = frames.pop();
+        for (let frame of frames) {
+            let event = frame.match(/^event: (.*)$/m)?.[1];
+            let data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] ?? "null");
+            if (event === "delta") {
+                answer += data.content;
+                if (bubble === null) {
+                    document.getElementById("LOADING").classList.add("hidden");
+                    bubble = createChatBubble(answer, ["btm-left", "teaching_assistant"]);
+                } else {
+                    bubble.innerHTML = RenderMarkdown(answer);
+                }
+            } else if (event === "done") {
+                if (bubble === null) {
+                    document.getElementById("LOADING").classList.add("hidden");
+                    createChatBubble(data.at(-1)["content"], ["btm-left", "teaching_assistant"]);
+                }
+            } else if (event === "error") {
+                AskQuestionError({status: 500});
+            }
+        }
+    }
+}
+
+function AskQuestionError(response) {
+    switch (response.status) {
+        case 405:
+            response.json().then((value) => alert("Error: " + value.detail));
+            break;
+        case 401:
+            alert("Error 401: Unauthorised");
+            break;
+        case 429:
+            document.getElementById("LOADING").classList.add("hidden");
+            createChatBubble("I'm really glad you reached out to discuss this, but unfortunately, I have to wrap up now. If you'd like to continue, you can reach out to the professor or the other TA.", ["btm-left", "teaching_assistant"]);
+            document.getElementById("question").value = "";
+            break;
+        default:
+            document.getElementById("LOADING").classList.add("hidden");
+            createChatBubble("Unfortunately, I can't answer that question right now. Please try again later.", ["btm-left", "teaching_assistant"]);
+            document.getElementById("question").value = "";
+    }
+}
+
 function createChatBubble(dialogue, classes){
     wrapper = document.getElementById("conversation");
     
@@ -132,19 +175,21 @@ function createChatBubble(dialogue, classes){
         wrapper.appendChild(feedbackWrapper);
     }
     containerWrapper.scrollIntoView({ behavior: "smooth", block:"end" });
+    return displayContainer;
 }
 
 function RenderMarkdown(text) {
     let markdownToHTML = new showdown.Converter();
-    UpdateChatNum();
     return markdownToHTML.makeHtml(text);
 }
 
 function UpdateChatNum() {
-    try {
-        let log = JSON.parse(atob(decodeURIComponent(document.cookie).split(';').find((e)=>{return e.includes("chat_usage")}).trim().substring(14).split("").reverse().join("").substring(2)));
-        document.getElementById("counter").innerHTML = 'Daily Questions Left: ' + (log.max - log.count) + '/' + log.max;
-        if (log.max - log.count === 0)
-            document.getElementById("question").disabled = true;
-    } catch{}
-}
\ No newline at end of file
+    fetch("/quota?chatID=" + new URLSearchParams(window.location.search).get('chatID').toString())
+        .then((response) => response.ok ? response.json() : Promise.reject(response))
+        .then((quota) => {
+            document.getElementById("counter").innerHTML = 'Daily Tokens Left: ' + quota.remaining + '/' + quota.limit;
+            if (quota.remaining === 0)
+                document.getElementById("question").disabled = true;
+        })
+        .catch(() => {});
+}
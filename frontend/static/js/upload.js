@@ -190,7 +190,7 @@ uploadBtn.addEventListener("click", async () => {
   }
 
   try {
-    const response = await fetch("/dashboard/upload", {
+    const response = await fetch(`/dashboard/upload${courseQuery()}`, {
       method: "POST",
       body: formData
     });
@@ -247,13 +247,22 @@ async function deleteFile(fileName) {
     return;
   }
   try {
-    const response = await fetch(`/dashboard/delete/${fileName}`, {
+    const response = await fetch(`/dashboard/delete/${fileName}${courseQuery()}`, {
       method: "DELETE"
     });
     if (!response.ok) {
       const err = await response.json();
       throw new Error(err.detail || "Delete failed.");
     }
+    // Large files are deleted in the background
+    if (response.status === 202) {
+      const { job_id } = await response.json();
+      if (!(await waitForJob(job_id))) {
+        // The job is no longer known, so the file list shows what is left
+        location.reload();
+        return;
+      }
+    }
     // Remove from UI or reload
     document.getElementById(`file-${sanitizeId(fileName)}`).remove();
     alert(`File "${fileName}" has been deleted.`);
@@ -263,6 +272,30 @@ async function deleteFile(fileName) {
   }
 }
 
+// Poll a background job until it finishes, throwing if it failed. Returns null when
+// the job is unknown, e.g. expired, since errors are rendered as HTML pages
+async function waitForJob(jobId) {
+  while (true) {
+    const response = await fetch(`/dashboard/jobs/${jobId}`);
+    if (response.status === 404) {
+      return null;
+    }
+    const isJson = (response.headers.get("content-type") || "").includes("application/json");
+    if (!response.ok || !isJson) {
+      const err = isJson ? await response.json() : {};
+      throw new Error(err.detail || `Lost track of the job (status ${response.status}).`);
+    }
+    const job = await response.json();
+    if (job.status === "done") {
+      return job;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "The job failed.");
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+}
+
 // Update File
 function initiateUpdate(fileName) {
   // Trigger hidden input
@@ -284,7 +317,7 @@ async function handleUpdateFile(event) {
   formData.append("file", newFile);
 
   try {
-    const response = await fetch(`/dashboard/update/${fileName}`, {
+    const response = await fetch(`/dashboard/update/${fileName}${courseQuery()}`, {
       method: "PUT",
       body: formData
     });
@@ -304,6 +337,12 @@ async function handleUpdateFile(event) {
   }
 }
 
+// Query string selecting the course whose files the page manages
+function courseQuery() {
+  const courseId = document.getElementById("classView").dataset.courseId;
+  return courseId ? `?course_id=${encodeURIComponent(courseId)}` : "";
+}
+
 // Utility to sanitize an ID-friendly string
 function sanitizeId(filename) {
   return filename.replace(/\s/g, "_").replace(/[\\/]/g, "_");
@@ -322,7 +361,7 @@ async function deleteAllFiles() {
       <span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span>`;
   
     try {
-      const response = await fetch("/dashboard/delete_all", {
+      const response = await fetch(`/dashboard/delete_all${courseQuery()}`, {
         method: "DELETE",
       });
   
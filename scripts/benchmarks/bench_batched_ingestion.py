@@ -0,0 +1,52 @@
+"""Benchmark: embedding a large upload one chunk per request vs in token-aware batches
+
+Embeds the chunks of a simulated 300 page textbook against a fake OpenAI
+embeddings server, first with one request per chunk (the previous
+add_documents) and then with generate_embeddings.
+
+Usage:
+    python -m scripts.benchmarks.bench_batched_ingestion
+"""
+
+import os
+import time
+
+from scripts.benchmarks.fake_openai import FakeOpenAI
+
+LATENCY = 0.1
+PER_INPUT_LATENCY = 0.0005
+CHUNKS = 600
+
+
+def main():
+    with FakeOpenAI(latency=LATENCY, per_input_latency=PER_INPUT_LATENCY) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ.setdefault("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+
+        from backend.database import chroma_database
+
+        chunks = [f"Chapter {i // 20}, section {i}: " + "pointers and memory " * 150 for i in range(CHUNKS)]
+
+        chroma_database.embedding_cache.clear()
+        server.requests = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            chroma_database.generate_embedding(chunk)
+        per_chunk, per_chunk_requests = time.perf_counter() - start, server.requests
+
+        chroma_database.embedding_cache.clear()
+        server.requests = 0
+        start = time.perf_counter()
+        chroma_database.generate_embeddings(chunks)
+        batched, batched_requests = time.perf_counter() - start, server.requests
+
+        print(f"{CHUNKS} chunks, fake API latency {LATENCY * 1000:.0f} ms + {PER_INPUT_LATENCY * 1000:.1f} ms per input")
+        print(f"{'mode':>10} {'requests':>9} {'seconds':>8}")
+        print(f"{'per chunk':>10} {per_chunk_requests:>9} {per_chunk:>8.2f}")
+        print(f"{'batched':>10} {batched_requests:>9} {batched:>8.2f}")
+        print(f"speedup: {per_chunk / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark: chat throughput per worker as the number of in-flight requests grows
+
+Runs the OpenAI calls made by one /ask request (moderation, query embedding and
+completion) against a fake OpenAI server, N requests at a time on a single event
+loop, once with the blocking client and once with the async client.
+
+Usage:
+    python -m scripts.benchmarks.bench_chat_concurrency
+"""
+
+import asyncio
+import os
+import time
+
+from scripts.benchmarks.fake_openai import FakeOpenAI
+
+LATENCY = 0.2
+IN_FLIGHT = [1, 2, 4, 8, 16]
+
+
+async def blocking_turn(client, generate_embedding):
+    client.moderations.create(model="omni-moderation-latest", input="What is a pointer?")
+    generate_embedding("What is a pointer?")
+    client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "What is a pointer?"}])
+
+
+async def async_turn(client, generate_embedding_async):
+    await client.moderations.create(model="omni-moderation-latest", input="What is a pointer?")
+    await generate_embedding_async("What is a pointer?")
+    await client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "What is a pointer?"}])
+
+
+async def run(turn, in_flight: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(turn() for _ in range(in_flight)))
+    return in_flight / (time.perf_counter() - start)
+
+
+async def main():
+    with FakeOpenAI(latency=LATENCY) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ.setdefault("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+
+        from openai import AsyncOpenAI, OpenAI
+        from backend.database.chroma_database import generate_embedding, generate_embedding_async
+
+        sync_client, async_client = OpenAI(), AsyncOpenAI()
+
+        print(f"fake OpenAI latency: {LATENCY * 1000:.0f} ms per call, 3 calls per /ask")
+        print(f"{'in-flight':>10} {'blocking req/s':>16} {'async req/s':>13}")
+        for in_flight in IN_FLIGHT:
+            blocking = await run(lambda: blocking_turn(sync_client, generate_embedding), in_flight)
+            non_blocking = await run(lambda: async_turn(async_client, generate_embedding_async), in_flight)
+            print(f"{in_flight:>10} {blocking:>16.2f} {non_blocking:>13.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Benchmark: retrieval latency as the number of courses grows
+
+Stores the same number of chunks for every course and times a top-3 query for
+one course three ways: against a single shared collection holding every course
+(the previous file_collection), against the shared collection with a course_id
+metadata filter, and against the course's own collection.
+
+Usage:
+    python -m scripts.benchmarks.bench_course_partitioning
+"""
+
+import random
+import statistics
+import tempfile
+import time
+
+import chromadb
+
+from backend.database.chroma_database import get_course_collection, query_collection
+
+COURSE_COUNTS = [1, 5, 20, 50]
+CHUNKS_PER_COURSE = 400
+DIMENSIONS = 256
+QUERIES = 50
+
+
+def vectors(rng: random.Random, count: int) -> list[list[float]]:
+    return [[rng.gauss(0, 1) for _ in range(DIMENSIONS)] for _ in range(count)]
+
+
+def measure(search, queries) -> float:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def run(courses: int) -> tuple[float, float, float]:
+    rng = random.Random(courses)
+    with tempfile.TemporaryDirectory() as directory:
+        client = chromadb.PersistentClient(directory)
+        shared = client.create_collection("shared_collection")
+        for course in range(courses):
+            embeddings = vectors(rng, CHUNKS_PER_COURSE)
+            ids = [f"{course}-{idx}" for idx in range(CHUNKS_PER_COURSE)]
+            documents = [f"Course {course} chunk {idx}" for idx in range(CHUNKS_PER_COURSE)]
+            shared.add(ids=ids, embeddings=embeddings, documents=documents,
+                       metadatas=[{"course_id": str(course), "chunk_index": idx} for idx in range(CHUNKS_PER_COURSE)])
+            get_course_collection(client, str(course)).add(
+                ids=ids, embeddings=embeddings, documents=documents,
+                metadatas=[{"chunk_index": idx} for idx in range(CHUNKS_PER_COURSE)])
+
+        queries = vectors(rng, QUERIES)
+        target = get_course_collection(client, "0")
+        everything = measure(lambda query: query_collection(shared, query, 3), queries)
+        filtered = measure(lambda query: shared.query(query_embeddings=[query], n_results=3,
+                                                      where={"course_id": "0"}), queries)
+        partitioned = measure(lambda query: query_collection(target, query, 3), queries)
+        return everything, filtered, partitioned
+
+
+def main():
+    print(f"{CHUNKS_PER_COURSE} chunks per course, {DIMENSIONS} dimensions, median of {QUERIES} queries (ms)")
+    print(f"{'courses':>8} {'chunks':>7} {'shared':>8} {'filtered':>9} {'per course':>11}")
+    for courses in COURSE_COUNTS:
+        everything, filtered, partitioned = run(courses)
+        print(f"{courses:>8} {courses * CHUNKS_PER_COURSE:>7} {everything:>8.2f} {filtered:>9.2f} {partitioned:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark: nearest_neighbor_search latency with a cold and a warm embedding cache
+
+Embeds a set of questions against a fake OpenAI server and queries an in-memory
+Chroma collection three times: with an empty cache, with the memory tier warm,
+and after a simulated restart where only the on-disk tier is warm.
+
+Usage:
+    python -m scripts.benchmarks.bench_embedding_cache
+"""
+
+import os
+import statistics
+import tempfile
+import time
+
+from scripts.benchmarks.fake_openai import FakeOpenAI
+
+LATENCY = 0.15
+QUESTIONS = [f"How do I use pointers in exercise {i}?" for i in range(50)]
+
+
+def measure(search) -> list[float]:
+    latencies = []
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        search(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    with FakeOpenAI(latency=LATENCY) as server, tempfile.TemporaryDirectory() as directory:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ.setdefault("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+        os.environ["EMBEDDING_CACHE_DIRECTORY"] = os.path.join(directory, "embeddings")
+
+        import chromadb
+        from backend.database import chroma_database
+        from backend.database.embedding_cache import EmbeddingCache
+        from scripts.benchmarks.fake_openai import fake_vector
+
+        client = chromadb.Client()
+        collection = chroma_database.get_course_collection(client, "bench_embedding_cache")
+        collection.add(ids=[str(i) for i in range(200)], documents=[f"chunk {i}" for i in range(200)],
+                       embeddings=[fake_vector(f"chunk {i}") for i in range(200)])
+
+        def search(question):
+            chroma_database.nearest_neighbor_search(client, "bench_embedding_cache", question, n_results=3)
+
+        cold = measure(search)
+        warm = measure(search)
+        # A new cache over the same directory behaves like a restarted instance
+        chroma_database.embedding_cache = EmbeddingCache(directory=os.environ["EMBEDDING_CACHE_DIRECTORY"])
+        restarted = measure(search)
+
+        print(f"fake OpenAI latency: {LATENCY * 1000:.0f} ms, {len(QUESTIONS)} questions")
+        print(f"{'cache':>16} {'mean ms':>9} {'p95 ms':>8}")
+        for name, latencies in [("cold", cold), ("warm (memory)", warm), ("warm (disk)", restarted)]:
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"{name:>16} {statistics.mean(latencies):>9.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: query latency and ingestion throughput of the embedding providers
+
+Embeds single questions (query latency) and a batch of textbook chunks
+(ingestion throughput) with the OpenAI provider and the local ONNX provider.
+The OpenAI provider talks to the real API when OPENAI_API_KEY is set and
+--fake is not given, otherwise to a fake server with LATENCY seconds of delay.
+The ONNX model is downloaded by ChromaDB on the first run.
+
+Usage:
+    python -m scripts.benchmarks.bench_embedding_providers [--fake]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+from scripts.benchmarks.fake_openai import FakeOpenAI
+
+LATENCY = 0.15
+QUESTIONS = [f"How do I free memory allocated in exercise {i}?" for i in range(30)]
+CHUNKS = [f"Chapter {i // 20}, section {i}: " + "pointers and memory " * 40 for i in range(256)]
+
+
+def run(provider: str) -> tuple[float, float]:
+    from backend.database import chroma_database
+
+    chroma_database.embedding_cache.clear()
+    # Loads the model or opens the connection before timing
+    chroma_database.generate_embedding("warm up", provider)
+
+    latencies = []
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        chroma_database.generate_embedding(question, provider)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    chroma_database.generate_embeddings(CHUNKS, provider)
+    throughput = len(CHUNKS) / (time.perf_counter() - start)
+    return statistics.median(latencies), throughput
+
+
+def report(results: dict[str, tuple[float, float]]):
+    print(f"{len(QUESTIONS)} queries, {len(CHUNKS)} chunks")
+    print(f"{'provider':>10} {'query p50 ms':>13} {'chunks/s':>9}")
+    for provider, (latency, throughput) in results.items():
+        print(f"{provider:>10} {latency:>13.1f} {throughput:>9.0f}")
+
+
+def main():
+    os.environ.setdefault("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+    results = {}
+    if "--fake" in sys.argv or not os.getenv("OPENAI_API_KEY"):
+        with FakeOpenAI(latency=LATENCY) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+            results["openai"] = run("openai")
+    else:
+        results["openai"] = run("openai")
+    try:
+        results["onnx"] = run("onnx")
+    except Exception as e:
+        print(f"onnx provider unavailable: {e}")
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: recall and latency of the memory-mapped store against Chroma
+
+Stores course-sized corpora of random ada-sized vectors in Chroma and in the
+memory-mapped float16 store, then measures recall@k of each against exact
+float64 search, the median latency of a single query, and the time per query
+when QUERIES questions are searched in one batch.
+
+Usage:
+    python -m scripts.benchmarks.bench_memmap_store
+"""
+
+import statistics
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from backend.database.memmap_store import MemmapVectorStore
+
+CORPUS_SIZES = [1000, 5000, 20000]
+DIMENSIONS = 1536
+QUERIES = 50
+K = 10
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    distances = (queries ** 2).sum(axis=1)[:, None] + (corpus ** 2).sum(axis=1)[None, :] - 2 * queries @ corpus.T
+    return np.argsort(distances, axis=1)[:, :K]
+
+
+def recall(results: list[list[str]], truth: np.ndarray) -> float:
+    return statistics.mean(len({int(id) for id in ids} & set(expected)) / K for ids, expected in zip(results, truth))
+
+
+def measure(collection, queries: np.ndarray) -> tuple[float, float, list[list[str]]]:
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(collection.query(query_embeddings=[query.tolist()], n_results=K, include=['distances'])['ids'][0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    collection.query(query_embeddings=queries.tolist(), n_results=K, include=['distances'])
+    batched = (time.perf_counter() - start) * 1000 / len(queries)
+    return statistics.median(latencies), batched, results
+
+
+def run(size: int) -> dict[str, tuple[float, float, float]]:
+    rng = np.random.default_rng(size)
+    # Clustered vectors, like chunks of the same chapters
+    centers = rng.standard_normal((size // 50, DIMENSIONS))
+    corpus = centers[rng.integers(len(centers), size=size)] + 0.5 * rng.standard_normal((size, DIMENSIONS))
+    queries = centers[rng.integers(len(centers), size=QUERIES)] + 0.5 * rng.standard_normal((QUERIES, DIMENSIONS))
+    truth = exact_top_k(corpus, queries)
+    ids = [str(idx) for idx in range(size)]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            'chroma': chromadb.PersistentClient(directory).create_collection('bench'),
+            'memmap': MemmapVectorStore(f"{directory}/memmap").get_or_create_collection('bench')
+        }
+        for name, collection in stores.items():
+            for start in range(0, size, 5000):
+                collection.add(ids=ids[start:start + 5000], embeddings=corpus[start:start + 5000].tolist(),
+                               documents=[""] * len(ids[start:start + 5000]))
+            single, batched, found = measure(collection, queries)
+            results[name] = (recall(found, truth), single, batched)
+    return results
+
+
+def main():
+    print(f"{DIMENSIONS} dimensions, recall@{K} against exact search, median of {QUERIES} queries (ms)")
+    print(f"{'chunks':>7} {'store':>7} {'recall':>7} {'single':>8} {'batched':>8}")
+    for size in CORPUS_SIZES:
+        for name, (found, single, batched) in run(size).items():
+            print(f"{size:>7} {name:>7} {found:>7.3f} {single:>8.2f} {batched:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
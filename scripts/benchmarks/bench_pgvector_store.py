@@ -0,0 +1,110 @@
+"""Benchmark: recall and latency of the pgvector store at 10k, 100k and 1M chunks
+
+Loads clustered random vectors into a pgvector collection and measures, for
+several hnsw.ef_search values, recall@k against exact search and the median
+latency of a top-k query. Exact results are computed in NumPy block by block
+while the corpus is generated, so the 1M corpus is never held in memory. Also
+times an exact sequential scan in Postgres for comparison. Needs a Postgres
+with the vector extension in the DB_* settings, and the schema from
+scripts/database/create_tables.py or migrate_chroma_to_pgvector.py.
+
+Usage:
+    python -m scripts.benchmarks.bench_pgvector_store [max chunks]
+"""
+
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from backend.database.pgvector_store import PgVectorStore, vector_literal
+
+CORPUS_SIZES = [10_000, 100_000, 1_000_000]
+DIMENSIONS = 1536
+BLOCK = 10_000
+QUERIES = 50
+K = 10
+EF_SEARCH = [40, 100, 200]
+
+
+def load(collection, size: int, rng: np.random.Generator, centers: np.ndarray, queries: np.ndarray) -> tuple[np.ndarray, float]:
+    """Inserts the corpus in blocks and returns the exact top-k row of each query and the load time."""
+    best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    elapsed = 0.0
+    for start in range(0, size, BLOCK):
+        count = min(BLOCK, size - start)
+        block = (centers[rng.integers(len(centers), size=count)] + 0.5 * rng.standard_normal((count, DIMENSIONS))).astype(np.float32)
+        distances = (queries ** 2).sum(axis=1)[:, None] + (block ** 2).sum(axis=1)[None, :] - 2 * queries @ block.T
+        distances = np.concatenate([best_distances, distances], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + count), (len(queries), count))], axis=1)
+        top = np.argsort(distances, axis=1)[:, :K]
+        best_distances = np.take_along_axis(distances, top, axis=1)
+        best_rows = np.take_along_axis(rows, top, axis=1)
+
+        begin = time.perf_counter()
+        collection.add(ids=[str(row) for row in range(start, start + count)], embeddings=block, documents=[""] * count)
+        elapsed += time.perf_counter() - begin
+    return best_rows, elapsed
+
+
+def measure(collection, queries: np.ndarray, truth: np.ndarray) -> tuple[float, float]:
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        ids = collection.query(query_embeddings=[query], n_results=K, include=['distances'])['ids'][0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append({int(id) for id in ids})
+    recall = statistics.mean(len(ids & set(expected)) / K for ids, expected in zip(found, truth))
+    return recall, statistics.median(latencies)
+
+
+def exact_scan(store: PgVectorStore, collection, queries: np.ndarray) -> float:
+    latencies = []
+    for query in queries[:10]:
+        start = time.perf_counter()
+        with store.cursor() as cur:
+            cur.execute("SET LOCAL enable_indexscan = off")
+            cur.execute("SELECT id FROM document_chunks WHERE collection = %s ORDER BY embedding <-> %s::vector LIMIT %s",
+                        (collection.name, vector_literal(query), K))
+            cur.fetchall()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def run(store: PgVectorStore, size: int):
+    rng = np.random.default_rng(size)
+    centers = rng.standard_normal((size // 50, DIMENSIONS)).astype(np.float32)
+    queries = (centers[rng.integers(len(centers), size=QUERIES)] + 0.5 * rng.standard_normal((QUERIES, DIMENSIONS))).astype(np.float32)
+    name = f"bench_{size}"
+    store.delete_collection(name)
+    collection = store.get_or_create_collection(name)
+    try:
+        truth, elapsed = load(collection, size, rng, centers, queries)
+        print(f"{size:>9} loaded and indexed in {elapsed:.0f} s ({size / elapsed:.0f} chunks/s)")
+        for ef_search in EF_SEARCH:
+            collection.ef_search = ef_search
+            recall, latency = measure(collection, queries, truth)
+            print(f"{size:>9} {'hnsw ' + str(ef_search):>10} {recall:>7.3f} {latency:>9.2f}")
+        print(f"{size:>9} {'exact':>10} {1.0:>7.3f} {exact_scan(store, collection, queries):>9.2f}")
+    finally:
+        store.delete_collection(name)
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_SIZES[-1]
+    store = PgVectorStore()
+    print(f"{DIMENSIONS} dimensions, recall@{K} against exact search, median of {QUERIES} queries (ms)")
+    print(f"{'chunks':>9} {'search':>10} {'recall':>7} {'latency':>9}")
+    try:
+        for size in CORPUS_SIZES:
+            if size <= max_size:
+                run(store, size)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Local stand-in for the OpenAI API used by the benchmarks
+
+Every endpoint sleeps for a fixed latency before answering so the benchmarks
+measure how the application overlaps network waits, not the speed of OpenAI.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+
+from aiohttp import web
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class FakeOpenAI:
+    """Runs a fake OpenAI server on a background thread
+    Args:
+        latency: seconds to wait before answering each request
+        per_input_latency: extra seconds per embedding input, to model larger requests
+        max_inputs: largest embeddings batch accepted before answering 400
+    """
+
+    def __init__(self, latency: float = 0.2, per_input_latency: float = 0.0, max_inputs: int = 2048, port: int = 8765):
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.max_inputs = max_inputs
+        self.port = port
+        self.requests = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/moderations", self.moderations)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, "127.0.0.1", self.port).start())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def moderations(self, request: web.Request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response({
+            "id": "modr-fake",
+            "model": "omni-moderation-latest",
+            "results": [{"flagged": False, "categories": {}, "category_scores": {}}],
+        })
+
+    async def embeddings(self, request: web.Request):
+        self.requests += 1
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if len(inputs) > self.max_inputs:
+            return web.json_response({"error": {"message": "Too many inputs", "type": "invalid_request_error"}}, status=400)
+        await asyncio.sleep(self.latency + self.per_input_latency * len(inputs))
+        return web.json_response({
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": idx, "embedding": fake_vector(text)}
+                for idx, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    async def chat_completions(self, request: web.Request):
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency)
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for word in ["A ", "fake ", "answer."]:
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+                }
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if body.get("stream_options", {}).get("include_usage"):
+                usage = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 4, "total_tokens": 14},
+                }
+                await response.write(f"data: {json.dumps(usage)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        return web.json_response({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "A fake answer."}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 4, "total_tokens": 14},
+        })
+
+
+def fake_vector(text: str) -> list[float]:
+    """Returns a deterministic unit-length embedding for text"""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
@@ -0,0 +1,3 @@
+-- Extension: vector
+
+CREATE EXTENSION IF NOT EXISTS vector;
@@ -0,0 +1,25 @@
+-- Table: public.background_jobs
+
+CREATE TABLE IF NOT EXISTS public.background_jobs
+(
+    id text COLLATE pg_catalog."default" NOT NULL,
+    kind text COLLATE pg_catalog."default" NOT NULL,
+    status text COLLATE pg_catalog."default" NOT NULL,
+    done integer NOT NULL DEFAULT 0,
+    total integer NOT NULL,
+    error text COLLATE pg_catalog."default",
+    details jsonb NOT NULL DEFAULT '{}'::jsonb,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT background_jobs_pkey PRIMARY KEY (id)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.background_jobs
+    OWNER to "teaching-assistant";
+
+COMMENT ON TABLE public.background_jobs
+    IS 'Progress of dashboard operations that outlive their request, polled from any instance';
+
+COMMENT ON COLUMN public.background_jobs.details
+    IS 'What the dashboard shows about the job, such as the file name';
@@ -0,0 +1,80 @@
+-- Table: public.vector_collections
+
+CREATE TABLE IF NOT EXISTS public.vector_collections
+(
+    name text COLLATE pg_catalog."default" NOT NULL,
+    metadata jsonb NOT NULL DEFAULT '{}'::jsonb,
+    dimensions integer,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    CONSTRAINT vector_collections_pkey PRIMARY KEY (name)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.vector_collections
+    OWNER to "teaching-assistant";
+
+COMMENT ON TABLE public.vector_collections
+    IS 'Document collections, one per course';
+
+COMMENT ON COLUMN public.vector_collections.metadata
+    IS 'Collection settings such as the embedding provider';
+
+COMMENT ON COLUMN public.vector_collections.dimensions
+    IS 'Length of the embeddings, set by the first chunk added';
+
+-- Table: public.document_chunks
+
+CREATE TABLE IF NOT EXISTS public.document_chunks
+(
+    collection text COLLATE pg_catalog."default" NOT NULL,
+    id text COLLATE pg_catalog."default" NOT NULL,
+    seq bigserial NOT NULL,
+    document text COLLATE pg_catalog."default" NOT NULL,
+    metadata jsonb NOT NULL DEFAULT '{}'::jsonb,
+    embedding vector NOT NULL,
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', document)) STORED,
+    CONSTRAINT document_chunks_pkey PRIMARY KEY (collection, id),
+    CONSTRAINT document_chunks_collection_fkey FOREIGN KEY (collection)
+        REFERENCES public.vector_collections (name) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.document_chunks
+    OWNER to "teaching-assistant";
+
+COMMENT ON TABLE public.document_chunks
+    IS 'Chunks of uploaded course documents and their embeddings';
+
+COMMENT ON COLUMN public.document_chunks.seq
+    IS 'Insertion order, kept when a chunk is updated';
+
+COMMENT ON COLUMN public.document_chunks.content_tsv
+    IS 'Stemmed words of the chunk, searched for exact terms alongside the embedding';
+
+COMMENT ON COLUMN public.document_chunks.embedding
+    IS 'Searched through a partial HNSW index per collection, built concurrently after its first write';
+
+-- Index: document_chunks_seq
+
+CREATE INDEX IF NOT EXISTS document_chunks_seq
+    ON public.document_chunks USING btree
+    (collection ASC NULLS LAST, seq ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Index: document_chunks_metadata
+
+CREATE INDEX IF NOT EXISTS document_chunks_metadata
+    ON public.document_chunks USING gin
+    (metadata jsonb_path_ops)
+    TABLESPACE pg_default;
+
+-- Index: document_chunks_content
+
+CREATE INDEX IF NOT EXISTS document_chunks_content
+    ON public.document_chunks USING gin
+    (content_tsv)
+    TABLESPACE pg_default;
@@ -0,0 +1,51 @@
+-- Table: public.manifest_collections
+
+CREATE TABLE IF NOT EXISTS public.manifest_collections
+(
+    name text COLLATE pg_catalog."default" NOT NULL,
+    CONSTRAINT manifest_collections_pkey PRIMARY KEY (name),
+    CONSTRAINT manifest_collections_name_fkey FOREIGN KEY (name)
+        REFERENCES public.vector_collections (name) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.manifest_collections
+    OWNER to "teaching-assistant";
+
+COMMENT ON TABLE public.manifest_collections
+    IS 'Collections whose files are recorded in document_files';
+
+-- Table: public.document_files
+
+CREATE TABLE IF NOT EXISTS public.document_files
+(
+    collection text COLLATE pg_catalog."default" NOT NULL,
+    file_name text COLLATE pg_catalog."default" NOT NULL,
+    chunk_count integer NOT NULL,
+    byte_size bigint NOT NULL,
+    content_hash text COLLATE pg_catalog."default" NOT NULL,
+    uploaded_at timestamp with time zone,
+    embedding_model text COLLATE pg_catalog."default",
+    CONSTRAINT document_files_pkey PRIMARY KEY (collection, file_name),
+    CONSTRAINT document_files_collection_fkey FOREIGN KEY (collection)
+        REFERENCES public.vector_collections (name) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.document_files
+    OWNER to "teaching-assistant";
+
+COMMENT ON TABLE public.document_files
+    IS 'Files ingested into each collection, listed without reading their chunks';
+
+COMMENT ON COLUMN public.document_files.content_hash
+    IS 'SHA-256 of the uploaded content';
+
+COMMENT ON COLUMN public.document_files.uploaded_at
+    IS 'Time of the last upload or update, unknown for files recorded from existing chunks';
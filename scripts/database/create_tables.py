@@ -21,6 +21,7 @@ CREATE_DATABASE_SCRIPT = "create_database.sql"
 DROP_DATABASE_SCRIPT = "drop_database.sql"
 
 CREATE_SCRIPTS = [
+    "create_extension_vector.sql",
     "create_type_course_subject.sql",
     "create_type_role.sql",
     "create_table_users.sql",
@@ -28,6 +29,9 @@ CREATE_SCRIPTS = [
     "create_table_user_courses.sql",
     "create_table_user_conversations.sql",
     "create_table_messages.sql",
+    "create_table_document_chunks.sql",
+    "create_table_document_files.sql",
+    "create_table_background_jobs.sql",
 ]
 
 def parse_sql_statements(sql_script):
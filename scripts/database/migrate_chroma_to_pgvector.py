@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+
+import chromadb
+from psycopg2.extensions import connection
+
+from backend.database.pgvector_store import PgVectorStore
+from backend.database.postgres import get_db_connection
+from scripts.database.create_tables import run_sql_script
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA_SCRIPTS = [
+    "create_extension_vector.sql",
+    "create_table_document_chunks.sql",
+    "create_table_document_files.sql",
+    "create_table_background_jobs.sql",
+]
+
+def create_schema():
+    """
+    Creates the vector extension and the document_chunks, document_files and background_jobs tables if they do not exist yet,
+    so the migration can run against a database created before they were added.
+    """
+    conn: connection = get_db_connection()
+    try:
+        for script in SCHEMA_SCRIPTS:
+            run_sql_script(conn, script)
+        conn.commit()
+    finally:
+        conn.close()
+
+def migrate_collection(source, store: PgVectorStore, batch_size: int) -> tuple[int, int]:
+    """
+    Copies the chunks of a Chroma collection into the pgvector store, keeping their IDs,
+    documents, metadata and embeddings, and the collection's metadata. Chunks that already
+    exist are left alone, so an interrupted migration can be run again.
+
+    Args:
+        source (Collection): The Chroma collection.
+        store (PgVectorStore): The destination store.
+        batch_size (int): The number of chunks read and written at a time.
+
+    Returns:
+        tuple[int, int]: The number of chunks in the Chroma collection and in the pgvector collection.
+    """
+    destination = store.get_or_create_collection(source.name, metadata=source.metadata)
+    total = source.count()
+    for offset in range(0, total, batch_size):
+        batch = source.get(limit=batch_size, offset=offset, include=['embeddings', 'documents', 'metadatas'])
+        destination.add(ids=batch['ids'], embeddings=batch['embeddings'], documents=batch['documents'],
+                        metadatas=batch['metadatas'])
+        logger.info("%s: copied %d of %d chunks", source.name, min(offset + batch_size, total), total)
+    return total, destination.count()
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Copy every Chroma collection into the document_chunks table of the Postgres database in the DB_* settings."
+    )
+    parser.add_argument('--chroma-directory', default=os.getenv("CHROMA_PERSISTENT_DIRECTORY"),
+                        help='Chroma persistent directory (default: CHROMA_PERSISTENT_DIRECTORY)')
+    parser.add_argument('--collection', action='append', help='Collection to copy, repeatable (default: all)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Chunks copied per batch (default: 1000)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not args.chroma_directory:
+        logger.error("No Chroma directory given and CHROMA_PERSISTENT_DIRECTORY is not set.")
+        return 1
+
+    create_schema()
+    client = chromadb.PersistentClient(args.chroma_directory)
+    store = PgVectorStore()
+    names = args.collection or [collection.name for collection in client.list_collections()]
+
+    failed = False
+    try:
+        for name in names:
+            source_count, destination_count = migrate_collection(client.get_collection(name), store, args.batch_size)
+            if destination_count < source_count:
+                logger.error("%s: %d chunks in Chroma but %d in pgvector", name, source_count, destination_count)
+                failed = True
+            else:
+                logger.info("%s: migrated %d chunks", name, source_count)
+    finally:
+        store.close()
+
+    if failed:
+        return 1
+    logger.info("Migration complete. Set VECTOR_STORE=pgvector to serve from Postgres.")
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+
+from backend.database.chroma_database import (DEFAULT_COLLECTION, collection_provider, course_collection_name, delete_file,
+                                              document_manifest, ensure_document_manifest, ensure_keyword_index,
+                                              find_course_collection, initialize_vector_store, keyword_index,
+                                              manifest_entries)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def migrate_files(client, course_id: str, file_names: list[str] | None, batch_size: int, move: bool) -> int:
+    """
+    Copies the chunks uploaded before retrieval was partitioned by course from the shared
+    file_collection into a course's collection, keeping their IDs, documents, metadata and
+    embeddings, and records the copied files in the course's manifest. Chunks that already
+    exist in the course are left alone, so an interrupted migration can be run again.
+
+    Args:
+        client: The vector store selected by VECTOR_STORE.
+        course_id (str): The course the files belong to.
+        file_names (list[str]): The files to copy, or None for every file in file_collection.
+        batch_size (int): The number of chunks read and written at a time.
+        move (bool): Whether to delete the copied files from file_collection afterwards.
+
+    Returns:
+        int: The number of chunks copied.
+    """
+    source = find_course_collection(client, None)
+    if source is None:
+        logger.info("No %s collection, nothing to migrate.", DEFAULT_COLLECTION)
+        return 0
+
+    # The course collection must search with the provider that embedded the copied chunks
+    provider = collection_provider(source)
+    destination = find_course_collection(client, course_id)
+    if destination is None:
+        destination = client.get_or_create_collection(name=course_collection_name(course_id),
+                                                      metadata={'embedding_provider': provider})
+    elif collection_provider(destination) != provider:
+        raise ValueError(f"{destination.name} is embedded by {collection_provider(destination)}, "
+                         f"but {DEFAULT_COLLECTION} by {provider}.")
+    ensure_keyword_index(destination)
+    ensure_document_manifest(destination)
+
+    where = None
+    if file_names is not None:
+        where = {'file_name': file_names[0]} if len(file_names) == 1 else {'file_name': {'$in': file_names}}
+
+    copied = 0
+    documents, metadatas = [], []
+    offset = 0
+    while True:
+        batch = source.get(where=where, limit=batch_size, offset=offset, include=['embeddings', 'documents', 'metadatas'])
+        if not batch['ids']:
+            break
+        destination.add(ids=batch['ids'], embeddings=batch['embeddings'], documents=batch['documents'],
+                        metadatas=batch['metadatas'])
+        keyword_index(destination).add(destination.name, batch['ids'], batch['documents'])
+        documents += batch['documents']
+        metadatas += batch['metadatas']
+        copied += len(batch['ids'])
+        offset += batch_size
+        logger.info("%s: copied %d chunks", destination.name, copied)
+
+    entries = manifest_entries(destination, documents, metadatas)
+    document_manifest(destination).record(destination.name, entries)
+
+    if move:
+        for entry in entries:
+            delete_file(source, entry['file_name'], batch_size)
+        logger.info("Removed %d files from %s.", len(entries), DEFAULT_COLLECTION)
+    return copied
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=f"Copy documents uploaded before retrieval was partitioned by course from {DEFAULT_COLLECTION} "
+                    "into the collection of their course, in the store selected by VECTOR_STORE."
+    )
+    parser.add_argument('--course-id', required=True, help='Course the files belong to')
+    parser.add_argument('--file', action='append', dest='files', help='File to copy, repeatable (default: all)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Chunks copied per batch (default: 1000)')
+    parser.add_argument('--move', action='store_true', help=f'Delete the copied files from {DEFAULT_COLLECTION}')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    client = initialize_vector_store()
+    try:
+        copied = migrate_files(client, args.course_id, args.files, args.batch_size, args.move)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    finally:
+        if hasattr(client, 'close'):
+            client.close()
+    logger.info("Copied %d chunks into %s.", copied, course_collection_name(args.course_id))
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,52 @@
+import unittest
+
+from unittest.mock import MagicMock
+
+from backend.database.background_jobs import BackgroundJobs, background_jobs, get_background_jobs
+
+
+class TestBackgroundJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = BackgroundJobs()
+
+    def test_run_reports_progress_and_completion(self):
+        job = self.jobs.create('delete_file', 3, file_name='a.txt')
+        seen = []
+
+        def operation(progress):
+            for done in (2, 3):
+                progress(done)
+                seen.append(self.jobs.get(job['id'])['status'])
+
+        self.jobs.run(job['id'], operation)
+
+        self.assertEqual(seen, ['running', 'running'])
+        self.assertEqual(self.jobs.get(job['id']), {**job, 'status': 'done', 'done': 3})
+
+    def test_run_records_the_error_of_a_failed_job(self):
+        job = self.jobs.create('delete_file', 3)
+
+        def operation(progress):
+            raise RuntimeError("database is locked")
+
+        self.jobs.run(job['id'], operation)
+
+        self.assertEqual(self.jobs.get(job['id'])['status'], 'failed')
+        self.assertEqual(self.jobs.get(job['id'])['error'], "database is locked")
+
+    def test_jobs_expire(self):
+        jobs = BackgroundJobs(ttl=0)
+        job = jobs.create('delete_file', 1)
+
+        self.assertIsNone(jobs.get(job['id']))
+
+    def test_stores_that_share_jobs_provide_their_own(self):
+        shared = BackgroundJobs()
+
+        self.assertIs(get_background_jobs(MagicMock(jobs=shared)), shared)
+        self.assertIs(get_background_jobs(object()), background_jobs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,57 @@
 # made with ChatGPT
 
+import asyncio
+import hashlib
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import shutil
 import tempfile
+import threading
+
+from backend.database.embedding_cache import embedding_cache
+from backend.database.embedding_providers import PROVIDERS, EmbeddingProvider, instances
+from backend.database.keyword_index import get_keyword_index
 
 # Import the functions to test
 from backend.database.chroma_database import (
     generate_embedding,
+    generate_embedding_async,
+    generate_embeddings,
     initialize_chromadb,
+    initialize_vector_store,
     get_or_create_collection,
     add_documents,
     retrieve_by_file_name,
     update_entry,
+    update_file,
+    course_collection_name,
+    get_course_collection,
+    fuse_rankings,
+    collection_provider,
     delete_entry,
-    nearest_neighbor_search
+    delete_file,
+    purge_collection,
+    list_files,
+    course_files,
+    record_file,
+    nearest_neighbor_search,
+    nearest_neighbor_search_async,
+    retrieval_max_distance
 )
+from backend.database.passages import assemble_context
 
 class TestChromaDatabase(unittest.TestCase):
 
     def setUp(self):
+        # Start every test with an empty embedding cache
+        embedding_cache.clear()
+
+        # Count one token per word, without loading a tokenizer
+        token_counter = patch('backend.database.chroma_database.count_tokens', side_effect=lambda text: len(text.split()))
+        token_counter.start()
+        self.addCleanup(token_counter.stop)
+
         # Create a temporary directory for persistent storage
         self.test_persistence_path = tempfile.mkdtemp()
 
@@ -73,6 +104,74 @@ class TestChromaDatabase(unittest.TestCase):
         )
         self.assertEqual(embedding, [0.1, 0.2, 0.3])
 
+    @patch('backend.database.chroma_database.async_openai.embeddings.create', new_callable=AsyncMock)
+    def test_generate_embedding_async(self, mock_create):
+        # Arrange
+        mock_embedding = MagicMock()
+        mock_embedding.embedding = [0.1, 0.2, 0.3]
+        mock_response = MagicMock()
+        mock_response.data = [mock_embedding]
+        mock_create.return_value = mock_response
+
+        # Act
+        embedding = asyncio.run(generate_embedding_async("Test text"))
+
+        # Assert
+        mock_create.assert_awaited_once_with(
+            input="Test text",
+            model=os.getenv("OPENAI_EMBEDDING_MODEL")
+        )
+        self.assertEqual(embedding, [0.1, 0.2, 0.3])
+
+    @patch('backend.database.chroma_database.async_openai.embeddings.create', new_callable=AsyncMock)
+    def test_generate_embedding_async_reads_the_cache_off_the_event_loop(self, mock_create):
+        # Arrange
+        embedding_cache.put(os.getenv("OPENAI_EMBEDDING_MODEL"), "Test text", [0.1, 0.2, 0.3])
+        threads = []
+        cache_get = embedding_cache.get
+
+        def get(model, text):
+            threads.append(threading.get_ident())
+            return cache_get(model, text)
+
+        async def search():
+            return await generate_embedding_async("Test text"), threading.get_ident()
+
+        # Act
+        with patch.object(embedding_cache, 'get', side_effect=get):
+            embedding, loop_thread = asyncio.run(search())
+
+        # Assert
+        mock_create.assert_not_awaited()
+        self.assertEqual([round(value, 6) for value in embedding], [0.1, 0.2, 0.3])
+        self.assertNotIn(loop_thread, threads)
+
+    @patch('backend.database.chroma_database.get_embeddings')
+    def test_generate_embeddings_only_sends_uncached_texts(self, mock_get_embeddings):
+        # Arrange
+        mock_get_embeddings.side_effect = lambda texts, **kwargs: [
+            {'embedding': [float(len(text)), 0.0, 1.0], 'text': text} for text in texts
+        ]
+        generate_embeddings(["cached"])
+        mock_get_embeddings.reset_mock()
+
+        # Act
+        embeddings = generate_embeddings(["cached", "new text"])
+
+        # Assert
+        mock_get_embeddings.assert_called_once()
+        self.assertEqual(mock_get_embeddings.call_args.args[0], ["new text"])
+        self.assertEqual(embeddings, [[6.0, 0.0, 1.0], [8.0, 0.0, 1.0]])
+
+    @patch('backend.database.chroma_database.get_embeddings')
+    def test_generate_embeddings_raises_on_failed_chunk(self, mock_get_embeddings):
+        # Arrange
+        mock_get_embeddings.return_value = [{'embedding': None, 'text': "bad", 'error': "API Error"}]
+
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            generate_embeddings(["bad"])
+
     def test_initialize_chromadb_without_persistence(self):
         # Act
         client = initialize_chromadb()
@@ -81,9 +180,11 @@ class TestChromaDatabase(unittest.TestCase):
         self.assertIsNotNone(client)
         self.assertTrue(hasattr(client, 'get_or_create_collection'))
 
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_persistent_client(self, mock_generate_embedding):
+    def test_persistent_client(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         # Set up a test path for persistent storage
         test_persistence_path = 'test_chroma_db'
         os.environ["CHROMA_PERSISTANT_DIRECTORY"] = test_persistence_path
@@ -143,9 +244,11 @@ class TestChromaDatabase(unittest.TestCase):
         # Assert
         self.assertEqual(collection.name, collection_name)
 
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_add_documents(self, mock_generate_embedding):
+    def test_add_documents(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         mock_generate_embedding.return_value = [0.1, 0.2, 0.3]
         client = initialize_chromadb()
         collection = get_or_create_collection(client, 'test_collection')
@@ -163,9 +266,33 @@ class TestChromaDatabase(unittest.TestCase):
         mock_generate_embedding.assert_any_call("Document 1")
         mock_generate_embedding.assert_any_call("Document 2")
 
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_add_documents_reuses_stored_embeddings(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[float(len(text)), 0.0, 1.0] for text in texts]
+        client = initialize_chromadb()
+        collection = get_or_create_collection(client, 'test_collection')
+        add_documents(collection, ["Syllabus", "Week 1"], ["doc1", "doc2"],
+                      [{"file_name": "section1.txt"}, {"file_name": "section1.txt"}])
+        embedding_cache.clear()
+        mock_generate_embeddings.reset_mock()
+
+        # Act
+        counts = add_documents(collection, ["Syllabus", "Week 2", "Week 2"], ["doc3", "doc4", "doc5"],
+                               [{"file_name": "section2.txt"}] * 3)
+
+        # Assert
+        mock_generate_embeddings.assert_called_once_with(["Week 2"], 'openai')
+        self.assertEqual(counts, {'reused': 2, 'embedded': 1})
+        result = collection.get(ids=["doc3"], include=['embeddings', 'metadatas'])
+        self.assertEqual(list(result['embeddings'][0]), [8.0, 0.0, 1.0])
+        self.assertIn('content_hash', result['metadatas'][0])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_retrieve_by_file_name(self, mock_generate_embedding):
+    def test_retrieve_by_file_name(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         mock_generate_embedding.return_value = [0.1, 0.2, 0.3]
         client = initialize_chromadb()
         collection = get_or_create_collection(client, 'test_collection')
@@ -181,9 +308,11 @@ class TestChromaDatabase(unittest.TestCase):
         self.assertEqual(len(results['documents']), 1)
         self.assertEqual(results['metadatas'][0]['file_name'], 'file1.txt')
 
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_update_entry(self, mock_generate_embedding):
+    def test_update_entry(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         mock_generate_embedding.return_value = [0.4, 0.5, 0.6]
         client = initialize_chromadb()
         collection = get_or_create_collection(client, 'test_collection')
@@ -207,9 +336,51 @@ class TestChromaDatabase(unittest.TestCase):
         self.assertEqual(result['metadatas'][0]['file_name'], "updated_file1.txt")
         mock_generate_embedding.assert_called_once_with(updated_document)
 
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_update_file_only_writes_changed_chunks(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[float(len(text)), 0.0, 1.0] for text in texts]
+        client = initialize_chromadb()
+        collection = get_or_create_collection(client, 'test_collection')
+        documents = ["Intro", "Pointers", "Memroy", "Summary"]
+        add_documents(collection, documents, ["doc0", "doc1", "doc2", "doc3"],
+                      [{"file_name": "lecture.pdf", "chunk_index": idx} for idx in range(len(documents))])
+        mock_generate_embeddings.reset_mock()
+
+        # Act
+        counts = update_file(collection, "lecture.pdf", ["Intro", "Pointers", "Memory"])
+
+        # Assert
+        mock_generate_embeddings.assert_called_once_with(["Memory"], 'openai')
+        self.assertEqual(counts, {'unchanged': 2, 'written': 1, 'removed': 1, 'reused': 0, 'embedded': 1})
+        result = collection.get(where={"file_name": "lecture.pdf"})
+        stored = sorted(zip(result['ids'], result['documents'], (meta['chunk_index'] for meta in result['metadatas'])))
+        self.assertEqual(stored, [("doc0", "Intro", 0), ("doc1", "Pointers", 1), ("doc2", "Memory", 2)])
+        self.assertTrue(all(meta['token_count'] == 1 for meta in result['metadatas']))
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_update_file_rewrites_whitespace_edits_and_reuses_their_vectors(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[float(len(text)), 0.0, 1.0] for text in texts]
+        client = initialize_chromadb()
+        collection = get_or_create_collection(client, 'test_collection')
+        add_documents(collection, ["def f():\n  return 1", "Summary"], ["doc0", "doc1"],
+                      [{"file_name": "snippet.py", "chunk_index": idx} for idx in range(2)])
+        mock_generate_embeddings.reset_mock()
+
+        # Act
+        counts = update_file(collection, "snippet.py", ["def f():\n    return 1", "Summary"])
+
+        # Assert
+        mock_generate_embeddings.assert_not_called()
+        self.assertEqual(counts, {'unchanged': 1, 'written': 1, 'removed': 0, 'reused': 1, 'embedded': 0})
+        self.assertEqual(collection.get(ids=["doc0"])['documents'], ["def f():\n    return 1"])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_delete_entry(self, mock_generate_embedding):
+    def test_delete_entry(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         mock_generate_embedding.return_value = [0.1, 0.2, 0.3]
         client = initialize_chromadb()
         collection = get_or_create_collection(client, 'test_collection')
@@ -225,21 +396,23 @@ class TestChromaDatabase(unittest.TestCase):
         result = collection.get(ids=["doc1"])
         self.assertEqual(len(result['documents']), 0)
 
+    @patch('backend.database.chroma_database.generate_embeddings')
     @patch('backend.database.chroma_database.generate_embedding')
-    def test_nearest_neighbor_search(self, mock_generate_embedding):
+    def test_nearest_neighbor_search(self, mock_generate_embedding, mock_generate_embeddings):
         # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
         embeddings = {
             "Document 1": [0.1, 0.2, 0.3],
             "Document 2": [0.4, 0.5, 0.6]
         }
 
-        def side_effect(text):
+        def side_effect(text, provider='openai'):
             return embeddings.get(text, [0.0, 0.0, 0.0])
 
         mock_generate_embedding.side_effect = side_effect
 
         client = initialize_chromadb()
-        collection = get_or_create_collection(client, 'test_collection')
+        collection = get_course_collection(client, 'cs232')
 
         documents = ["Document 1", "Document 2"]
         ids = ["doc1", "doc2"]
@@ -249,13 +422,223 @@ class TestChromaDatabase(unittest.TestCase):
         input_text = "Document 1"
 
         # Act
-        results = nearest_neighbor_search(collection, input_text, n_results=2)
+        results = nearest_neighbor_search(client, 'cs232', input_text, n_results=2)
 
         # Assert
         self.assertEqual(len(results), 2)
         self.assertIn("Document 1", [doc['content'] for doc in results])
         self.assertIn("Document 2", [doc['content'] for doc in results])
-        mock_generate_embedding.assert_called_with(input_text)
+        mock_generate_embedding.assert_called_with(input_text, 'openai')
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    @patch('backend.database.chroma_database.generate_embedding_async', new_callable=AsyncMock)
+    @patch('backend.database.chroma_database.generate_embedding')
+    def test_nearest_neighbor_search_async(self, mock_generate_embedding, mock_generate_embedding_async, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [mock_generate_embedding(text) for text in texts]
+        mock_generate_embedding.side_effect = lambda text, provider='openai': [0.1, 0.2, 0.3] if text == "Document 1" else [0.4, 0.5, 0.6]
+        mock_generate_embedding_async.return_value = [0.1, 0.2, 0.3]
+        client = initialize_chromadb()
+        collection = get_course_collection(client, 'cs232')
+        add_documents(collection, ["Document 1", "Document 2"], ["doc1", "doc2"],
+                      [{"file_name": "file1.txt"}, {"file_name": "file2.txt"}])
+
+        # Act
+        results = asyncio.run(nearest_neighbor_search_async(client, 'cs232', "Document 1", n_results=1))
+
+        # Assert
+        self.assertEqual([doc['content'] for doc in results], ["Document 1"])
+        mock_generate_embedding_async.assert_awaited_once_with("Document 1", 'openai')
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    @patch('backend.database.chroma_database.generate_embedding')
+    def test_nearest_neighbor_search_only_searches_the_course(self, mock_generate_embedding, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[float(len(text)), 0.0, 1.0] for text in texts]
+        mock_generate_embedding.return_value = [10.0, 0.0, 1.0]
+        client = initialize_chromadb()
+        add_documents(get_course_collection(client, 'cs232'), ["Pointers in C"], ["doc1"], [{"file_name": "c.txt"}])
+        add_documents(get_course_collection(client, 'bio101'), ["Cell division"], ["doc2"], [{"file_name": "bio.txt"}])
+
+        # Act
+        results = nearest_neighbor_search(client, 'cs232', "What is a pointer?", n_results=5)
+        missing = nearest_neighbor_search(client, 'hist200', "What is a pointer?", n_results=5)
+
+        # Assert
+        self.assertEqual([doc['content'] for doc in results], ["Pointers in C"])
+        self.assertEqual(missing, [])
+        self.assertNotIn(course_collection_name('hist200'), [c.name for c in client.list_collections()])
+
+    def test_course_collection_name(self):
+        self.assertEqual(course_collection_name(None), 'file_collection')
+        self.assertEqual(course_collection_name('cs232'), 'course_cs232')
+        name = course_collection_name('CS 232-01 / Fall')
+        self.assertRegex(name, r'^course_[0-9a-f]{32}$')
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    @patch('backend.database.chroma_database.generate_embedding')
+    def test_nearest_neighbor_search_finds_exact_terms(self, mock_generate_embedding, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[float(idx), 1.0, 0.0] for idx, _ in enumerate(texts)]
+        mock_generate_embedding.return_value = [0.0, 1.0, 0.0]
+        client = initialize_chromadb()
+        collection = get_course_collection(client, 'cs232')
+        documents = ["Processes and threads", "Virtual memory", "Scheduling", "Call fork() to copy a process"]
+        add_documents(collection, documents, ["doc0", "doc1", "doc2", "doc3"], [{"file_name": "os.txt"}] * 4)
+
+        # Act
+        results = nearest_neighbor_search(client, 'cs232', "fork", n_results=1)
+
+        # Assert
+        self.assertEqual([doc['content'] for doc in results], ["Call fork() to copy a process"])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    @patch('backend.database.chroma_database.generate_embedding')
+    def test_delete_entry_removes_keyword_matches(self, mock_generate_embedding, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[1.0, 0.0, 0.0] for _ in texts]
+        mock_generate_embedding.return_value = [1.0, 0.0, 0.0]
+        client = initialize_chromadb()
+        collection = get_course_collection(client, 'cs232')
+        add_documents(collection, ["Call fork() to copy a process"], ["doc1"], [{"file_name": "os.txt"}])
+
+        # Act
+        delete_entry(collection, "doc1")
+
+        # Assert
+        self.assertEqual(get_keyword_index().search(collection.name, "fork"), [])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_list_files_records_existing_files_then_reads_the_manifest(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[1.0, 0.0, 0.0] for _ in texts]
+        collection = get_course_collection(self.client, 'cs232')
+        add_documents(collection, ["World", "Hello "], ["doc1", "doc2"],
+                      [{"file_name": "a.txt", "chunk_index": 1}, {"file_name": "a.txt", "chunk_index": 0}])
+
+        # Act
+        existing = list_files(collection)
+        record_file(collection, "b.txt", b"Goodbye", 1)
+        with patch.object(collection, 'get') as mock_get:
+            files = list_files(collection)
+
+        # Assert
+        self.assertEqual(existing, [{'file_name': 'a.txt', 'chunk_count': 2, 'byte_size': 11,
+                                     'content_hash': hashlib.sha256(b"Hello World").hexdigest(), 'uploaded_at': None,
+                                     'embedding_model': os.getenv("OPENAI_EMBEDDING_MODEL")}])
+        self.assertEqual([file['file_name'] for file in files], ['a.txt', 'b.txt'])
+        self.assertEqual(files[1]['chunk_count'], 1)
+        self.assertIsNotNone(files[1]['uploaded_at'])
+        mock_get.assert_not_called()
+
+    def test_course_files_does_not_create_a_collection(self):
+        self.assertEqual(course_files(self.client, 'unknown'), [])
+        self.assertNotIn(course_collection_name('unknown'), [collection.name for collection in self.client.list_collections()])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_delete_file_deletes_by_metadata_in_batches(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[1.0, 0.0, 0.0] for _ in texts]
+        collection = get_course_collection(self.client, 'cs232')
+        add_documents(collection, [f"Call fork() {idx}" for idx in range(5)] + ["Keep me"],
+                      [f"doc{idx}" for idx in range(6)],
+                      [{"file_name": "os.txt", "chunk_index": idx} for idx in range(5)] + [{"file_name": "keep.txt", "chunk_index": 0}])
+        list_files(collection)
+        progress = []
+
+        # Act
+        with patch.object(collection, 'get', wraps=collection.get) as get:
+            deleted = delete_file(collection, "os.txt", batch_size=2, progress=progress.append)
+
+        # Assert
+        self.assertEqual(deleted, 5)
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertTrue(all(call.kwargs['include'] == [] for call in get.call_args_list))
+        self.assertEqual(collection.get()['ids'], ["doc5"])
+        self.assertEqual(get_keyword_index().search(collection.name, "fork"), [])
+        self.assertEqual([file['file_name'] for file in list_files(collection)], ["keep.txt"])
+
+    @patch('backend.database.chroma_database.generate_embeddings')
+    def test_purge_collection_recreates_it_empty(self, mock_generate_embeddings):
+        # Arrange
+        mock_generate_embeddings.side_effect = lambda texts, provider='openai': [[1.0, 0.0, 0.0] for _ in texts]
+        collection = self.client.get_or_create_collection(name='course_cs232', metadata={'embedding_provider': 'openai', 'course': 'cs232'})
+        add_documents(collection, ["Call fork() to copy a process"], ["doc1"], [{"file_name": "os.txt", "chunk_index": 0}])
+        list_files(collection)
+
+        # Act
+        purged = purge_collection(self.client, collection)
+
+        # Assert
+        self.assertEqual(purged.count(), 0)
+        self.assertEqual(purged.metadata, {'embedding_provider': 'openai', 'course': 'cs232'})
+        self.assertEqual(get_keyword_index().search(purged.name, "fork"), [])
+        self.assertEqual(list_files(purged), [])
+
+    def test_fuse_rankings(self):
+        self.assertEqual(list(fuse_rankings([["a", "b", "c"], ["c", "b"]])), ["c", "b", "a"])
+
+    def test_collections_keep_their_embedding_provider(self):
+        # Arrange
+        class FakeProvider(EmbeddingProvider):
+            name = 'fake'
+            model = 'fake-model'
+            embed = MagicMock(side_effect=lambda texts: [[float(len(text)), 1.0] for text in texts])
+
+        client = initialize_chromadb()
+        with patch.dict(PROVIDERS, {'fake': FakeProvider}), patch.dict(instances, clear=True), \
+                patch.dict(os.environ, {'EMBEDDING_PROVIDER': 'fake'}):
+            collection = get_course_collection(client, 'cs232')
+            add_documents(collection, ["Pointers in C"], ["doc1"], [{"file_name": "c.txt"}])
+
+            # Act
+            os.environ['EMBEDDING_PROVIDER'] = 'openai'
+            results = nearest_neighbor_search(client, 'cs232', "Pointers", n_results=1)
+
+        # Assert
+        self.assertEqual(collection_provider(get_course_collection(client, 'cs232')), 'fake')
+        self.assertEqual([doc['content'] for doc in results], ["Pointers in C"])
+        FakeProvider.embed.assert_any_call(["Pointers in C"])
+        FakeProvider.embed.assert_any_call(["Pointers"])
+
+    @patch('backend.database.passages.count_tokens', side_effect=lambda text: len(text.split()))
+    def test_retrieval_cutoff_follows_the_embedding_provider(self, mock_count_tokens):
+        # Arrange: cosine 0.6 between a question and a relevant all-MiniLM-L6-v2 passage
+        passages = [{'content': "Call fork() to copy a process", 'metadata': {}, 'distance': 0.8}]
+
+        with patch.dict(os.environ, {'RETRIEVAL_MAX_DISTANCE': '0.5'}):
+            os.environ.pop('RETRIEVAL_MAX_DISTANCE_ONNX', None)
+
+            # Act
+            onnx_context = assemble_context(passages, budget=100, max_distance=retrieval_max_distance('onnx'))
+            openai_context = assemble_context(passages, budget=100, max_distance=retrieval_max_distance('openai'))
+
+        # Assert
+        self.assertIn("Call fork() to copy a process", onnx_context)
+        self.assertIsNone(openai_context)
+
+    def test_memmap_store_serves_the_same_functions(self):
+        # Arrange
+        class FakeProvider(EmbeddingProvider):
+            name = 'fake'
+            model = 'fake-model'
+            embed = MagicMock(side_effect=lambda texts: [[float('fork' in text), float('malloc' in text)] for text in texts])
+
+        with patch.dict(PROVIDERS, {'fake': FakeProvider}), patch.dict(instances, clear=True), \
+                patch.dict(os.environ, {'EMBEDDING_PROVIDER': 'fake', 'VECTOR_STORE': 'memmap'}):
+            client = initialize_vector_store()
+            collection = get_course_collection(client, 'cs232')
+            add_documents(collection, ["Call fork to start a process", "Call malloc to allocate"], ["doc1", "doc2"],
+                          [{"file_name": "c.txt", "chunk_index": 0}, {"file_name": "c.txt", "chunk_index": 1}])
+            update_file(collection, "c.txt", ["Call fork to start a process", "Call free after malloc"])
+
+            # Act
+            results = nearest_neighbor_search(client, 'cs232', "malloc", n_results=1)
+
+        # Assert
+        self.assertTrue(os.path.isdir(os.path.join(self.test_persistence_path, 'memmap', 'course_cs232')))
+        self.assertTrue(results[0]['content'].endswith("Call free after malloc"))
+        self.assertEqual(collection.count(), 2)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
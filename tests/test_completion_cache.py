@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+import unittest
+
+from backend.database.completion_cache import CompletionCache, entry_size
+
+
+class TestCompletionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.messages = [{'role': 'developer', 'content': 'prompt'}, {'role': 'user', 'content': 'What is fork()?'}]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_is_stable_and_covers_parameters(self):
+        key = CompletionCache.key('gpt-4o', self.messages, 150, 0.7)
+
+        self.assertEqual(key, CompletionCache.key('gpt-4o', [dict(m) for m in self.messages], 150, 0.7))
+        self.assertNotEqual(key, CompletionCache.key('gpt-4o-mini', self.messages, 150, 0.7))
+        self.assertNotEqual(key, CompletionCache.key('gpt-4o', self.messages, 300, 0.7))
+        self.assertNotEqual(key, CompletionCache.key('gpt-4o', self.messages, 150, 0.2))
+
+    def test_memory_tier_is_bounded_by_size(self):
+        cache = CompletionCache(max_bytes=2 * entry_size('a' * 64, 'x' * 100))
+        keys = [CompletionCache.key('gpt-4o', [{'role': 'user', 'content': str(i)}], 150, 0.7) for i in range(3)]
+        for key in keys:
+            cache.put(key, 'x' * 100)
+
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertEqual(cache.get(keys[2]), 'x' * 100)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_disk_tier_survives_restart(self):
+        key = CompletionCache.key('gpt-4o', self.messages, 150, 0.7)
+        cache = CompletionCache(directory=self.directory)
+        cache.put(key, 'fork() creates a child process.')
+        cache.close()
+
+        restarted = CompletionCache(directory=self.directory)
+
+        self.assertEqual(restarted.get(key), 'fork() creates a child process.')
+        self.assertIn(key, restarted.entries)
+        restarted.close()
+
+    def test_disk_tier_is_bounded_by_size(self):
+        cache = CompletionCache(directory=self.directory, max_disk_bytes=2 * entry_size('a' * 64, 'x' * 100))
+        keys = [CompletionCache.key('gpt-4o', [{'role': 'user', 'content': str(i)}], 150, 0.7) for i in range(3)]
+        for key in keys:
+            cache.put(key, 'x' * 100)
+        cache.close()
+
+        restarted = CompletionCache(directory=self.directory)
+
+        self.assertIsNone(restarted.get(keys[0]))
+        self.assertEqual(restarted.get(keys[2]), 'x' * 100)
+        self.assertEqual(restarted.disk_size, 2 * entry_size(keys[0], 'x' * 100))
+        restarted.close()
+
+    def test_replacing_an_answer_keeps_the_disk_size(self):
+        cache = CompletionCache(directory=self.directory)
+        key = CompletionCache.key('gpt-4o', self.messages, 150, 0.7)
+        cache.put(key, 'x' * 100)
+        cache.put(key, 'y' * 40)
+
+        self.assertEqual(cache.disk_size, entry_size(key, 'y' * 40))
+        self.assertIsNotNone(cache.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'completions_accessed'").fetchone())
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from backend.models.converstation import (
+    Conversation,
+    Model,
+    MESSAGE_TOKEN_OVERHEAD,
+    REPLY_TOKEN_OVERHEAD,
+    SUMMARY_KEEP_MESSAGES
+)
+
+
+class WordEncoding:
+    """Counts one token per word so budgets are easy to reason about"""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return ' '.join(tokens)
+
+
+@patch.dict(os.environ, {"BASE_PROMPT": "base", "JOHN_PROMPT": "john", "OPENAI_MAX_COMPLETION_TOKENS": "150"})
+@patch('backend.models.converstation.get_encoding', return_value=WordEncoding())
+class TestConversationPacking(unittest.TestCase):
+
+    def make_conversation(self, turns):
+        conversation = Conversation("user-1", Model.JOHN, class_prompt="class prompt")
+        for idx in range(turns):
+            conversation.discussion.append({'role': 'user', 'content': f"question {idx}"})
+            conversation.discussion.append({'role': 'assistant', 'content': f"answer {idx}"})
+        return conversation
+
+    def prompt_tokens(self, conversation):
+        return sum(conversation.count_tokens(message) for message in conversation.discussion[:conversation.prompt_count])
+
+    def test_pack_keeps_everything_within_budget(self, mock_encoding):
+        conversation = self.make_conversation(3)
+
+        self.assertEqual(conversation.pack(budget=10_000), conversation.discussion)
+
+    def test_pack_drops_oldest_turns_first(self, mock_encoding):
+        conversation = self.make_conversation(5)
+        turn_tokens = 2 + MESSAGE_TOKEN_OVERHEAD
+        budget = self.prompt_tokens(conversation) + REPLY_TOKEN_OVERHEAD + 4 * turn_tokens
+
+        packed = conversation.pack(budget=budget)
+
+        self.assertEqual(packed[:conversation.prompt_count], conversation.discussion[:conversation.prompt_count])
+        self.assertEqual([m['content'] for m in packed[conversation.prompt_count:]],
+                         ["question 3", "answer 3", "question 4", "answer 4"])
+
+    def test_pack_keeps_current_question_and_context(self, mock_encoding):
+        conversation = self.make_conversation(2)
+        conversation.discussion.append({'role': 'user', 'content': "what is fork"})
+        conversation.discussion.append({'role': 'developer', 'content': "Relevant information: fork"})
+        budget = self.prompt_tokens(conversation) + REPLY_TOKEN_OVERHEAD + 100
+
+        packed = conversation.pack(budget=budget)
+
+        self.assertEqual(packed[-2:], conversation.discussion[-2:])
+
+    def test_pack_sends_context_last_without_storing_it(self, mock_encoding):
+        conversation = self.make_conversation(2)
+        conversation.discussion.append({'role': 'user', 'content': "what is fork"})
+        stored = list(conversation.discussion)
+
+        packed = conversation.pack(budget=10_000, context="Relevant information: fork")
+
+        self.assertEqual(packed[:-1], stored)
+        self.assertEqual(packed[-1], {'role': 'developer', 'content': "Relevant information: fork"})
+        self.assertEqual(conversation.discussion, stored)
+        self.assertEqual(conversation.pack(budget=10_000), stored)
+
+    def test_pack_drops_context_before_question(self, mock_encoding):
+        conversation = self.make_conversation(2)
+        conversation.discussion.append({'role': 'user', 'content': "what is fork"})
+        budget = self.prompt_tokens(conversation) + REPLY_TOKEN_OVERHEAD + 3 + MESSAGE_TOKEN_OVERHEAD + 5
+
+        packed = conversation.pack(budget=budget, context="word " * 50)
+
+        self.assertEqual(packed[-1], {'role': 'user', 'content': "what is fork"})
+        self.assertEqual(len(packed), conversation.prompt_count + 1)
+
+    def test_pack_truncates_oversized_question(self, mock_encoding):
+        conversation = self.make_conversation(2)
+        conversation.discussion.append({'role': 'user', 'content': "word " * 5000})
+        budget = self.prompt_tokens(conversation) + REPLY_TOKEN_OVERHEAD + 50
+
+        packed = conversation.pack(budget=budget)
+
+        self.assertEqual(packed[-1]['role'], 'user')
+        self.assertEqual(len(packed[-1]['content'].split()), 50 - MESSAGE_TOKEN_OVERHEAD)
+        self.assertEqual(len(packed), conversation.prompt_count + 1)
+        # The stored question is left untouched
+        self.assertEqual(len(conversation.discussion[-1]['content'].split()), 5000)
+
+    def test_context_budget_leaves_room_for_prompts_and_question(self, mock_encoding):
+        conversation = self.make_conversation(1)
+        prompt_budget = self.prompt_tokens(conversation) + REPLY_TOKEN_OVERHEAD + (3 + MESSAGE_TOKEN_OVERHEAD) + 200
+
+        with patch.dict(os.environ, {"RETRIEVAL_TOKEN_BUDGET": "1500", "JOHN_RETRIEVAL_TOKENS": "1000"}):
+            self.assertEqual(conversation.context_budget("what is fork", budget=10_000), 1000 - MESSAGE_TOKEN_OVERHEAD)
+            self.assertEqual(conversation.context_budget("what is fork", budget=prompt_budget), 200 - MESSAGE_TOKEN_OVERHEAD)
+            self.assertEqual(conversation.context_budget("word " * 5000, budget=prompt_budget), 0)
+
+    def test_count_tokens_is_cached(self, mock_encoding):
+        conversation = self.make_conversation(1)
+        message = conversation.discussion[-1]
+
+        conversation.count_tokens(message)
+        calls = mock_encoding.call_count
+        conversation.count_tokens(message)
+
+        self.assertEqual(mock_encoding.call_count, calls)
+
+
+    def test_needs_summary_after_threshold(self, mock_encoding):
+        conversation = self.make_conversation(10)
+
+        self.assertTrue(conversation.needs_summary(threshold=50))
+        self.assertFalse(conversation.needs_summary(threshold=10_000))
+
+        conversation.summarizing = True
+        self.assertFalse(conversation.needs_summary(threshold=50))
+
+    def test_summary_candidates_keep_recent_turns(self, mock_encoding):
+        conversation = self.make_conversation(10)
+        conversation.discussion.insert(conversation.prompt_count + 1, {'role': 'developer', 'content': "Relevant information"})
+
+        candidates, summarized = conversation.summary_candidates()
+
+        self.assertEqual(summarized, 21 - SUMMARY_KEEP_MESSAGES)
+        self.assertNotIn('developer', [message['role'] for message in candidates])
+        self.assertEqual(candidates[0]['content'], "question 0")
+
+    def test_pack_replaces_summarized_turns(self, mock_encoding):
+        conversation = self.make_conversation(10)
+        candidates, summarized = conversation.summary_candidates()
+
+        conversation.apply_summary("The student asked ten questions.", summarized)
+        packed = conversation.pack(budget=10_000)
+
+        self.assertEqual(packed[conversation.prompt_count], conversation.summary_message())
+        self.assertEqual(packed[conversation.prompt_count + 1:], conversation.discussion[-SUMMARY_KEEP_MESSAGES:])
+
+
+if __name__ == '__main__':
+    unittest.main()
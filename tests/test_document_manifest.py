@@ -0,0 +1,44 @@
+import unittest
+
+from backend.database.document_manifest import DocumentManifest
+
+
+def entry(file_name: str, chunk_count: int = 2) -> dict:
+    return {'file_name': file_name, 'chunk_count': chunk_count, 'byte_size': 120, 'content_hash': 'abc',
+            'uploaded_at': '2024-09-01T12:00:00+00:00', 'embedding_model': 'text-embedding-ada-002'}
+
+
+class TestDocumentManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.manifest = DocumentManifest()
+        self.manifest.record('course_cs232', [entry('syllabus.pdf'), entry('hw1.txt')])
+
+    def tearDown(self):
+        self.manifest.close()
+
+    def test_list_returns_entries_by_file_name(self):
+        self.assertEqual([file['file_name'] for file in self.manifest.list('course_cs232')], ['hw1.txt', 'syllabus.pdf'])
+        self.assertEqual(self.manifest.get('course_cs232', 'hw1.txt'), entry('hw1.txt'))
+        self.assertTrue(self.manifest.is_recorded('course_cs232'))
+
+    def test_put_replaces_and_remove_deletes(self):
+        self.manifest.put('course_cs232', entry('hw1.txt', chunk_count=5))
+        self.manifest.remove('course_cs232', 'syllabus.pdf')
+
+        self.assertEqual(self.manifest.list('course_cs232'), [entry('hw1.txt', chunk_count=5)])
+        self.assertIsNone(self.manifest.get('course_cs232', 'syllabus.pdf'))
+
+    def test_clear_keeps_the_collection_recorded(self):
+        self.manifest.clear('course_cs232')
+
+        self.assertEqual(self.manifest.list('course_cs232'), [])
+        self.assertTrue(self.manifest.is_recorded('course_cs232'))
+
+    def test_collections_are_separate(self):
+        self.assertEqual(self.manifest.list('course_bio101'), [])
+        self.assertFalse(self.manifest.is_recorded('course_bio101'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from backend.database.embedding_cache import EmbeddingCache, DIGEST_SIZE
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_ignores_whitespace_and_depends_on_model(self):
+        key = EmbeddingCache.key('text-embedding-ada-002', 'What is  a\npointer?')
+
+        self.assertEqual(key, EmbeddingCache.key('text-embedding-ada-002', ' What is a pointer? '))
+        self.assertNotEqual(key, EmbeddingCache.key('text-embedding-3-small', 'What is a pointer?'))
+
+    def test_memory_tier_is_lru(self):
+        cache = EmbeddingCache(max_entries=2)
+        cache.put('model', 'a', [1.0, 0.0])
+        cache.put('model', 'b', [0.0, 1.0])
+        cache.get('model', 'a')
+        cache.put('model', 'c', [0.5, 0.5])
+
+        self.assertEqual(cache.get('model', 'a'), [1.0, 0.0])
+        self.assertIsNone(cache.get('model', 'b'))
+
+    def test_disk_tier_survives_restart(self):
+        cache = EmbeddingCache(directory=self.directory)
+        cache.put('model', 'What is a pointer?', [0.25, 0.5, 0.75])
+        cache.put('model', 'What is fork()?', [0.5, 0.5, 0.5])
+
+        restarted = EmbeddingCache(directory=self.directory)
+
+        self.assertEqual(restarted.get('model', 'What is fork()?'), [0.5, 0.5, 0.5])
+        self.assertEqual(restarted.get('model', 'What is a pointer?'), [0.25, 0.5, 0.75])
+        self.assertIsNone(restarted.get('other-model', 'What is a pointer?'))
+
+    def test_disk_tier_drops_partial_rows(self):
+        cache = EmbeddingCache(directory=self.directory)
+        cache.put('model', 'complete', [0.25, 0.5, 0.75])
+        store = cache.stores['model']
+        with open(os.path.join(store['path'], 'vectors.f32'), 'ab') as vectors_file:
+            vectors_file.write(b'\0' * 12)
+
+        restarted = EmbeddingCache(directory=self.directory)
+        restarted.put('model', 'appended', [1.0, 0.0, 0.0])
+        restarted.clear()
+
+        self.assertEqual(restarted.get('model', 'appended'), [1.0, 0.0, 0.0])
+        self.assertEqual(os.path.getsize(os.path.join(store['path'], 'keys.bin')), 2 * DIGEST_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from backend.database.embedding_providers import EmbeddingProvider, ONNXEmbeddingProvider
+
+
+class TestEmbeddingProviders(unittest.TestCase):
+
+    def test_incomplete_provider_cannot_be_instantiated(self):
+        class IncompleteProvider(EmbeddingProvider):
+            name = 'incomplete'
+            model = 'incomplete-model'
+
+        with self.assertRaises(TypeError):
+            IncompleteProvider()
+
+    @patch('chromadb.utils.embedding_functions.ONNXMiniLM_L6_V2')
+    def test_onnx_embed_batches_texts_and_returns_floats(self, mock_model):
+        # The model returns float32 arrays, one row per text
+        function = mock_model.return_value
+        function.side_effect = lambda texts: [np.array([len(text), 0.5], dtype=np.float32) for text in texts]
+        texts = [f"text {idx}" for idx in range(70)]
+
+        embeddings = ONNXEmbeddingProvider().embed(texts)
+
+        self.assertEqual([len(call.args[0]) for call in function.call_args_list], [32, 32, 6])
+        self.assertEqual(embeddings[0], [6.0, 0.5])
+        self.assertEqual(len(embeddings), 70)
+        self.assertIs(type(embeddings[69][0]), float)
+        mock_model.assert_called_once_with(preferred_providers=['CPUExecutionProvider'])
+
+    @patch('chromadb.utils.embedding_functions.ONNXMiniLM_L6_V2')
+    def test_onnx_embed_of_nothing_does_not_load_the_model(self, mock_model):
+        self.assertEqual(ONNXEmbeddingProvider().embed([]), [])
+
+        mock_model.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
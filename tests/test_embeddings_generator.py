@@ -1,13 +1,27 @@
 #Tests Generated by ChatGPT
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 
 # Import the get_embeddings function from embeddings_generator module
-from backend.database.embeddings_generator import get_embeddings
+from openai import BadRequestError, RateLimitError
+
+from backend.database.embeddings_generator import RateLimiter, get_embeddings, batch_text_chunks, parse_duration
+
+def mock_embeddings_create(mock_async_openai, api_call=None, headers=None):
+    # Wraps a synchronous fake of the embeddings endpoint in the raw response the async client returns
+    client = mock_async_openai.return_value
+    client.__aenter__.return_value = client
+
+    def create(*args, **kwargs):
+        response = api_call(*args, **kwargs)
+        return MagicMock(headers=headers or {}, parse=MagicMock(return_value=response))
+
+    client.embeddings.with_raw_response.create = AsyncMock(side_effect=create)
+    return client.embeddings.with_raw_response.create
 
 class TestGetEmbeddings(unittest.TestCase):
-    @patch('backend.database.embeddings_generator.openai.embeddings.create')
-    def test_get_embeddings_success(self, mock_create):
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_success(self, mock_async_openai):
         # Sample input data
         text_chunks = ['Hello world', 'Testing embeddings', 'Unit tests are important']
         batch_size = 2
@@ -22,7 +36,7 @@ class TestGetEmbeddings(unittest.TestCase):
             return mock_resp
 
         # Configure the mock to use the side effect function
-        mock_create.side_effect = mock_api_call
+        mock_create = mock_embeddings_create(mock_async_openai, mock_api_call)
 
         # Call the function under test
         embeddings = get_embeddings(text_chunks, batch_size=batch_size)
@@ -33,16 +47,17 @@ class TestGetEmbeddings(unittest.TestCase):
             self.assertIsNotNone(embedding_info['embedding'])
             self.assertEqual(embedding_info['text'], text_chunks[i])
 
-        # Verify that openai.embeddings.create was called correctly
+        # Verify that the embeddings endpoint was called correctly
         expected_calls = (len(text_chunks) - 1) // batch_size + 1
         self.assertEqual(mock_create.call_count, expected_calls)
 
-    @patch('backend.database.embeddings_generator.openai.embeddings.create')
-    def test_get_embeddings_api_exception(self, mock_create):
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_api_exception(self, mock_async_openai):
         # Sample input data
         text_chunks = ['This will cause an exception']
 
         # Configure the mock to raise an exception
+        mock_create = mock_embeddings_create(mock_async_openai)
         mock_create.side_effect = Exception('API Error')
 
         # Call the function under test
@@ -56,12 +71,13 @@ class TestGetEmbeddings(unittest.TestCase):
             self.assertIn('error', embedding_info)
             self.assertEqual(embedding_info['error'], 'API Error')
 
-    @patch('backend.database.embeddings_generator.openai.embeddings.create')
-    def test_get_embeddings_empty_input(self, mock_create):
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_empty_input(self, mock_async_openai):
         # Empty input
         text_chunks = []
 
         # Call the function under test
+        mock_create = mock_embeddings_create(mock_async_openai)
         embeddings = get_embeddings(text_chunks)
 
         # Assertions
@@ -69,8 +85,8 @@ class TestGetEmbeddings(unittest.TestCase):
         # Ensure the API is not called
         mock_create.assert_not_called()
 
-    @patch('backend.database.embeddings_generator.openai.embeddings.create')
-    def test_get_embeddings_large_input(self, mock_create):
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_large_input(self, mock_async_openai):
         # Large input data
         text_chunks = [f'Text chunk {i}' for i in range(100)]
         batch_size = 10
@@ -84,7 +100,7 @@ class TestGetEmbeddings(unittest.TestCase):
             ]
             return mock_resp
 
-        mock_create.side_effect = mock_api_call
+        mock_create = mock_embeddings_create(mock_async_openai, mock_api_call)
 
         # Call the function under test
         embeddings = get_embeddings(text_chunks, batch_size=batch_size)
@@ -95,21 +111,18 @@ class TestGetEmbeddings(unittest.TestCase):
             self.assertIsNotNone(embedding_info['embedding'])
             self.assertEqual(embedding_info['text'], text_chunks[i])
 
-        # Verify that openai.embeddings.create was called the correct number of times
+        # Verify that the embeddings endpoint was called the correct number of times
         expected_calls = (len(text_chunks) - 1) // batch_size + 1
         self.assertEqual(mock_create.call_count, expected_calls)
 
-    @patch('backend.database.embeddings_generator.openai.embeddings.create')
-    def test_get_embeddings_different_batch_sizes(self, mock_create):
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_different_batch_sizes(self, mock_async_openai):
         # Input data
         text_chunks = ['Sample text 1', 'Sample text 2', 'Sample text 3', 'Sample text 4']
 
         # Test different batch sizes
         for batch_size in [1, 2, 3, 4, 5]:
             with self.subTest(batch_size=batch_size):
-                # Reset mock
-                mock_create.reset_mock()
-
                 # Mocked response for each batch
                 def mock_api_call(*args, **kwargs):
                     batch = kwargs['input']
@@ -119,7 +132,7 @@ class TestGetEmbeddings(unittest.TestCase):
                     ]
                     return mock_resp
 
-                mock_create.side_effect = mock_api_call
+                mock_create = mock_embeddings_create(mock_async_openai, mock_api_call)
 
                 # Call the function under test
                 embeddings = get_embeddings(text_chunks, batch_size=batch_size)
@@ -130,9 +143,110 @@ class TestGetEmbeddings(unittest.TestCase):
                     self.assertIsNotNone(embedding_info['embedding'])
                     self.assertEqual(embedding_info['text'], text_chunks[i])
 
-                # Verify that openai.embeddings.create was called the correct number of times
+                # Verify that the embeddings endpoint was called the correct number of times
                 expected_calls = (len(text_chunks) - 1) // batch_size + 1
                 self.assertEqual(mock_create.call_count, expected_calls)
 
+    @patch('backend.database.embeddings_generator.count_tokens', side_effect=lambda text: len(text.split()))
+    def test_batch_text_chunks_respects_token_limit(self, mock_count_tokens):
+        text_chunks = ['one two three', 'four five', 'six', 'seven eight nine ten']
+
+        batches = batch_text_chunks(text_chunks, batch_size=10, max_tokens=5)
+
+        self.assertEqual(batches, [['one two three', 'four five'], ['six', 'seven eight nine ten']])
+
+    @patch('backend.database.embeddings_generator.count_tokens', side_effect=lambda text: len(text.split()))
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_splits_rejected_batches(self, mock_async_openai, mock_count_tokens):
+        text_chunks = [f'Text chunk {i}' for i in range(8)]
+
+        def mock_api_call(*args, **kwargs):
+            batch = kwargs['input']
+            if len(batch) > 2:
+                raise BadRequestError("Too many tokens", response=MagicMock(status_code=400), body=None)
+            mock_resp = MagicMock()
+            mock_resp.data = [MagicMock(embedding=[0.1, 0.2, 0.3]) for _ in batch]
+            return mock_resp
+
+        mock_create = mock_embeddings_create(mock_async_openai, mock_api_call)
+
+        embeddings = get_embeddings(text_chunks, batch_size=8, max_tokens=1000)
+
+        self.assertEqual([embedding_info['text'] for embedding_info in embeddings], text_chunks)
+        for embedding_info in embeddings:
+            self.assertIsNotNone(embedding_info['embedding'])
+
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_isolates_rejected_inputs(self, mock_async_openai):
+        text_chunks = ['fine', 'also fine', 'bad input', 'still fine']
+
+        def mock_api_call(*args, **kwargs):
+            batch = kwargs['input']
+            if 'bad input' in batch:
+                raise BadRequestError("Invalid input", response=MagicMock(status_code=400), body=None)
+            mock_resp = MagicMock()
+            mock_resp.data = [MagicMock(embedding=[0.1, 0.2, 0.3]) for _ in batch]
+            return mock_resp
+
+        mock_embeddings_create(mock_async_openai, mock_api_call)
+
+        embeddings = get_embeddings(text_chunks, batch_size=4)
+
+        self.assertEqual([embedding_info['text'] for embedding_info in embeddings], text_chunks)
+        self.assertEqual([embedding_info['status'] for embedding_info in embeddings], ['ok', 'ok', 'failed', 'ok'])
+        self.assertIsNone(embeddings[2]['embedding'])
+        self.assertIn('error', embeddings[2])
+
+    @patch('backend.database.embeddings_generator.backoff_delay', return_value=0)
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_retries_rate_limited_requests(self, mock_async_openai, mock_backoff_delay):
+        attempts = []
+
+        def mock_api_call(*args, **kwargs):
+            attempts.append(kwargs['input'])
+            if len(attempts) < 3:
+                raise RateLimitError("Rate limited", response=MagicMock(status_code=429, headers={}), body=None)
+            mock_resp = MagicMock()
+            mock_resp.data = [MagicMock(embedding=[0.1, 0.2, 0.3]) for _ in kwargs['input']]
+            return mock_resp
+
+        mock_embeddings_create(mock_async_openai, mock_api_call)
+
+        embeddings = get_embeddings(['Hello world'])
+
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(embeddings[0]['status'], 'ok')
+        self.assertEqual(embeddings[0]['embedding'], [0.1, 0.2, 0.3])
+
+    @patch('backend.database.embeddings_generator.backoff_delay', return_value=0)
+    @patch.object(RateLimiter, 'pause', autospec=True)
+    @patch('backend.database.embeddings_generator.AsyncOpenAI')
+    def test_get_embeddings_pauses_for_rate_limit_headers(self, mock_async_openai, mock_pause, mock_backoff_delay):
+        # An HTTP date in the past, then seconds along with a spent token window
+        responses = [{'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+                     {'retry-after': '2', 'x-ratelimit-remaining-tokens': '0', 'x-ratelimit-reset-tokens': '6s'}]
+
+        def mock_api_call(*args, **kwargs):
+            if responses:
+                raise RateLimitError("Rate limited", response=MagicMock(status_code=429, headers=responses.pop(0)), body=None)
+            mock_resp = MagicMock()
+            mock_resp.data = [MagicMock(embedding=[0.1, 0.2, 0.3]) for _ in kwargs['input']]
+            return mock_resp
+
+        mock_embeddings_create(mock_async_openai, mock_api_call)
+
+        embeddings = get_embeddings(['Hello world'])
+
+        self.assertEqual(embeddings[0]['status'], 'ok')
+        self.assertEqual([call.args[1] for call in mock_pause.call_args_list], [0.0, 6.0, 2.0])
+        mock_backoff_delay.assert_not_called()
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('20ms'), 0.02)
+        self.assertEqual(parse_duration('1s'), 1)
+        self.assertEqual(parse_duration('6m0s'), 360)
+        self.assertEqual(parse_duration('1h2m3.5s'), 3723.5)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import unittest
+
+from backend.database.keyword_index import KeywordIndex
+
+
+class TestKeywordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = KeywordIndex()
+        self.index.add('course_cs232', ['doc1', 'doc2', 'doc3'], [
+            "Use fork() to create a child process.",
+            "malloc_size returns the size of an allocated block.",
+            "Pointers store the address of another variable."
+        ])
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_search_ranks_exact_terms(self):
+        results = self.index.search('course_cs232', "Segfault after calling fork", n_results=3)
+
+        self.assertEqual([id for id, _ in results], ['doc1'])
+        self.assertGreater(results[0][1], 0)
+
+    def test_search_keeps_identifiers_whole_and_stems_words(self):
+        self.assertEqual([id for id, _ in self.index.search('course_cs232', "what does malloc_size do")], ['doc2'])
+        self.assertEqual([id for id, _ in self.index.search('course_cs232', "pointer")], ['doc3'])
+
+    def test_add_replaces_and_delete_removes(self):
+        self.index.add('course_cs232', ['doc1'], ["Threads share an address space."])
+        self.index.delete('course_cs232', ['doc2'])
+
+        self.assertEqual(self.index.search('course_cs232', "fork"), [])
+        self.assertEqual(self.index.search('course_cs232', "malloc_size"), [])
+        self.assertEqual([id for id, _ in self.index.search('course_cs232', "threads")], ['doc1'])
+
+    def test_collections_are_separate(self):
+        self.assertEqual(self.index.search('course_bio101', "fork"), [])
+        self.assertFalse(self.index.is_indexed('course_bio101'))
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.index.search('course_cs232', '"fork" AND (NEAR'), self.index.search('course_cs232', 'fork and near'))
+        self.assertEqual(self.index.search('course_cs232', '?!'), [])
+
+    def test_clear(self):
+        self.index.clear('course_cs232')
+
+        self.assertFalse(self.index.is_indexed('course_cs232'))
+        self.assertEqual(self.index.search('course_cs232', "fork"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
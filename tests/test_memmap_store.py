@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from backend.database.memmap_store import MemmapVectorStore
+
+
+class TestMemmapVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MemmapVectorStore(self.directory.name)
+        self.collection = self.store.get_or_create_collection('course_cs232', metadata={'embedding_provider': 'openai'})
+        self.collection.add(
+            ids=['doc1', 'doc2', 'doc3'],
+            embeddings=[[0.0, 1.0], [1.0, 0.0], [0.6, 0.8]],
+            documents=["Content 1", "Content 2", "Content 3"],
+            metadatas=[{'file_name': 'a.txt', 'chunk_index': 0}, {'file_name': 'a.txt', 'chunk_index': 1},
+                       {'file_name': 'b.txt', 'chunk_index': 0}]
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_query_returns_squared_l2_distances(self):
+        results = self.collection.query(query_embeddings=[[0.0, 1.0], [1.0, 0.0]], n_results=2)
+
+        self.assertEqual(results['ids'], [['doc1', 'doc3'], ['doc2', 'doc3']])
+        self.assertAlmostEqual(results['distances'][0][0], 0.0, places=3)
+        self.assertAlmostEqual(results['distances'][0][1], 0.4, places=2)
+        self.assertEqual(results['documents'][1][0], "Content 2")
+
+    def test_query_clamps_results_and_filters(self):
+        results = self.collection.query(query_embeddings=[[0.0, 1.0]], n_results=10, where={'file_name': 'a.txt'})
+
+        self.assertEqual(results['ids'], [['doc1', 'doc2']])
+
+    def test_get_by_ids_and_where(self):
+        self.assertEqual(self.collection.get(ids=['missing', 'doc2'])['ids'], ['doc2'])
+        self.assertEqual(self.collection.get(where={'file_name': {'$in': ['b.txt']}})['ids'], ['doc3'])
+        self.assertEqual(self.collection.get(where={'file_name': 'a.txt'}, limit=1, include=[])['ids'], ['doc1'])
+        self.assertEqual(self.collection.get(where={'file_name': 'a.txt'}, limit=1, offset=1, include=[])['ids'], ['doc2'])
+        self.assertIsNone(self.collection.get(ids=['doc1'])['embeddings'])
+
+    def test_update_merges_metadata_and_keeps_vector(self):
+        self.collection.update(ids=['doc1'], metadatas=[{'content_hash': 'abc'}])
+
+        result = self.collection.get(ids=['doc1'], include=['metadatas', 'embeddings'])
+        self.assertEqual(result['metadatas'][0], {'file_name': 'a.txt', 'chunk_index': 0, 'content_hash': 'abc'})
+        np.testing.assert_allclose(result['embeddings'][0], [0.0, 1.0])
+        self.assertEqual(self.collection.count(), 3)
+
+    def test_delete_tombstones_rows(self):
+        self.collection.delete(ids=['doc1'])
+
+        self.assertEqual(self.collection.count(), 2)
+        self.assertEqual(self.collection.query(query_embeddings=[[0.0, 1.0]], n_results=1)['ids'], [['doc3']])
+
+    def test_compaction_drops_dead_rows(self):
+        self.collection.compaction_ratio = 0.5
+        self.collection.upsert(ids=['doc1'], embeddings=[[0.0, -1.0]], documents=["Content 1b"])
+        self.assertEqual(len(self.collection.ids), 4)
+
+        self.collection.delete(ids=['doc2'])
+
+        self.assertEqual(len(self.collection.ids), 2)
+        self.assertEqual(os.path.getsize(os.path.join(self.collection.path, 'vectors.f16')), 2 * 2 * 2)
+        self.assertEqual(self.collection.query(query_embeddings=[[0.0, -1.0]], n_results=1)['documents'], [["Content 1b"]])
+
+    def test_reopen_restores_state(self):
+        self.collection.delete(ids=['doc2'])
+
+        reopened = MemmapVectorStore(self.directory.name).get_collection('course_cs232')
+
+        self.assertEqual(reopened.metadata, {'embedding_provider': 'openai'})
+        self.assertEqual(reopened.get()['ids'], ['doc1', 'doc3'])
+
+    def test_reopen_drops_partially_written_row(self):
+        with open(os.path.join(self.collection.path, 'vectors.f16'), 'ab') as vectors_file:
+            vectors_file.write(np.zeros(2, dtype=np.float16).tobytes())
+        with open(os.path.join(self.collection.path, 'records.jsonl'), 'a') as records_file:
+            records_file.write('{"id": "doc4"')
+
+        reopened = MemmapVectorStore(self.directory.name).get_collection('course_cs232')
+
+        self.assertEqual(reopened.count(), 3)
+        reopened.add(ids=['doc4'], embeddings=[[1.0, 1.0]], documents=["Content 4"])
+        self.assertEqual(MemmapVectorStore(self.directory.name).get_collection('course_cs232').get(ids=['doc4'])['documents'], ["Content 4"])
+
+    def test_get_collection_raises_for_missing(self):
+        with self.assertRaises(ValueError):
+            self.store.get_collection('course_bio101')
+
+    def test_blocked_search_matches_single_block(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((50, 8)).astype(np.float32)
+        collection = self.store.get_or_create_collection('course_large')
+        collection.add(ids=[f"doc{idx}" for idx in range(50)], embeddings=vectors, documents=[""] * 50)
+        queries = rng.standard_normal((3, 8))
+
+        expected = collection.query(query_embeddings=queries, n_results=5)
+        with patch('backend.database.memmap_store.SEARCH_BLOCK_ROWS', 7):
+            blocked = collection.query(query_embeddings=queries, n_results=5)
+        with patch.dict(os.environ, {'MEMMAP_CACHE_BYTES': '0'}):
+            uncached = MemmapVectorStore(self.directory.name).get_collection('course_large').query(query_embeddings=queries, n_results=5)
+
+        self.assertEqual(blocked['ids'], expected['ids'])
+        self.assertEqual(uncached['ids'], expected['ids'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+
+import numpy as np
+
+from backend.database.passages import (CONTEXT_HEADER_TOKENS, PASSAGE_TOKEN_OVERHEAD, assemble_context, join_overlapping,
+                                       merge_adjacent, mmr, select_passages)
+
+
+def candidate(file_name, chunk_index, content, embedding, score, distance=0.1):
+    return {
+        'content': content,
+        'metadata': {'file_name': file_name, 'chunk_index': chunk_index},
+        'distance': distance,
+        'score': score,
+        'embedding': embedding
+    }
+
+
+class TestPassages(unittest.TestCase):
+
+    def test_join_overlapping_removes_shared_text(self):
+        first = "A pointer stores an address. Dereferencing a pointer reads the value"
+        second = "Dereferencing a pointer reads the value at that address."
+
+        self.assertEqual(join_overlapping(first, second),
+                         "A pointer stores an address. Dereferencing a pointer reads the value at that address.")
+        self.assertEqual(join_overlapping("No overlap here.", "Something else entirely."),
+                         "No overlap here. Something else entirely.")
+
+    def test_merge_adjacent_joins_neighbors_of_the_same_file(self):
+        candidates = [
+            candidate('c.pdf', 4, "chunk four shared tail text", [1.0, 0.0], 0.9, distance=0.2),
+            candidate('os.pdf', 5, "other file", [0.0, 1.0], 0.8),
+            candidate('c.pdf', 3, "chunk three then chunk four shared tail text", [1.0, 0.0], 0.7, distance=0.1),
+            candidate('c.pdf', 9, "far away chunk", [0.5, 0.5], 0.6),
+        ]
+
+        passages = merge_adjacent(candidates, max_chunks=3)
+
+        self.assertEqual([passage['content'] for passage in passages],
+                         ["chunk three then chunk four shared tail text", "other file", "far away chunk"])
+        self.assertEqual(passages[0]['metadata']['chunk_indices'], [3, 4])
+        self.assertEqual(passages[0]['distance'], 0.1)
+        self.assertEqual(passages[0]['score'], 0.9)
+
+    def test_merge_adjacent_respects_max_chunks(self):
+        candidates = [candidate('c.pdf', idx, f"chunk {idx}", [1.0, 0.0], 1.0 - idx / 10) for idx in range(5)]
+
+        passages = merge_adjacent(candidates, max_chunks=2)
+
+        self.assertEqual([passage['metadata'].get('chunk_indices') for passage in passages], [[0, 1], [2, 3], None])
+
+    def test_mmr_skips_near_duplicates(self):
+        embeddings = np.array([[1.0, 0.0], [0.999, 0.045], [0.0, 1.0]], dtype=np.float32)
+        relevance_scores = np.array([1.0, 0.95, 0.6], dtype=np.float32)
+
+        self.assertEqual(mmr(embeddings, relevance_scores, 2, relevance=0.7), [0, 2])
+        self.assertEqual(mmr(embeddings, relevance_scores, 2, relevance=1.0), [0, 1])
+
+    def test_select_passages(self):
+        candidates = [
+            candidate('c.pdf', 0, "intro", [1.0, 0.0], 0.9),
+            candidate('c.pdf', 1, "intro continued", [1.0, 0.1], 0.8),
+            candidate('os.pdf', 7, "scheduling", [0.0, 1.0], 0.5),
+        ]
+
+        passages = select_passages(candidates, n_results=3, relevance=0.7, max_chunks=3)
+
+        self.assertEqual([passage['content'] for passage in passages], ["intro intro continued", "scheduling"])
+        self.assertNotIn('embedding', passages[0])
+        self.assertEqual(select_passages([], n_results=3), [])
+
+    def test_merged_passages_sum_token_counts(self):
+        candidates = [
+            candidate('c.pdf', 3, "chunk three", [1.0, 0.0], 0.9),
+            candidate('c.pdf', 4, "chunk four", [1.0, 0.0], 0.8),
+        ]
+        candidates[0]['metadata']['token_count'] = 5
+        candidates[1]['metadata']['token_count'] = 7
+
+        passages = merge_adjacent(candidates, max_chunks=3)
+
+        self.assertEqual(passages[0]['metadata']['token_count'], 12)
+
+    def test_assemble_context_applies_adaptive_cutoff(self):
+        passages = [
+            {'content': "far", 'metadata': {'token_count': 1}, 'distance': 0.4},
+            {'content': "best", 'metadata': {'token_count': 1}, 'distance': 0.1},
+            {'content': "close", 'metadata': {'token_count': 1}, 'distance': 0.2},
+            {'content': "keyword", 'metadata': {'token_count': 1}, 'distance': None},
+        ]
+
+        context = assemble_context(passages, budget=100, max_distance=0.5, distance_margin=0.15)
+
+        self.assertEqual(context, "Relevant information:\n1. best\n2. close\n3. keyword\n")
+
+    def test_assemble_context_adds_nothing_when_nothing_is_relevant(self):
+        passages = [
+            {'content': "unrelated", 'metadata': {'token_count': 1}, 'distance': 0.9},
+        ]
+
+        self.assertIsNone(assemble_context(passages, budget=100, max_distance=0.5, distance_margin=0.15))
+
+    def test_assemble_context_keeps_keyword_matches_past_the_vector_cutoff(self):
+        passages = [
+            {'content': "unrelated", 'metadata': {'token_count': 1}, 'distance': 0.9},
+            {'content': "ENOMEM from mmap", 'metadata': {'token_count': 3}, 'distance': None},
+            {'content': "mmap flags", 'metadata': {'token_count': 2}, 'distance': None},
+            {'content': "third keyword match", 'metadata': {'token_count': 3}, 'distance': None},
+        ]
+
+        context = assemble_context(passages, budget=100, max_distance=0.5, distance_margin=0.15, max_keyword_passages=2)
+
+        self.assertEqual(context, "Relevant information:\n1. ENOMEM from mmap\n2. mmap flags\n")
+
+    def test_assemble_context_fills_budget_in_distance_order(self):
+        passages = [
+            {'content': "best", 'metadata': {'token_count': 10}, 'distance': 0.1},
+            {'content': "too long", 'metadata': {'token_count': 50}, 'distance': 0.12},
+            {'content': "short", 'metadata': {'token_count': 5}, 'distance': 0.15},
+        ]
+        budget = CONTEXT_HEADER_TOKENS + 10 + 5 + 2 * PASSAGE_TOKEN_OVERHEAD
+
+        context = assemble_context(passages, budget=budget, max_distance=0.5, distance_margin=0.15)
+
+        self.assertEqual(context, "Relevant information:\n1. best\n2. short\n")
+        self.assertIsNone(assemble_context(passages, budget=5, max_distance=0.5, distance_margin=0.15))
+
+
+if __name__ == '__main__':
+    unittest.main()
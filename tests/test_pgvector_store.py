@@ -0,0 +1,128 @@
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from backend.database.pgvector_store import (PgBackgroundJobs, PgDocumentManifest, PgKeywordIndex, PgVectorCollection, parse_vector,
+                                             vector_literal, where_clause)
+
+
+class TestPgVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        # Store whose pooled cursor is a mock
+        self.cursor = MagicMock()
+        self.store = MagicMock()
+
+        @contextmanager
+        def cursor():
+            yield self.cursor
+
+        # Cursor of the connection used outside transactions
+        self.autocommit_cursor = MagicMock()
+
+        @contextmanager
+        def autocommit_cursor():
+            yield self.autocommit_cursor
+
+        self.store.cursor = cursor
+        self.store.autocommit_cursor = autocommit_cursor
+        self.store.keyword_index = PgKeywordIndex(self.store)
+        self.store.manifest = PgDocumentManifest(self.store)
+        self.collection = PgVectorCollection(self.store, 'course_cs232', {'embedding_provider': 'openai'}, dimensions=2)
+
+    def test_where_clause_translates_chroma_filters(self):
+        condition, params = where_clause({'$and': [{'file_name': 'a.txt'}, {'content_hash': {'$in': ['x', 'y']}}]})
+
+        self.assertEqual(condition.as_string(None), "metadata @> %s::jsonb AND (metadata -> %s) = ANY(%s::jsonb[])")
+        self.assertEqual(params, ['{"file_name": "a.txt"}', 'content_hash', ['"x"', '"y"']])
+
+    def test_vector_literal_round_trips(self):
+        self.assertEqual(vector_literal([0.5, -1.0, 2]), '[0.5,-1.0,2.0]')
+        self.assertEqual(parse_vector('[0.5,-1,2]'), [0.5, -1, 2])
+
+    def test_query_returns_squared_distances_per_query(self):
+        self.cursor.fetchall.side_effect = [
+            [('doc1', "Content 1", {'file_name': 'a.txt'}, 0.25, None)],
+            [('doc2', "Content 2", {'file_name': 'b.txt'}, 1.0, None)]
+        ]
+
+        results = self.collection.query(query_embeddings=[[0.0, 1.0], [1.0, 0.0]], n_results=100)
+
+        self.assertEqual(results['ids'], [['doc1'], ['doc2']])
+        self.assertEqual(results['distances'], [[0.25], [1.0]])
+        self.assertEqual(results['metadatas'][1], [{'file_name': 'b.txt'}])
+        self.assertIsNone(results['embeddings'])
+        self.cursor.execute.assert_any_call("SET LOCAL hnsw.ef_search = %s", (100,))
+
+    def test_query_before_first_write_returns_nothing(self):
+        collection = PgVectorCollection(self.store, 'course_bio101')
+
+        results = collection.query(query_embeddings=[[0.0, 1.0]], n_results=3)
+
+        self.assertEqual(results['ids'], [[]])
+        self.cursor.execute.assert_not_called()
+
+    def test_add_rejects_other_dimensions(self):
+        with self.assertRaises(ValueError):
+            self.collection.add(ids=['doc1'], embeddings=[[0.0, 1.0, 2.0]], documents=["Content 1"])
+
+    @patch('backend.database.pgvector_store.execute_values')
+    def test_first_write_builds_the_index_concurrently_after_committing(self, mock_execute_values):
+        collection = PgVectorCollection(self.store, 'course_bio101')
+        self.cursor.rowcount = 1
+        self.cursor.fetchone.return_value = (2,)
+
+        collection.add(ids=['doc1'], embeddings=[[0.0, 1.0]], documents=["Content 1"])
+
+        self.assertEqual(collection.dimensions, 2)
+        mock_execute_values.assert_called_once()
+        self.assertFalse(any('CREATE INDEX' in repr(call.args[0]) for call in self.cursor.execute.call_args_list))
+        self.assertIn("CREATE INDEX CONCURRENTLY IF NOT EXISTS", repr(self.autocommit_cursor.execute.call_args[0][0]))
+
+    @patch('backend.database.pgvector_store.execute_values')
+    def test_later_writes_do_not_rebuild_the_index(self, mock_execute_values):
+        self.collection.add(ids=['doc1'], embeddings=[[0.0, 1.0]], documents=["Content 1"])
+
+        self.autocommit_cursor.execute.assert_not_called()
+
+    def test_keyword_search_matches_any_word(self):
+        self.cursor.fetchall.return_value = [('doc1', 0.1)]
+
+        results = self.collection.keyword_index.search('course_cs232', "Segfault after fork()", n_results=4)
+
+        self.assertEqual(results, [('doc1', 0.1)])
+        self.assertEqual(self.cursor.execute.call_args[0][1], ('segfault | after | fork', 'course_cs232', 4))
+
+    def test_manifest_lists_files_with_iso_upload_times(self):
+        self.cursor.fetchall.return_value = [('a.txt', 2, 11, 'abc', datetime(2024, 9, 1, tzinfo=timezone.utc), 'ada'),
+                                             ('b.txt', 1, 7, 'def', None, 'ada')]
+
+        files = self.collection.manifest.list('course_cs232')
+
+        self.assertEqual(files[0], {'file_name': 'a.txt', 'chunk_count': 2, 'byte_size': 11, 'content_hash': 'abc',
+                                    'uploaded_at': '2024-09-01T00:00:00+00:00', 'embedding_model': 'ada'})
+        self.assertIsNone(files[1]['uploaded_at'])
+        self.assertEqual(self.cursor.execute.call_args[0][1], ('course_cs232',))
+
+    def test_jobs_are_read_from_the_shared_table(self):
+        jobs = PgBackgroundJobs(self.store, ttl=60)
+        self.cursor.fetchone.return_value = ('abc', 'delete_file', 'running', 500, 2000, None, {'file_name': 'a.txt'})
+
+        job = jobs.get('abc')
+
+        self.assertEqual(job, {'id': 'abc', 'kind': 'delete_file', 'status': 'running', 'done': 500, 'total': 2000,
+                               'error': None, 'file_name': 'a.txt'})
+        self.assertEqual(self.cursor.execute.call_args[0][1], ('abc', 60))
+
+    def test_job_progress_is_written_to_the_shared_table(self):
+        jobs = PgBackgroundJobs(self.store, ttl=60)
+
+        jobs.run('abc', lambda progress: progress(3))
+
+        updates = [call.args[1] for call in self.cursor.execute.call_args_list]
+        self.assertEqual(updates, [['running', 'abc'], [3, 'abc'], ['done', 'abc']])
+
+
+if __name__ == '__main__':
+    unittest.main()
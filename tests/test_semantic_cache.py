@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import patch
+
+from backend.database.semantic_cache import SemanticCache
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SemanticCache(threshold=0.9, ttl=60, max_entries=2)
+
+    def test_lookup_returns_similar_answer(self):
+        self.cache.store('cs232', 'gpt-4o', [1.0, 0.0, 0.0], "Pointers hold addresses.")
+
+        self.assertEqual(self.cache.lookup('cs232', 'gpt-4o', [0.99, 0.05, 0.0]), "Pointers hold addresses.")
+        self.assertIsNone(self.cache.lookup('cs232', 'gpt-4o', [0.0, 1.0, 0.0]))
+
+    def test_lookup_is_scoped_to_course_and_model(self):
+        self.cache.store('cs232', 'gpt-4o', [1.0, 0.0, 0.0], "Pointers hold addresses.")
+
+        self.assertIsNone(self.cache.lookup('chem101', 'gpt-4o', [1.0, 0.0, 0.0]))
+        self.assertIsNone(self.cache.lookup('cs232', 'gpt-4o-mini', [1.0, 0.0, 0.0]))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.store('cs232', 'gpt-4o', [1.0, 0.0, 0.0], "first")
+        self.cache.store('cs232', 'gpt-4o', [0.0, 1.0, 0.0], "second")
+        self.cache.lookup('cs232', 'gpt-4o', [1.0, 0.0, 0.0])
+        self.cache.store('cs232', 'gpt-4o', [0.0, 0.0, 1.0], "third")
+
+        self.assertEqual(self.cache.lookup('cs232', 'gpt-4o', [1.0, 0.0, 0.0]), "first")
+        self.assertIsNone(self.cache.lookup('cs232', 'gpt-4o', [0.0, 1.0, 0.0]))
+
+    @patch('backend.database.semantic_cache.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        self.cache.store('cs232', 'gpt-4o', [1.0, 0.0, 0.0], "Pointers hold addresses.")
+
+        mock_monotonic.return_value = 161.0
+
+        self.assertIsNone(self.cache.lookup('cs232', 'gpt-4o', [1.0, 0.0, 0.0]))
+
+    def test_invalidate_and_stats(self):
+        self.cache.store('cs232', 'gpt-4o', [1.0, 0.0, 0.0], "Pointers hold addresses.")
+        self.cache.lookup('cs232', 'gpt-4o', [1.0, 0.0, 0.0])
+        self.cache.invalidate('cs232')
+        self.cache.lookup('cs232', 'gpt-4o', [1.0, 0.0, 0.0])
+
+        self.assertEqual(self.cache.stats()['cs232'], {'entries': 0, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+
+from backend.database.usage_quota import QuotaEngine
+
+
+@patch('backend.database.usage_quota.time.monotonic')
+class TestQuotaEngine(unittest.TestCase):
+
+    def test_new_bucket_is_full(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        quota = QuotaEngine(limit=1000)
+
+        self.assertEqual(quota.remaining('user-1', 'cs232'), 1000)
+        self.assertTrue(quota.allows('user-1', 'cs232'))
+
+    def test_charge_is_per_user_and_course(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        quota = QuotaEngine(limit=1000)
+
+        quota.charge('user-1', 'cs232', 400)
+
+        self.assertEqual(quota.remaining('user-1', 'cs232'), 600)
+        self.assertEqual(quota.remaining('user-1', 'chem101'), 1000)
+        self.assertEqual(quota.remaining('user-2', 'cs232'), 1000)
+
+    def test_overspent_bucket_blocks_until_refilled(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        quota = QuotaEngine(limit=1000, period=1000)
+
+        quota.charge('user-1', 'cs232', 1200)
+        self.assertEqual(quota.remaining('user-1', 'cs232'), 0)
+        self.assertFalse(quota.allows('user-1', 'cs232'))
+
+        mock_monotonic.return_value = 300.0
+        self.assertEqual(quota.remaining('user-1', 'cs232'), 100)
+        self.assertTrue(quota.allows('user-1', 'cs232'))
+
+    def test_refill_is_capped_at_limit(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        quota = QuotaEngine(limit=1000, period=1000)
+        quota.charge('user-1', 'cs232', 100)
+
+        mock_monotonic.return_value = 10_000.0
+
+        self.assertEqual(quota.remaining('user-1', 'cs232'), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from backend.database.document_manifest import DocumentManifest
+from backend.database.memmap_store import MemmapVectorStore
+from backend.database.vector_store_service import VectorStoreService
+
+
+class TestVectorStoreService(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.client = MemmapVectorStore(self.directory.name)
+        collection = self.client.get_or_create_collection('course_cs232')
+        collection.add(ids=['doc1', 'doc2'], embeddings=[[0.0, 1.0], [1.0, 0.0]], documents=["Content 1", "Content 2"],
+                       metadatas=[{'file_name': 'a.txt'}, {'file_name': 'a.txt'}])
+        self.client.get_or_create_collection('course_bio101')
+
+        self.keyword_index = MagicMock()
+        self.keyword_index.is_indexed.return_value = True
+        patch('backend.database.chroma_database.get_keyword_index', return_value=self.keyword_index).start()
+        patch('backend.database.chroma_database.get_document_manifest', return_value=DocumentManifest()).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_warm_loads_every_collection_and_reports_ready(self):
+        service = VectorStoreService(self.client)
+        self.assertFalse(service.is_ready())
+
+        service.warm()
+
+        self.assertTrue(service.is_ready())
+        self.assertEqual(service.warmed_collections, 2)
+        self.assertIsNotNone(self.client.get_collection('course_cs232').decoded)
+
+    def test_warm_skips_a_collection_that_fails(self):
+        self.keyword_index.is_indexed.side_effect = [RuntimeError("locked"), True]
+        service = VectorStoreService(self.client)
+
+        service.warm()
+
+        self.assertTrue(service.is_ready())
+        self.assertEqual(service.warmed_collections, 1)
+
+    @patch('backend.database.vector_store_service.close_document_manifests')
+    @patch('backend.database.vector_store_service.close_keyword_indexes')
+    def test_close_releases_the_store(self, close_keyword_indexes, close_document_manifests):
+        service = VectorStoreService(self.client)
+        service.warm()
+
+        service.close()
+
+        self.assertFalse(service.is_ready())
+        self.assertEqual(self.client.collections, {})
+        close_keyword_indexes.assert_called_once()
+        close_document_manifests.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()